@@ -1,38 +1,161 @@
+import base64
+
 import requests
 import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.metrics import registry
 
 url = "http://localhost:8081/api/v1/"
 
-def validate_embedding(embedding: np.ndarray):
-    if embedding is None:
-        raise ValueError("Embedding is None.")
+# Wire formats for embedding vectors, most compact first. "json" is a plain list of floats,
+# the others are the raw little-endian vector bytes in base64.
+WIRE_DTYPES = {"float16": "<f2", "float32": "<f4"}
 
-    embedding_list = embedding.tolist()
 
-    data = {
-        "vector": embedding_list
-    }
-    response = requests.post(url + 'embedding/validate', json=data)
+# Keeps one pooled keep-alive session to the access-system server. The vector format is
+# negotiated once through GET embedding/formats; servers without that endpoint get JSON.
+class AccessSystemClient:
+    def __init__(self, base_url=url, formats=("float32", "json"), timeout=(1.0, 5.0), retries=2,
+                 backoff=0.1, pool_size=4):
+        self.base_url = base_url
+        # Preferred wire formats in order; the first one the server accepts is used
+        self.formats = formats
+        # (connect, read) seconds
+        self.timeout = timeout
+        self.wire_format = None
 
-    if response.status_code == 200:
-        return True, response.text
-    else:
-        return False, response.text
+        # Retry connection failures, and gateway errors of idempotent requests only: a POST embedding
+        # answered with a 504 may already have been applied, and an add must not be sent twice.
+        # Validate is a read, so it gets its own adapter that also retries its POSTs.
+        def adapter(allowed_methods):
+            retry = Retry(total=retries, connect=retries, read=0, status=retries, backoff_factor=backoff,
+                          status_forcelist=(502, 503, 504), allowed_methods=allowed_methods, raise_on_status=False)
+            return HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
 
+        self.session = requests.Session()
+        default_adapter = adapter(Retry.DEFAULT_ALLOWED_METHODS)
+        self.session.mount("http://", default_adapter)
+        self.session.mount("https://", default_adapter)
+        # The longest matching prefix wins, so only validate calls use this one
+        self.session.mount(base_url + "embedding/validate", adapter(Retry.DEFAULT_ALLOWED_METHODS | {"POST"}))
 
-def add_embedding(embedding: np.ndarray, name: str) -> int:
-    if embedding is None:
-        raise ValueError("Embedding is None.")
+        # Latency per endpoint path and reply status counts
+        self.metrics = registry.stage(type(self).__name__)
+
+    def close(self):
+        self.session.close()
+
+    # Session request timed under its endpoint path
+    def send(self, method, path, **kwargs):
+        try:
+            with self.metrics.time(path):
+                response = self.session.request(method, self.base_url + path, **kwargs)
+        except requests.RequestException:
+            self.metrics.count("failed")
+            raise
+
+        self.metrics.count(f"status_{response.status_code}")
+        return response
+
+    def negotiate(self):
+        if self.wire_format is not None:
+            return self.wire_format
+
+        if not any(f in WIRE_DTYPES for f in self.formats):
+            self.wire_format = "json"
+            return self.wire_format
+
+        try:
+            response = self.send("GET", "embedding/formats", timeout=self.timeout)
+            supported = response.json().get("formats", []) if response.status_code == 200 else []
+        except (requests.RequestException, ValueError):
+            # Server unreachable: use JSON for now and ask again on the next request
+            return "json"
+
+        self.wire_format = next((f for f in self.formats if f in supported or f == "json"), "json")
+        return self.wire_format
+
+    # Request body fields for a vector in the negotiated format
+    def encode_vector(self, embedding: np.ndarray):
+        return encode_vector(embedding, self.negotiate())
+
+    def post_vector(self, path, embedding, **fields):
+        response = self.send("POST", path, json={**fields, **self.encode_vector(embedding)}, timeout=self.timeout)
+
+        # The server dropped binary support (e.g. after a downgrade); resend as JSON from now on
+        if response.status_code == 415 and self.wire_format != "json":
+            self.wire_format = "json"
+            response = self.send("POST", path, json={**fields, **self.encode_vector(embedding)},
+                                 timeout=self.timeout)
+
+        return response
+
+    def validate_embedding(self, embedding: np.ndarray):
+        if embedding is None:
+            raise ValueError("Embedding is None.")
+
+        response = self.post_vector("embedding/validate", embedding)
+
+        if response.status_code == 200:
+            return True, response.text
+        else:
+            return False, response.text
 
-    embedding_list = embedding.tolist()
+    def add_embedding(self, embedding: np.ndarray, name: str) -> int:
+        if embedding is None:
+            raise ValueError("Embedding is None.")
 
-    if len(embedding_list) != 512:
-        raise ValueError("Embedding must be a list of 512 floats.")
+        if np.size(embedding) != 512:
+            raise ValueError("Embedding must be a list of 512 floats.")
+
+        response = self.post_vector("embedding", embedding, name=name)
+
+        return response.status_code
+
+    # Embeddings enrolled after cursor (None for all), as ([{"name", "vector"}, ...], next_cursor)
+    def list_embeddings(self, cursor=None):
+        params = {"since": cursor} if cursor is not None else {}
+        if self.negotiate() != "json":
+            params["encoding"] = self.wire_format
+        response = self.send("GET", "embedding", params=params, timeout=(self.timeout[0], 30.0))
+        response.raise_for_status()
+
+        body = response.json()
+        return [decode_item(item) for item in body["items"]], body.get("cursor")
+
+
+# Request body fields for a vector in the given wire format
+def encode_vector(embedding: np.ndarray, wire_format):
+    if wire_format == "json":
+        return {"vector": np.asarray(embedding, dtype=np.float32).tolist()}
+
+    raw = np.ascontiguousarray(embedding, dtype=WIRE_DTYPES[wire_format]).tobytes()
+    return {"vector": base64.b64encode(raw).decode("ascii"), "encoding": wire_format}
+
+
+# Item with its vector decoded to float32, whatever format the server sent it in
+def decode_item(item):
+    encoding = item.get("encoding", "json")
+    if encoding == "json":
+        return item
+
+    vector = np.frombuffer(base64.b64decode(item["vector"]), dtype=WIRE_DTYPES[encoding]).astype(np.float32)
+    return {"name": item["name"], "vector": vector}
+
+
+# Shared client behind the module-level helpers
+default_client = AccessSystemClient()
+
+
+def validate_embedding(embedding: np.ndarray):
+    return default_client.validate_embedding(embedding)
+
+
+def add_embedding(embedding: np.ndarray, name: str) -> int:
+    return default_client.add_embedding(embedding, name)
 
-    data = {
-        "name": name,
-        "vector": embedding_list
-    }
-    response = requests.post(url + "embedding", json=data)
 
-    return response.status_code
+def list_embeddings(cursor=None):
+    return default_client.list_embeddings(cursor)
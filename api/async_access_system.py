@@ -0,0 +1,197 @@
+import asyncio
+import time
+
+import aiohttp
+import numpy as np
+
+from api.access_system import url, WIRE_DTYPES, encode_vector
+from src.metrics import registry
+
+
+# asyncio counterpart of AccessSystemClient. At most max_concurrency requests are in flight.
+# The batch calls use the server's bulk endpoints when it has them, else concurrent single calls.
+class AsyncAccessSystemClient:
+    def __init__(self, base_url=url, formats=("float32", "json"), timeout=(1.0, 5.0), max_concurrency=8,
+                 batch_size=64):
+        self.base_url = base_url
+        self.formats = formats
+        # (connect, read) seconds
+        self.timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        self.max_concurrency = max_concurrency
+        # Largest number of items sent in one bulk request
+        self.batch_size = batch_size
+
+        self.wire_format = None
+        # None until the first bulk call finds out whether the server has the bulk endpoints
+        self.bulk = None
+
+        self.session = None
+        self.semaphore = None
+
+        # Latency per endpoint path (queueing for a free connection excluded) and reply status counts
+        self.metrics = registry.stage(type(self).__name__)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # The session belongs to the running event loop, so it is created on first use
+    def get_session(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, method, path, **kwargs):
+        session = self.get_session()
+        async with self.semaphore:
+            t1 = time.perf_counter()
+            try:
+                async with session.request(method, self.base_url + path, **kwargs) as response:
+                    text = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.metrics.count("failed")
+                raise
+            finally:
+                self.metrics.observe(path, time.perf_counter() - t1)
+
+        self.metrics.count(f"status_{response.status}")
+        return response.status, text
+
+    async def negotiate(self):
+        if self.wire_format is not None:
+            return self.wire_format
+
+        if not any(f in WIRE_DTYPES for f in self.formats):
+            self.wire_format = "json"
+            return self.wire_format
+
+        try:
+            session = self.get_session()
+            async with session.get(self.base_url + "embedding/formats") as response:
+                supported = (await response.json()).get("formats", []) if response.status == 200 else []
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            # Server unreachable: use JSON for now and ask again on the next request
+            return "json"
+
+        self.wire_format = next((f for f in self.formats if f in supported or f == "json"), "json")
+        return self.wire_format
+
+    async def post_vector(self, path, embedding, **fields):
+        body = {**fields, **encode_vector(embedding, await self.negotiate())}
+        status, text = await self.request("POST", path, json=body)
+
+        # The server dropped binary support; resend as JSON from now on
+        if status == 415 and self.wire_format != "json":
+            self.wire_format = "json"
+            status, text = await self.request("POST", path, json={**fields, **encode_vector(embedding, "json")})
+
+        return status, text
+
+    async def validate_embedding(self, embedding: np.ndarray):
+        if embedding is None:
+            raise ValueError("Embedding is None.")
+
+        status, text = await self.post_vector("embedding/validate", embedding)
+        return status == 200, text
+
+    async def add_embedding(self, embedding: np.ndarray, name: str) -> int:
+        if embedding is None:
+            raise ValueError("Embedding is None.")
+
+        if np.size(embedding) != 512:
+            raise ValueError("Embedding must be a list of 512 floats.")
+
+        status, _ = await self.post_vector("embedding", embedding, name=name)
+        return status
+
+    # Validate, and add when unknown, in one pipelined step; returns "exists", "added" or "failed"
+    async def validate_and_add(self, embedding: np.ndarray, name: str):
+        exists, _ = await self.validate_embedding(embedding)
+        if exists:
+            return "exists"
+
+        return "added" if await self.add_embedding(embedding, name) == 201 else "failed"
+
+    # (exists, detail) for every embedding
+    async def validate_embeddings(self, embeddings):
+        items = [{} for _ in embeddings]
+        results = [(result["exists"], result.get("detail", "")) if result is not None else None
+                   for result in await self.bulk_call("embedding/validate/batch", embeddings, items, "exists")]
+        return await self.fill_missing(results, lambda i: self.validate_embedding(embeddings[i]))
+
+    # "exists", "added" or "failed" for every (embedding, name)
+    async def enroll_embeddings(self, embeddings, names):
+        items = [{"name": name} for name in names]
+        results = [result["status"] if result is not None else None
+                   for result in await self.bulk_call("embedding/enroll/batch", embeddings, items, "status")]
+        return await self.fill_missing(results, lambda i: self.validate_and_add(embeddings[i], names[i]))
+
+    # Results of a bulk endpoint in item order. Items of chunks the server did not take (no bulk
+    # endpoints, or a refused wire format) are None, for the caller to send one by one. field is the
+    # key every result must have.
+    async def bulk_call(self, path, embeddings, items, field):
+        if self.bulk is False or not embeddings:
+            return [None] * len(embeddings)
+
+        wire_format = await self.negotiate()
+        chunks, sizes = [], []
+        for start in range(0, len(embeddings), self.batch_size):
+            chunk = [{**item, **encode_vector(embedding, wire_format)}
+                     for item, embedding in zip(items[start:start + self.batch_size],
+                                                embeddings[start:start + self.batch_size])]
+            chunks.append(self.post_bulk(path, chunk, field))
+            sizes.append(len(chunk))
+
+        responses = await asyncio.gather(*chunks)
+        return [result for response, size in zip(responses, sizes)
+                for result in (response if response is not None else [None] * size)]
+
+    # Replace the None results with single calls, so items a bulk chunk already handled are never sent twice
+    async def fill_missing(self, results, single_call):
+        missing = [i for i, result in enumerate(results) if result is None]
+        for i, result in zip(missing, await asyncio.gather(*(single_call(i) for i in missing))):
+            results[i] = result
+        return results
+
+    # A 200 reply that is not one result per item raises ClientPayloadError like any other failed
+    # request, so callers retry the chunk instead of dying on a KeyError
+    async def post_bulk(self, path, chunk, field):
+        session = self.get_session()
+        async with self.semaphore:
+            t1 = time.perf_counter()
+            try:
+                async with session.post(self.base_url + path, json={"items": chunk}) as response:
+                    self.metrics.count(f"status_{response.status}")
+                    if response.status in (404, 405):
+                        self.bulk = False
+                        return None
+                    if response.status == 415:
+                        self.wire_format = "json"
+                        return None
+                    response.raise_for_status()
+
+                    try:
+                        results = (await response.json(content_type=None))["results"]
+                    except (ValueError, KeyError, TypeError) as e:
+                        raise aiohttp.ClientPayloadError(f"Malformed reply from {path}: {e!r}") from e
+                    if (not isinstance(results, list) or len(results) != len(chunk)
+                            or not all(isinstance(result, dict) and field in result for result in results)):
+                        raise aiohttp.ClientPayloadError(f"Malformed reply from {path}: expected {len(chunk)} "
+                                                         f"results with '{field}'")
+
+                    self.bulk = True
+                    return results
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.metrics.count("failed")
+                raise
+            finally:
+                self.metrics.observe(path, time.perf_counter() - t1)
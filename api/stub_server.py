@@ -0,0 +1,192 @@
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from api.access_system import WIRE_DTYPES
+
+# Cosine similarity at which the stand-in server reports an embedding as known
+MATCH_THRESHOLD = 0.5
+
+
+# In-memory stand-in for the access-system server, for benchmarks and local runs.
+# With binary=False it behaves like a server that only speaks the JSON list format, and with
+# bulk=False like one without the batch endpoints. delay adds a fixed latency to every request.
+class StubAccessServer:
+    def __init__(self, host="127.0.0.1", port=0, prefix="/api/v1/", binary=True, bulk=True, delay=0.0):
+        self.prefix = prefix
+        self.binary = binary
+        self.bulk = bulk
+        self.delay = delay
+        # Batch requests still to be refused with 415, to exercise the clients' per-item fallback
+        self.refuse_batches = 0
+        # Batch requests still to be answered with a 200 that is not JSON, as a misbehaving proxy would
+        self.garble_batches = 0
+
+        self.names = []
+        self.vectors = []
+        self.lock = threading.Lock()
+
+        handler = type("Handler", (StubHandler,), {"stub": self})
+        self.httpd = StubHTTPServer((host, port), handler)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{self.prefix}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def decode(self, body):
+        encoding = body.get("encoding", "json")
+        if encoding == "json":
+            vector = np.asarray(body["vector"], dtype=np.float32)
+        elif self.binary and encoding in WIRE_DTYPES:
+            vector = np.frombuffer(base64.b64decode(body["vector"]), dtype=WIRE_DTYPES[encoding])
+        else:
+            return None
+
+        return vector.astype(np.float32) / np.linalg.norm(vector)
+
+    def best_score(self, vector):
+        with self.lock:
+            if not self.vectors:
+                return -1.0
+            return float(np.max(np.stack(self.vectors) @ vector))
+
+    def enroll(self, name, vector):
+        with self.lock:
+            self.names.append(name)
+            self.vectors.append(vector)
+
+    # Add the vector unless a known one matches, atomically so duplicates in one batch are caught
+    def validate_and_enroll(self, name, vector):
+        with self.lock:
+            if self.vectors and float(np.max(np.stack(self.vectors) @ vector)) >= MATCH_THRESHOLD:
+                return "exists"
+            self.names.append(name)
+            self.vectors.append(vector)
+            return "added"
+
+    def since(self, cursor, encoding):
+        with self.lock:
+            start = int(cursor) if cursor else 0
+            rows = list(zip(self.names[start:], self.vectors[start:]))
+            next_cursor = str(len(self.names))
+
+        if self.binary and encoding in WIRE_DTYPES:
+            items = [{"name": n, "encoding": encoding,
+                      "vector": base64.b64encode(v.astype(WIRE_DTYPES[encoding]).tobytes()).decode("ascii")}
+                     for n, v in rows]
+        else:
+            items = [{"name": n, "vector": v.tolist()} for n, v in rows]
+
+        return {"items": items, "cursor": next_cursor}
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Concurrent clients open many connections at once; the default backlog of 5 drops them
+    request_queue_size = 128
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so pooled clients can reuse their connection
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; avoid the delayed-ACK stall on a reused connection
+    disable_nagle_algorithm = True
+    stub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=b"", content_type="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply_json(self, status, data):
+        self.reply(status, json.dumps(data).encode(), "application/json")
+
+    def do_GET(self):
+        time.sleep(self.stub.delay)
+
+        parts = urlsplit(self.path)
+        path = parts.path[len(self.stub.prefix):]
+        query = parse_qs(parts.query)
+
+        if path == "embedding/formats" and self.stub.binary:
+            self.reply_json(200, {"formats": [*WIRE_DTYPES, "json"]})
+        elif path == "embedding":
+            self.reply_json(200, self.stub.since(query.get("since", [None])[0], query.get("encoding", ["json"])[0]))
+        else:
+            self.reply(404)
+
+    def do_POST(self):
+        time.sleep(self.stub.delay)
+
+        path = self.path[len(self.stub.prefix):]
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+        if path.endswith("/batch"):
+            self.do_batch(path, body["items"])
+            return
+
+        vector = self.stub.decode(body)
+        if vector is None:
+            self.reply(415)
+            return
+
+        if path == "embedding/validate":
+            score = self.stub.best_score(vector)
+            self.reply(200 if score >= MATCH_THRESHOLD else 404, f"{score:.3f}".encode())
+        elif path == "embedding":
+            self.stub.enroll(body["name"], vector)
+            self.reply(201)
+        else:
+            self.reply(404)
+
+    def do_batch(self, path, items):
+        if not self.stub.bulk or path not in ("embedding/validate/batch", "embedding/enroll/batch"):
+            self.reply(404)
+            return
+
+        with self.stub.lock:
+            refuse, self.stub.refuse_batches = self.stub.refuse_batches > 0, max(0, self.stub.refuse_batches - 1)
+            garble, self.stub.garble_batches = self.stub.garble_batches > 0, max(0, self.stub.garble_batches - 1)
+
+        if garble:
+            self.reply(200, b"<html>Service temporarily unavailable</html>", "text/html")
+            return
+
+        vectors = [self.stub.decode(item) for item in items]
+        if refuse or any(vector is None for vector in vectors):
+            self.reply(415)
+            return
+
+        if path == "embedding/validate/batch":
+            scores = [self.stub.best_score(vector) for vector in vectors]
+            results = [{"exists": score >= MATCH_THRESHOLD, "detail": f"{score:.3f}"} for score in scores]
+        else:
+            results = [{"name": item["name"], "status": self.stub.validate_and_enroll(item["name"], vector)}
+                       for item, vector in zip(items, vectors)]
+
+        self.reply_json(200, {"results": results})
+
+
+if __name__ == '__main__':
+    server = StubAccessServer(port=8081)
+    print(f"Stand-in access-system server on {server.url}")
+    server.httpd.serve_forever()
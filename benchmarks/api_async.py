@@ -0,0 +1,65 @@
+import asyncio
+import os
+import secrets
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.access_system import AccessSystemClient
+from api.async_access_system import AsyncAccessSystemClient
+from api.stub_server import StubAccessServer
+
+N_FACES = int(os.environ.get("BENCH_FACES", 64))
+# Simulated server round-trip, seconds
+DELAY = float(os.environ.get("BENCH_DELAY", 0.01))
+
+
+def random_embeddings(n, seed):
+    embeddings = np.random.default_rng(seed).normal(size=(n, 512)).astype(np.float32)
+    return list(embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True))
+
+
+# Two sequential round-trips per face, as FaceVerification did before
+def run_sync(server, embeddings, names):
+    client = AccessSystemClient(server.url)
+    for embedding, name in zip(embeddings, names):
+        exists, _ = client.validate_embedding(embedding)
+        if not exists:
+            client.add_embedding(embedding, name)
+    client.close()
+
+
+async def run_async(server, embeddings, names, max_concurrency):
+    async with AsyncAccessSystemClient(server.url, max_concurrency=max_concurrency) as client:
+        await client.enroll_embeddings(embeddings, names)
+
+
+def measure(label, bulk, run):
+    server = StubAccessServer(bulk=bulk, delay=DELAY).start()
+    embeddings = random_embeddings(N_FACES, seed=len(label))
+    names = [secrets.token_hex(8) for _ in embeddings]
+
+    t1 = time.perf_counter()
+    run(server, embeddings, names)
+    elapsed = time.perf_counter() - t1
+
+    assert len(server.names) == N_FACES
+    server.stop()
+    print(f"{label:<22}{elapsed * 1000:>10.1f}{N_FACES / elapsed:>10.1f}")
+
+
+def main():
+    print(f"{N_FACES} faces, {DELAY * 1000:.0f} ms simulated latency")
+    print(f"{'client':<22}{'total ms':>10}{'faces/s':>10}")
+    measure("sync, 2 calls/face", True, run_sync)
+    for max_concurrency in (1, 4, 16):
+        measure(f"async x{max_concurrency}, single", False,
+                lambda s, e, n: asyncio.run(run_async(s, e, n, max_concurrency)))
+    measure("async, bulk", True, lambda s, e, n: asyncio.run(run_async(s, e, n, 4)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import json
+import os
+import secrets
+import sys
+import time
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.access_system import AccessSystemClient
+from api.stub_server import StubAccessServer
+
+N_REQUESTS = int(os.environ.get("BENCH_REQUESTS", 500))
+
+
+def random_embedding(rng):
+    embedding = rng.normal(size=512).astype(np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+
+# The previous client: a fresh connection per call and the vector as a JSON list
+def legacy_validate(base_url, embedding):
+    return requests.post(base_url + "embedding/validate", json={"vector": embedding.tolist()})
+
+
+def measure(call, embeddings):
+    latencies = []
+    for embedding in embeddings:
+        t1 = time.perf_counter()
+        call(embedding)
+        latencies.append(time.perf_counter() - t1)
+    return np.array(latencies) * 1000
+
+
+def main():
+    server = StubAccessServer().start()
+    rng = np.random.default_rng(0)
+
+    # A realistic gallery so validation does some work
+    seed = AccessSystemClient(server.url)
+    for _ in range(200):
+        seed.add_embedding(random_embedding(rng), secrets.token_hex(8))
+    seed.close()
+
+    embeddings = [random_embedding(rng) for _ in range(N_REQUESTS)]
+
+    runs = [("legacy json", lambda e: legacy_validate(server.url, e),
+             len(json.dumps({"vector": embeddings[0].tolist()})))]
+    for formats in (("json",), ("float32", "json"), ("float16", "json")):
+        client = AccessSystemClient(server.url, formats=formats)
+        payload = len(json.dumps(client.encode_vector(embeddings[0])))
+        runs.append((f"pooled {client.wire_format}", client.validate_embedding, payload))
+
+    print(f"{'client':<16}{'payload B':>10}{'mean ms':>10}{'p95 ms':>10}")
+    for label, call, payload in runs:
+        # Warm up
+        measure(call, embeddings[:20])
+        latencies = measure(call, embeddings)
+        print(f"{label:<16}{payload:>10}{latencies.mean():>10.2f}{np.percentile(latencies, 95):>10.2f}")
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+import numpy as np
+import openvino as ov
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.pipelines.recognition import preprocess_arcface
+
+MODEL_PATH = "models/arcfaceresnet100-8.onnx"
+N_FACES = 200
+
+
+def run_sync(compiled, faces):
+    output_layer = compiled.output(0)
+
+    t1 = time.time()
+    for face in faces:
+        compiled([preprocess_arcface(face)])[output_layer]
+    return len(faces) / (time.time() - t1)
+
+
+def run_async(compiled, faces, infer_requests):
+    done = []
+    queue = ov.AsyncInferQueue(compiled, infer_requests)
+    queue.set_callback(lambda request, frame_id: done.append(frame_id))
+
+    t1 = time.time()
+    for frame_id, face in enumerate(faces):
+        queue.start_async([preprocess_arcface(face)], userdata=frame_id)
+    queue.wait_all()
+    return len(done) / (time.time() - t1)
+
+
+def main(device='CPU'):
+    core = ov.Core()
+    compiled = core.compile_model(core.read_model(MODEL_PATH), device_name=device)
+
+    faces = [np.random.randint(0, 255, (160, 160, 3), dtype=np.uint8) for _ in range(N_FACES)]
+
+    # Warm up
+    run_sync(compiled, faces[:10])
+
+    print(f"{'mode':<16}{'embeddings/s':>14}")
+    print(f"{'sync':<16}{run_sync(compiled, faces):>14.1f}")
+    for infer_requests in (1, 2, 4):
+        print(f"{f'async x{infer_requests}':<16}{run_async(compiled, faces, infer_requests):>14.1f}")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
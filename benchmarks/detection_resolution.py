@@ -0,0 +1,42 @@
+import os
+import sys
+import threading
+import time
+
+import cv2
+import loguru
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.pipelines.detection import FaceDetection, make_bboxes
+
+N_FRAMES = 100
+DETECTION_WIDTHS = [None, 1280, 960, 640, 480, 320]
+
+
+# Usage: detection_resolution.py [image]  (defaults to a synthetic 1920x1080 frame)
+def main(image_path=None):
+    if image_path is not None:
+        frame = cv2.imread(image_path)
+    else:
+        frame = np.random.randint(0, 255, (1080, 1920, 3), dtype=np.uint8)
+
+    print(f"{N_FRAMES} frames at {frame.shape[1]}x{frame.shape[0]}\n")
+    print(f"{'detection input':<18}{'latency':>10}{'faces':>7}")
+    for width in DETECTION_WIDTHS:
+        detection = FaceDetection(threading.Event(), loguru.logger, detection_width=width)
+        detection.detect_face(frame)
+
+        t1 = time.time()
+        for _ in range(N_FRAMES):
+            results = detection.detect_face(frame)
+        latency_ms = (time.time() - t1) / N_FRAMES * 1000
+
+        h, w = frame.shape[:2]
+        label = "native" if width is None or width >= w else f"{width}x{round(h * width / w)}"
+        print(f"{label:<18}{latency_ms:>8.2f}ms{len(make_bboxes(frame, results)):>7}")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
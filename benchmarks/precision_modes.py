@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import openvino as ov
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.model_cache import PRECISIONS, compile_config, precision_model_path
+from src.pipelines.recognition import ARCFACE_MODEL_PATH, preprocess_arcface, l2_norm
+from src.pipelines.validation import HPEA_MODEL_PATH, preprocess_hpea
+from src.utils.datasets import load_face_crops
+
+
+def run_model(core, model_path, precision, device, faces, preprocess):
+    model = core.read_model(model=precision_model_path(model_path, precision))
+    compiled = core.compile_model(model=model, device_name=device, config=compile_config(device, precision))
+
+    inputs = [preprocess(compiled, face) for face in faces]
+    compiled(inputs[0])
+
+    outputs = []
+    t1 = time.time()
+    for input_data in inputs:
+        result = compiled(input_data)
+        outputs.append([result[port].copy() for port in compiled.outputs])
+    latency_ms = (time.time() - t1) / len(inputs) * 1000
+
+    return latency_ms, outputs
+
+
+# Cosine similarity of each embedding to its FP32 counterpart
+def arcface_agreement(ref, outputs):
+    sims = [float(np.dot(l2_norm(r[0][0]), l2_norm(o[0][0]))) for r, o in zip(ref, outputs)]
+    return f"cos mean {np.mean(sims):.4f} min {np.min(sims):.4f}"
+
+
+# Largest yaw/pitch/roll deviation from FP32, in degrees
+def head_pose_agreement(ref, outputs):
+    diffs = [max(abs(float(a.ravel()[0]) - float(b.ravel()[0])) for a, b in zip(r, o)) for r, o in zip(ref, outputs)]
+    return f"angle diff mean {np.mean(diffs):.2f} max {np.max(diffs):.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and FP32 agreement of each inference precision mode.")
+    parser.add_argument("faces_dir", help="folder of BGR face crops")
+    parser.add_argument("--device", default="CPU")
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    faces = load_face_crops(args.faces_dir, args.limit)
+    core = ov.Core()
+
+    models = [
+        ("arcface", ARCFACE_MODEL_PATH, lambda compiled, face: preprocess_arcface(face), arcface_agreement),
+        ("head-pose", HPEA_MODEL_PATH, lambda compiled, face: preprocess_hpea(face, compiled.input(0).shape),
+         head_pose_agreement),
+    ]
+
+    print(f"{len(faces)} faces on {args.device}\n")
+    print(f"{'model':<12}{'precision':<11}{'latency':>10}  agreement with FP32")
+    for name, model_path, preprocess, agreement in models:
+        ref = None
+        for precision in PRECISIONS:
+            try:
+                latency_ms, outputs = run_model(core, model_path, precision, args.device, faces, preprocess)
+            except FileNotFoundError as e:
+                print(f"{name:<12}{precision:<11}{'-':>10}  skipped: {e}")
+                continue
+
+            if ref is None:
+                ref = outputs
+            print(f"{name:<12}{precision:<11}{latency_ms:>8.2f}ms  {agreement(ref, outputs)}")
+
+
+if __name__ == '__main__':
+    main()
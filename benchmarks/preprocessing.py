@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import openvino as ov
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.model_cache import add_bgr_preprocessing, prepare_ir
+from src.pipelines.recognition import ARCFACE_MODEL_PATH, preprocess_arcface
+from src.pipelines.validation import HPEA_MODEL_PATH, preprocess_hpea
+
+N_FRAMES = 300
+CROP_SHAPE = (220, 180, 3)
+
+
+# Average latency (ms) of preprocess + inference, and peak bytes allocated preparing one frame
+def measure(compiled, prepare, crop):
+    compiled(prepare(crop))
+
+    t1 = time.time()
+    for _ in range(N_FRAMES):
+        compiled(prepare(crop))
+    latency_ms = (time.time() - t1) / N_FRAMES * 1000
+
+    # numpy reports its buffers to tracemalloc; OpenVINO-internal memory is not counted
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    prepare(crop)
+    allocated = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    return latency_ms, allocated
+
+
+def main(device='CPU'):
+    core = ov.Core()
+    crop = np.random.randint(0, 255, CROP_SHAPE, dtype=np.uint8)
+
+    models = [
+        ("arcface", ARCFACE_MODEL_PATH, True, lambda compiled, face: preprocess_arcface(face)),
+        ("head-pose", HPEA_MODEL_PATH, False, lambda compiled, face: preprocess_hpea(face, compiled.input(0).shape)),
+    ]
+
+    print(f"{N_FRAMES} frames of {CROP_SHAPE[1]}x{CROP_SHAPE[0]} BGR crops on {device}\n")
+    print(f"{'model':<12}{'preprocessing':<16}{'latency':>10}{'alloc/frame':>14}")
+    for name, model_path, to_rgb, numpy_prepare in models:
+        model = core.read_model(model=prepare_ir(model_path))
+        numpy_compiled = core.compile_model(model, device)
+        graph_compiled = core.compile_model(add_bgr_preprocessing(core.read_model(prepare_ir(model_path)), to_rgb),
+                                            device)
+
+        variants = [
+            ("numpy", numpy_compiled, lambda face: numpy_prepare(numpy_compiled, face)),
+            ("in-graph", graph_compiled, lambda face: np.expand_dims(face, 0)),
+        ]
+        for label, compiled, prepare in variants:
+            latency_ms, allocated = measure(compiled, prepare, crop)
+            print(f"{name:<12}{label:<16}{latency_ms:>8.2f}ms{allocated / 1024:>11.1f}KiB")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,69 @@
+import base64
+import os
+import sys
+import time
+from io import BytesIO
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.preview import PreviewRenderer
+
+N_FRAMES = 100
+
+
+# Previous GUI path: flip at full resolution, convert to RGB, JPEG through PIL, base64
+def legacy_preview(frame):
+    from PIL import Image
+
+    rgb_frame = cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2RGB)
+    buff = BytesIO()
+    Image.fromarray(rgb_frame).save(buff, format="JPEG", quality=85)
+    return base64.b64encode(buff.getvalue()).decode()
+
+
+def renderer_preview(renderer, frame, key):
+    jpeg = renderer.render(frame, key)
+    return base64.b64encode(jpeg).decode() if jpeg is not None else None
+
+
+def measure(render, frames):
+    t1 = time.perf_counter()
+    for i, frame in enumerate(frames):
+        render(i, frame)
+    return (time.perf_counter() - t1) / len(frames)
+
+
+# Usage: preview.py [image]  (defaults to a synthetic 1280x720 camera frame)
+def main(image_path=None):
+    if image_path is not None:
+        frame = cv2.imread(image_path)
+    else:
+        # Smooth gradients with some noise compress like a camera frame, unlike pure noise
+        y, x = np.mgrid[0:720, 0:1280]
+        base = np.dstack([(x / 5) % 255, (y / 3) % 255, ((x + y) / 7) % 255]).astype(np.uint8)
+        frame = cv2.add(base, np.random.randint(0, 20, base.shape, dtype=np.uint8))
+
+    frames = [frame] * N_FRAMES
+    print(f"{N_FRAMES} frames at {frame.shape[1]}x{frame.shape[0]}\n")
+    print(f"{'path':<30}{'per frame':>12}{'payload':>12}")
+
+    try:
+        latency = measure(lambda i, f: legacy_preview(f), frames)
+        print(f"{'PIL, full size, q85':<30}{latency * 1000:>10.2f}ms{len(legacy_preview(frame)) / 1024:>10.1f}kB")
+    except ImportError:
+        print(f"{'PIL, full size, q85':<30}{'(PIL not installed)':>24}")
+
+    renderer = PreviewRenderer(size=(640, 480), quality=80, cpu_budget=1.0)
+    latency = measure(lambda i, f: renderer_preview(renderer, f, i), frames)
+    size = len(renderer_preview(renderer, frame, -1)) / 1024
+    print(f"{'OpenCV, 640x480, q80':<30}{latency * 1000:>10.2f}ms{size:>10.1f}kB")
+
+    latency = measure(lambda i, f: renderer_preview(renderer, f, "same"), frames)
+    print(f"{'OpenCV, unchanged frame':<30}{latency * 1000:>10.2f}ms{0:>10.1f}kB")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
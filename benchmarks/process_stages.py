@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import sys
+import time
+
+import loguru
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.blackboard import BlackboardStateful
+from src.pipeline_manager import PipelineManager, ExecutionMode
+from src.pipelines.recognition import RecognitionArcFace
+from src.pipelines.validation import FaceValidation
+
+DURATION = float(os.environ.get("BENCH_DURATION", 5.0))
+N_FACES = 2
+TOP_K = 3
+
+# The real model stages, each measured by how often it publishes its output key
+STAGES = {FaceValidation: "validated_faces", RecognitionArcFace: "embeddings"}
+
+
+# Detection and selection outputs the stages consume, as they would arrive from a frame with N_FACES
+# faces. Fresh crops each frame, kept away from white so the glare check passes them to the model.
+def publish_inputs(board, rng):
+    detected_faces = [(face_id, rng.integers(40, 200, (160, 160, 3), dtype=np.uint8)) for face_id in range(N_FACES)]
+    selected_faces = [(face_id, [rng.integers(40, 200, (112, 112, 3), dtype=np.uint8) for _ in range(TOP_K)])
+                      for face_id in range(N_FACES)]
+    board.set_state("detected_faces", detected_faces)
+    board.set_state("selected_faces", selected_faces)
+
+
+def run(mode):
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    run_state_event = ctx.Event()
+    run_state_event.set()
+
+    # No embedding cache, so recognition infers every candidate instead of reusing embeddings
+    deps = {"stop_event": stop_event, "run_state_event": run_state_event, "log": loguru.logger, "fps": 1000,
+            "max_faces": N_FACES, "top_k": TOP_K, "embedding_cache_size": 0}
+    manager = PipelineManager(deps, [(cls, mode) for cls in STAGES])
+    manager.build()
+    manager.run()
+
+    board = BlackboardStateful()
+    rng = np.random.default_rng(0)
+
+    # Give process stages time to spawn and load their models before measuring
+    time.sleep(10.0 if mode is ExecutionMode.PROCESS else 2.0)
+    start_counts = {key: board.get_state_seq(key)[0] for key in STAGES.values()}
+
+    t1 = time.time()
+    while time.time() - t1 < DURATION:
+        publish_inputs(board, rng)
+        time.sleep(0.001)
+    elapsed = time.time() - t1
+
+    rates = {cls.__name__: (board.get_state_seq(key)[0] - start_counts[key]) / elapsed for cls, key in STAGES.items()}
+
+    stop_event.set()
+    for pipeline in manager.pipelines.values():
+        if hasattr(pipeline, "join"):
+            pipeline.join(timeout=2.0)
+
+    board.reset_all()
+    return rates
+
+
+def main():
+    print(f"CPU cores: {os.cpu_count()}, {N_FACES} faces per frame, {DURATION:.0f}s per mode\n")
+
+    results = {mode: run(mode) for mode in (ExecutionMode.THREAD, ExecutionMode.PROCESS)}
+
+    print(f"{'stage':<20}{'thread fps':>12}{'process fps':>13}{'speedup':>10}")
+    for cls in STAGES:
+        thread_fps = results[ExecutionMode.THREAD][cls.__name__]
+        process_fps = results[ExecutionMode.PROCESS][cls.__name__]
+        speedup = process_fps / thread_fps if thread_fps else float("inf")
+        print(f"{cls.__name__:<20}{thread_fps:>12.1f}{process_fps:>13.1f}{speedup:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
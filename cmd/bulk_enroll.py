@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+
+import cv2
+import loguru
+import numpy as np
+
+from api.async_access_system import AsyncAccessSystemClient
+from src.gallery import EmbeddingGallery
+from src.model_cache import PRECISIONS
+from src.pipelines.detection import FaceDetection, make_bboxes
+from src.pipelines.validation import FaceValidation
+from src.pipelines.alignment import FaceAlignment
+from src.pipelines.selection import face_quality_score
+from src.pipelines.recognition import RecognitionArcFace, fuse_embeddings
+from src.utils.datasets import list_media
+from src.utils.tracking import FaceIdTracker
+
+# Least cosine similarity between the tracks of a video for them to count as the same person
+SAME_PERSON_THRESHOLD = 0.5
+
+# Stage instances of a pool worker, built once per process by init_worker
+worker_stages = {}
+
+
+def init_worker(device, precision, detection_width):
+    log = loguru.logger
+    worker_stages["detection"] = FaceDetection(None, log, detection_width=detection_width)
+    worker_stages["validation"] = FaceValidation(None, None, log, device=device, head_pose_precision=precision)
+    worker_stages["alignment"] = FaceAlignment(None, None, log)
+
+
+# (bbox, score, aligned face) for every face in the frame that passes validation
+def extract_faces(frame):
+    detection = worker_stages["detection"]
+
+    candidates = []
+    for bbox in make_bboxes(frame, detection.detect_face(frame)):
+        face_roi = detection.get_face_roi(frame, bbox)
+        if face_roi is None:
+            continue
+
+        quality = worker_stages["validation"].validate_face(face_roi)
+        if quality is None:
+            continue
+
+        aligned_face = worker_stages["alignment"].align_face(face_roi)
+        if aligned_face is not None:
+            candidates.append((bbox, face_quality_score(aligned_face, quality), aligned_face))
+
+    return candidates
+
+
+# (key, [(track id, aligned face)], reason). An image contributes its face, a video the top_k best
+# faces of each track. A file showing more than one face at once is rejected with reason
+# "multiple_people"; reason is "no_face" when none passed, else None.
+def process_media(task):
+    key, path, is_video, top_k, video_stride = task
+
+    if not is_video:
+        frame = cv2.imread(path)
+        candidates = extract_faces(frame) if frame is not None else []
+        if len(candidates) > 1:
+            return key, [], "multiple_people"
+        return key, [(1, face) for _, _, face in candidates], None if candidates else "no_face"
+
+    # Track ids separate people who appear one after the other; the parent checks their embeddings
+    face_ids = FaceIdTracker()
+    tracks = {}
+    cap = cv2.VideoCapture(path)
+    index = 0
+    try:
+        while True:
+            # grab() skips decoding of the frames between samples
+            if not cap.grab():
+                break
+            if index % video_stride == 0:
+                ok, frame = cap.retrieve()
+                candidates = extract_faces(frame) if ok else []
+                if len(candidates) > 1:
+                    return key, [], "multiple_people"
+
+                for face_id, (_, score, face) in zip(face_ids.assign([c[0] for c in candidates]), candidates):
+                    # Keep only the best top_k per track so long videos do not pile up faces
+                    tracks[face_id] = sorted(tracks.get(face_id, []) + [(score, face)], key=lambda c: c[0],
+                                             reverse=True)[:top_k]
+            index += 1
+    finally:
+        cap.release()
+
+    faces = [(face_id, face) for face_id, best in tracks.items() for _, face in best]
+    return key, faces, None if faces else "no_face"
+
+
+# (media, collisions): one (key, path, is_video) per file, and {key: paths} of keys that different
+# files would be enrolled under. Overlapping inputs list a file more than once; it is enrolled
+# once, under its key relative to the last input that lists it (last root wins).
+def unique_media(media):
+    by_path = {}
+    for key, path, is_video in media:
+        by_path[os.path.realpath(path)] = (key, path, is_video)
+
+    by_key = {}
+    for key, path, _ in by_path.values():
+        by_key.setdefault(key, []).append(path)
+
+    collisions = {key: paths for key, paths in by_key.items() if len(paths) > 1}
+    return list(by_path.values()), collisions
+
+
+# Keys already handled by an earlier run, whatever their outcome
+def load_progress(path):
+    if not os.path.exists(path):
+        return set()
+
+    with open(path) as f:
+        return {line.split("\t", 1)[0] for line in f if line.strip()}
+
+
+class BulkEnroller:
+    def __init__(self, args, log):
+        self.args = args
+        self.log = log
+
+        # Batched ArcFace: faces of several images share one synchronous inference call
+        self.recognition = RecognitionArcFace(threading.Event(), threading.Event(), log, device=args.device,
+                                              infer_requests=0, max_faces=args.batch_size,
+                                              arcface_precision=args.precision, top_k=1, embedding_cache_size=0)
+
+        self.gallery = EmbeddingGallery(args.output) if args.output else None
+        self.api = AsyncAccessSystemClient(max_concurrency=args.api_concurrency) if args.api else None
+        self.loop = asyncio.new_event_loop()
+
+        self.progress = open(args.progress, "a")
+
+        # (key, [(track id, aligned face)]) waiting for the next inference batch
+        self.pending = []
+        self.pending_faces = 0
+
+        self.media_done = 0
+        self.templates = 0
+        self.faces = 0
+        self.counts = {"added": 0, "exists": 0, "failed": 0, "no_face": 0, "multiple_people": 0}
+
+    def add(self, key, faces, reason=None):
+        self.media_done += 1
+        if reason is not None:
+            self.counts[reason] += 1
+            self.mark_done([(key, reason)])
+            return
+
+        self.pending.append((key, faces))
+        self.pending_faces += len(faces)
+        if self.pending_faces >= self.args.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        labels = [(key, face_id) for key, faces in self.pending for face_id, _ in faces]
+        faces = [face for _, faces in self.pending for _, face in faces]
+        self.pending, self.pending_faces = [], 0
+
+        embeddings = []
+        for start in range(0, len(faces), self.args.batch_size):
+            embeddings.extend(self.recognition.recognize_batch(faces[start:start + self.args.batch_size]))
+        self.faces += len(faces)
+
+        # One template per image or video, fused like the live pipeline does, unless its tracks
+        # show different people
+        rejected = self.different_people(fuse_embeddings(labels, embeddings))
+        if rejected:
+            self.counts["multiple_people"] += len(rejected)
+            self.mark_done([(key, "multiple_people") for key in sorted(rejected)])
+
+        kept = [(key, embedding) for (key, _), embedding in zip(labels, embeddings) if key not in rejected]
+        templates = fuse_embeddings([key for key, _ in kept], [embedding for _, embedding in kept])
+        self.templates += len(templates)
+        if not templates:
+            return
+
+        names = [key for key, _ in templates]
+        vectors = [template for _, template in templates]
+
+        statuses = ["added"] * len(templates)
+        if self.api is not None:
+            statuses = self.loop.run_until_complete(self.api.enroll_embeddings(vectors, names))
+        if self.gallery is not None:
+            # Only what the server took, so the gallery never holds a duplicate or a failed enrollment
+            added = [(name, vector) for name, vector, status in zip(names, vectors, statuses) if status == "added"]
+            if added:
+                self.gallery.add([vector for _, vector in added], [name for name, _ in added])
+
+        for status in statuses:
+            self.counts[status if status in self.counts else "failed"] += 1
+
+        # Failed enrollments are not recorded, so a resumed run tries them again
+        self.mark_done([(name, status) for name, status in zip(names, statuses) if status != "failed"])
+
+    # Keys whose track templates are not all of the same person
+    def different_people(self, track_templates):
+        by_key = {}
+        for (key, _), template in track_templates:
+            by_key.setdefault(key, []).append(template)
+
+        return {key for key, templates in by_key.items()
+                if any(float(np.dot(templates[0], other)) < SAME_PERSON_THRESHOLD for other in templates[1:])}
+
+    # Recorded only once the embeddings are stored, so an interrupted run never skips a face
+    def mark_done(self, entries):
+        for key, status in entries:
+            self.progress.write(f"{key}\t{status}\n")
+        self.progress.flush()
+
+    def close(self):
+        self.flush()
+        self.progress.close()
+        if self.api is not None:
+            self.loop.run_until_complete(self.api.close())
+        self.loop.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll faces from image folders and video files without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="Image/video files or folders (searched recursively).")
+    parser.add_argument("--output", help="Gallery directory to write embeddings to (see src/gallery.py).")
+    parser.add_argument("--api", action="store_true", help="Enroll through the access-system API.")
+    parser.add_argument("--progress", help="Progress file for resuming (default: <output>/progress.tsv).")
+    parser.add_argument("--workers", type=int, default=max(1, os.cpu_count() - 1))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=3, help="Best frames fused into the template of a video.")
+    parser.add_argument("--video-stride", type=int, default=5, help="Use every Nth video frame.")
+    parser.add_argument("--detection-width", type=int, default=640)
+    parser.add_argument("--api-concurrency", type=int, default=4)
+    parser.add_argument("--device", default="CPU")
+    parser.add_argument("--precision", default="FP32", choices=list(PRECISIONS))
+    args = parser.parse_args()
+
+    if not args.output and not args.api:
+        parser.error("Give --output, --api or both.")
+    if args.progress is None:
+        if not args.output:
+            parser.error("--progress is required without --output.")
+        args.progress = os.path.join(args.output, "progress.tsv")
+
+    log = loguru.logger
+
+    # Keys are enrollment names: two files with the same relative path under different inputs (or
+    # differing only in extension) would enroll one person over the other, so refuse to start
+    media, collisions = unique_media(list_media(args.inputs))
+    if collisions:
+        for key, paths in sorted(collisions.items()):
+            log.error(f"{key} would be enrolled from {len(paths)} files: {', '.join(paths)}")
+        parser.error(f"{len(collisions)} enrollment names are shared by different files; rename them or "
+                     "enroll the inputs separately.")
+
+    done = load_progress(args.progress)
+    tasks = [(key, path, is_video, args.top_k, args.video_stride) for key, path, is_video in media if key not in done]
+    log.info(f"{len(media)} images and videos found, {len(media) - len(tasks)} already enrolled, "
+             f"{len(tasks)} to go.")
+
+    enroller = BulkEnroller(args, log)
+
+    t1 = time.time()
+    last_report = t1
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.workers, initializer=init_worker,
+                  initargs=(args.device, args.precision, args.detection_width)) as pool:
+        try:
+            for key, faces, reason in pool.imap_unordered(process_media, tasks, chunksize=4):
+                enroller.add(key, faces, reason)
+
+                if time.time() - last_report >= 10:
+                    last_report = time.time()
+                    elapsed = last_report - t1
+                    log.info(f"{enroller.media_done}/{len(tasks)} done, "
+                             f"{enroller.faces / elapsed:.1f} faces/s, {enroller.media_done / elapsed:.1f} files/s")
+        finally:
+            enroller.close()
+
+    elapsed = time.time() - t1
+    counts = enroller.counts
+    print(f"{enroller.media_done} files in {elapsed:.1f}s: {enroller.templates} templates from {enroller.faces} faces "
+          f"({enroller.faces / elapsed:.1f} faces/s, {enroller.media_done / elapsed:.1f} files/s)")
+    print(f"added {counts['added']}, already enrolled {counts['exists']}, failed {counts['failed']}, "
+          f"no usable face {counts['no_face']}, more than one person {counts['multiple_people']}")
+
+
+if __name__ == '__main__':
+    main()
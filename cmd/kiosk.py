@@ -0,0 +1,84 @@
+import argparse
+import multiprocessing
+
+import loguru
+
+from src.pipelines.video_capture import VideoCapture
+from src.pipelines.detection import FaceDetection
+from src.pipelines.validation import FaceValidation
+from src.pipelines.alignment import FaceAlignment
+from src.pipelines.selection import FaceSelection
+from src.pipelines.recognition import RecognitionArcFace
+from src.pipelines.verification import FaceVerification
+from src.frame_ring import FrameRing
+from src.gallery import EmbeddingGallery
+from src.enrollment_queue import EnrollmentQueue
+from src.kiosk import KioskServer
+from src.model_cache import PRECISIONS
+
+from src.pipeline_manager import PipelineManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the enrollment pipeline headless with a local HTTP API.")
+    parser.add_argument("--source", default="0", help="Camera index, stream URL, video file or image folder.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address of the preview stream and control API.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--device", default="CPU")
+    parser.add_argument("--precision", default="FP32", choices=list(PRECISIONS))
+    parser.add_argument("--start", action="store_true", help="Arm enrollment at startup instead of on request.")
+    args = parser.parse_args()
+
+    # Multiprocessing events so stages can also run in their own process
+    ctx = multiprocessing.get_context("spawn")
+    run_state_event = ctx.Event()
+    stop_event = ctx.Event()
+
+    log = loguru.logger
+
+    frame_ring = FrameRing(shape=(480, 640, 3), slots=4)
+    gallery = EmbeddingGallery("data/gallery")
+    enrollment_queue = EnrollmentQueue("data/enrollments.db", batch_size=32)
+
+    deps = {
+        "stop_event": stop_event, "run_state_event": run_state_event,
+        "log": log, "fps": args.fps, "device": args.device, "frame_ring": frame_ring,
+        "source": args.source, "replay": "realtime",
+        "infer_requests": 2, "max_faces": 4, "detect_every": 5, "detection_width": 320,
+        "arcface_precision": args.precision, "head_pose_precision": args.precision,
+        "selection_window": 10, "top_k": 3, "embedding_cache_size": 64,
+        "gallery": gallery, "match_threshold": 0.5, "match_margin": 0.05, "gallery_sync_interval": 60,
+        "api_concurrency": 4, "enrollment_queue": enrollment_queue,
+        "idle_after": 30, "idle_fps": 5
+    }
+    classes = [VideoCapture, FaceDetection, FaceValidation, FaceAlignment, FaceSelection, RecognitionArcFace,
+               FaceVerification]
+
+    pipeline_manager = PipelineManager(deps, classes)
+    pipeline_manager.build()
+    pipeline_manager.run()
+
+    kiosk = KioskServer(stop_event, run_state_event, args.host, args.port, enrollment_queue=enrollment_queue,
+                        gallery=gallery, scheduler=pipeline_manager.scheduler, frame_ring=frame_ring).start()
+    log.info(f"Kiosk running: preview {kiosk.url}preview.mjpg, control POST {kiosk.url}enrollment/start|stop, "
+             f"status {kiosk.url}status. Press Ctrl+C to stop.")
+
+    if args.start:
+        run_state_event.set()
+
+    try:
+        while not stop_event.wait(timeout=1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        kiosk.stop()
+        frame_ring.close()
+        frame_ring.unlink()
+        enrollment_queue.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
-import threading
+import argparse
+import multiprocessing
 
 import flet as ft
 import loguru
@@ -7,16 +8,28 @@ from src.pipelines.video_capture import VideoCapture
 from src.pipelines.detection import FaceDetection
 from src.pipelines.validation import FaceValidation
 from src.pipelines.alignment import FaceAlignment
+from src.pipelines.selection import FaceSelection
 from src.pipelines.recognition import RecognitionArcFace
 from src.pipelines.verification import FaceVerification
 from src.app import EnrollmentGUI
+from src.frame_ring import FrameRing
+from src.gallery import EmbeddingGallery
+from src.enrollment_queue import EnrollmentQueue
+from src.metrics import start_metrics_server
 
 from src.pipeline_manager import PipelineManager
 
 
 def main():
-    run_state_event = threading.Event()
-    stop_event = threading.Event()
+    parser = argparse.ArgumentParser(description="Run the enrollment GUI.")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve Prometheus metrics on this localhost port; off by default.")
+    args = parser.parse_args()
+
+    # Multiprocessing events so stages can also run in their own process
+    ctx = multiprocessing.get_context("spawn")
+    run_state_event = ctx.Event()
+    stop_event = ctx.Event()
 
     log = loguru.logger
 
@@ -25,17 +38,44 @@ def main():
 
     device = 'CPU'
 
+    # Preallocated shared-memory slots for captured frames
+    frame_ring = FrameRing(shape=(480, 640, 3), slots=4)
+
+    # Local copy of enrolled embeddings, synced from the server, for duplicate checks
+    gallery = EmbeddingGallery("data/gallery")
+    # Enrollments waiting for the server, kept on disk so none are lost while it is unreachable
+    enrollment_queue = EnrollmentQueue("data/enrollments.db", batch_size=32)
+
     deps = {
         "stop_event": stop_event, "run_state_event": run_state_event,
-        "log": log, "fps": fps, "device": device
+        "log": log, "fps": fps, "device": device, "frame_ring": frame_ring,
+        "source": 0, "replay": "realtime",
+        "infer_requests": 2, "max_faces": 4, "detect_every": 5, "detection_width": 320,
+        "arcface_precision": "FP32", "head_pose_precision": "FP32",
+        "selection_window": 10, "top_k": 3, "embedding_cache_size": 64,
+        "gallery": gallery, "match_threshold": 0.5, "match_margin": 0.05, "gallery_sync_interval": 60,
+        "api_concurrency": 4, "enrollment_queue": enrollment_queue,
+        "idle_after": 30, "idle_fps": 5
     }
-    classes = [VideoCapture, FaceDetection, FaceValidation, FaceAlignment, RecognitionArcFace, FaceVerification]
+    # Wrap a stage as (cls, "process") to run it in a separate process with its own models
+    classes = [VideoCapture, FaceDetection, FaceValidation, FaceAlignment, FaceSelection, RecognitionArcFace,
+               FaceVerification]
 
     pipeline_manager = PipelineManager(deps, classes)
     pipeline_manager.build()
 
-    app = EnrollmentGUI(pipeline_manager, stop_event, run_state_event, fps)
-    ft.app(target=app.main)
+    # Prometheus scrape target with per-stage latency, fps and drop counters
+    metrics_server = start_metrics_server(args.metrics_port, log)
+
+    app = EnrollmentGUI(pipeline_manager, stop_event, run_state_event, fps, show_metrics=False)
+    try:
+        ft.app(target=app.main)
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        frame_ring.close()
+        frame_ring.unlink()
+        enrollment_queue.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,110 @@
+import argparse
+import multiprocessing
+import time
+
+import loguru
+
+from src.pipelines.video_capture import VideoCapture
+from src.pipelines.detection import FaceDetection
+from src.pipelines.validation import FaceValidation, create_head_pose_engine
+from src.pipelines.alignment import FaceAlignment
+from src.pipelines.selection import FaceSelection
+from src.pipelines.recognition import RecognitionArcFace, create_arcface_engine
+from src.pipelines.verification import FaceVerification
+from src.frame_ring import FrameRing
+from src.gallery import EmbeddingGallery
+from src.enrollment_queue import EnrollmentQueue
+from src.model_cache import PRECISIONS
+from src.metrics import start_metrics_server
+from src.tracing import tracer
+
+from src.pipeline_manager import PipelineManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several enrollment cameras headless on shared models.")
+    parser.add_argument("--source", action="append", required=True,
+                        help="Camera index, stream URL, video file or image folder; repeat once per camera.")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--device", default="CPU")
+    parser.add_argument("--precision", default="FP32", choices=list(PRECISIONS))
+    parser.add_argument("--max-batch", type=int, default=16, help="Largest batch of the shared models.")
+    parser.add_argument("--metrics-port", type=int, default=9100, help="Port of the Prometheus endpoint, 0 disables.")
+    parser.add_argument("--trace", help="Write the recent stage spans as Chrome trace JSON to this file on exit.")
+    parser.add_argument("--rearm-delay", type=float, default=3.0,
+                        help="Seconds a camera pauses after an enrollment before it starts again.")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+
+    log = loguru.logger
+
+    # One head-pose and one ArcFace model serve every camera; their stages run as threads
+    head_pose_engine = create_head_pose_engine(log, args.device, args.precision, args.max_batch)
+    arcface_engine = create_arcface_engine(log, args.device, args.precision, args.max_batch)
+
+    gallery = EmbeddingGallery("data/gallery")
+    enrollment_queue = EnrollmentQueue("data/enrollments.db", batch_size=32)
+
+    deps = {
+        "stop_event": stop_event, "log": log, "fps": args.fps, "device": args.device,
+        "replay": "realtime", "infer_requests": 0, "max_faces": 4, "detect_every": 5, "detection_width": 320,
+        "head_pose_engine": head_pose_engine, "arcface_engine": arcface_engine,
+        "selection_window": 10, "top_k": 3, "embedding_cache_size": 64,
+        "gallery": gallery, "match_threshold": 0.5, "match_margin": 0.05, "gallery_sync_interval": 60,
+        "api_concurrency": 4, "enrollment_queue": enrollment_queue,
+        "idle_after": 30, "idle_fps": 5
+    }
+
+    # Each camera gets its own blackboard, frame ring and run state
+    cameras = [
+        {"camera": f"cam{i}", "source": source, "frame_ring": FrameRing(shape=(480, 640, 3), slots=4),
+         "run_state_event": ctx.Event()}
+        for i, source in enumerate(args.source)
+    ]
+    classes = [VideoCapture, FaceDetection, FaceValidation, FaceAlignment, FaceSelection, RecognitionArcFace,
+               FaceVerification]
+
+    pipeline_manager = PipelineManager(deps, classes, cameras)
+    pipeline_manager.build()
+    pipeline_manager.run()
+
+    metrics_server = start_metrics_server(args.metrics_port, log)
+
+    for camera in cameras:
+        camera["run_state_event"].set()
+    log.info(f"Enrolling from {len(cameras)} cameras. Press Ctrl+C to stop.")
+
+    # Verification clears a camera's run state after each enrollment; arm it again after the pause
+    paused_at = {}
+    try:
+        while not stop_event.is_set():
+            now = time.monotonic()
+            for camera in cameras:
+                name, run_state_event = camera["camera"], camera["run_state_event"]
+                if run_state_event.is_set():
+                    continue
+                paused_at.setdefault(name, now)
+                if now - paused_at[name] >= args.rearm_delay:
+                    del paused_at[name]
+                    run_state_event.set()
+            stop_event.wait(timeout=0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        if metrics_server is not None:
+            metrics_server.stop()
+        log.info(f"Head-pose engine: {head_pose_engine.stats()}")
+        log.info(f"ArcFace engine: {arcface_engine.stats()}")
+        if args.trace:
+            log.info(f"Trace written to {tracer.export(args.trace)}")
+        for camera in cameras:
+            camera["frame_ring"].close()
+            camera["frame_ring"].unlink()
+        enrollment_queue.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import tempfile
+import time
+
+import openvino as ov
+
+from src.model_cache import CACHE_DIR, PRECISIONS, compile_config, precision_model_path, add_bgr_preprocessing
+from src.pipelines.recognition import ARCFACE_MODEL_PATH, reshape_arcface_batch
+from src.pipelines.validation import HPEA_MODEL_PATH
+
+
+def load(model_path, device, cache_dir, transform, precision):
+    core = ov.Core()
+    core.set_property({"CACHE_DIR": cache_dir})
+
+    t1 = time.time()
+    model = transform(core.read_model(model=model_path))
+    core.compile_model(model=model, device_name=device, config=compile_config(device, precision))
+
+    return time.time() - t1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert models to OpenVINO IR and warm the compiled-model cache.")
+    parser.add_argument("--device", default="CPU")
+    parser.add_argument("--max-faces", type=int, default=4)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--precision", default="FP32", choices=list(PRECISIONS))
+    args = parser.parse_args()
+
+    def arcface(model):
+        reshape_arcface_batch(model, args.max_faces * args.top_k)
+        return add_bgr_preprocessing(model, to_rgb=True)
+
+    # Must match what the pipeline stages compile, or the cached blobs will not be reused
+    models = {
+        "arcface": (ARCFACE_MODEL_PATH, arcface),
+        "head-pose": (HPEA_MODEL_PATH, add_bgr_preprocessing),
+    }
+
+    print(f"{'model':<12}{'convert':>10}{'cold':>10}{'warm':>10}")
+    for name, (model_path, transform) in models.items():
+        t1 = time.time()
+        ir_path = precision_model_path(model_path, args.precision)
+        convert_time = time.time() - t1
+
+        # Cold start: empty cache
+        with tempfile.TemporaryDirectory() as empty_cache:
+            cold_time = load(ir_path, args.device, empty_cache, transform, args.precision)
+
+        # Populate the real cache, then measure a warm start from it
+        load(ir_path, args.device, args.cache_dir, transform, args.precision)
+        warm_time = load(ir_path, args.device, args.cache_dir, transform, args.precision)
+
+        print(f"{name:<12}{convert_time:>9.2f}s{cold_time:>9.2f}s{warm_time:>9.2f}s")
+
+
+if __name__ == '__main__':
+    main()
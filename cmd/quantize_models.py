@@ -0,0 +1,42 @@
+import argparse
+
+import openvino as ov
+
+from src.model_cache import prepare_ir, variant_path
+from src.pipelines.recognition import ARCFACE_MODEL_PATH, preprocess_arcface
+from src.pipelines.validation import HPEA_MODEL_PATH, preprocess_hpea
+from src.utils.datasets import load_face_crops
+
+
+def quantize(model_path, faces, transform):
+    try:
+        import nncf
+    except ImportError:
+        raise SystemExit("INT8 quantization needs NNCF: pip install nncf")
+
+    model = ov.Core().read_model(model=prepare_ir(model_path))
+    dataset = nncf.Dataset(faces, lambda face: transform(model, face))
+
+    quantized = nncf.quantize(model, dataset, subset_size=len(faces))
+
+    int8_path = variant_path(model_path, "INT8")
+    ov.save_model(quantized, int8_path)
+
+    return int8_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-training INT8 quantization of ArcFace and head-pose models.")
+    parser.add_argument("calibration_dir", help="folder of BGR face crops used for calibration")
+    parser.add_argument("--limit", type=int, default=300, help="maximum number of calibration images")
+    args = parser.parse_args()
+
+    faces = load_face_crops(args.calibration_dir, args.limit)
+    print(f"Calibrating on {len(faces)} face crops...")
+
+    print(quantize(ARCFACE_MODEL_PATH, faces, lambda model, face: preprocess_arcface(face)))
+    print(quantize(HPEA_MODEL_PATH, faces, lambda model, face: preprocess_hpea(face, model.input(0).shape)))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,11 @@ from src.ui.enrollment_view import EnrollmentView
 
 
 class EnrollmentGUI:
-    def __init__(self, pipeline_manager, stop_event, run_state_event, fps=30):
+    def __init__(self, pipeline_manager, stop_event, run_state_event, fps=30, show_metrics=False):
         self.run_state_event = run_state_event
         self.stop_event = stop_event
         self.fps = fps
+        self.show_metrics = show_metrics
 
         self.pipeline_manager = pipeline_manager
 
@@ -53,6 +54,7 @@ class EnrollmentGUI:
                     bgcolor=ft.Colors.SURFACE,
                     leading=ft.IconButton(ft.Icons.ARROW_BACK, on_click=back)
                 ),
-                EnrollmentView(self.stop_event, self.run_state_event,self.pipeline_manager, self.fps),
+                EnrollmentView(self.stop_event, self.run_state_event,self.pipeline_manager, self.fps,
+                               show_metrics=self.show_metrics),
             ]
         )
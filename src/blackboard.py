@@ -1,5 +1,5 @@
 import threading
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from enum import Enum
 
 
@@ -8,56 +8,132 @@ class FrameState(Enum):
     DEFAULT_FRAME = 'default_frame'
     PROCESSED_FRAME = 'processed_frame'
     DETECTED_FACE = 'detected_face'
+    DETECTED_FACES = 'detected_faces'
     VALIDATED_FACE = 'validated_face'
+    VALIDATED_FACES = 'validated_faces'
     ALIGNED_FACE = 'aligned_face'
+    ALIGNED_FACES = 'aligned_faces'
+    SELECTED_FACES = 'selected_faces'
     EMBEDDING = 'embedding'
+    EMBEDDINGS = 'embeddings'
+    EMBEDDING_FRAME_ID = 'embedding_frame_id'
 
     # Messages
     LAST_INFO_MSG = 'last_info_msg'
     LAST_ERROR_MSG = 'last_error_msg'
 
 
+class StateSlot:
+    # Single blackboard entry with its own lock and a sequence number that grows on every publish
+    def __init__(self):
+        self.cond = threading.Condition(threading.Lock())
+        self.value = None
+        self.seq = 0
+        # FrameTrace of the captured frame the value was derived from, if known
+        self.frame = None
+
+        # Highest seq a waiting stage has taken, and what was lost in between
+        self.taken = 0
+        self.overwritten = 0
+        self.skipped = 0
+
+
 class BlackboardStateful:
-    _shared_state = None
+    # One set of keys per camera; None is the board of a single-camera pipeline
+    _boards: Dict[Optional[str], Dict[str, StateSlot]] = {}
     _lock = threading.Lock()
 
-    def __init__(self):
-        if BlackboardStateful._shared_state is None:
-            with BlackboardStateful._lock:
-                if BlackboardStateful._shared_state is None:
-                    BlackboardStateful._shared_state = {
-                        FrameState.DEFAULT_FRAME.value: None,
-                        FrameState.PROCESSED_FRAME.value: None,
-                        FrameState.DETECTED_FACE.value: None,
-                        FrameState.VALIDATED_FACE.value: None,
-                        FrameState.ALIGNED_FACE.value: None,
-                        FrameState.EMBEDDING.value: None,
-
-                        FrameState.LAST_INFO_MSG.value: None,
-                        FrameState.LAST_ERROR_MSG.value: None,
-                    }
-
-        self._state: Dict[str, Any] = BlackboardStateful._shared_state
-
-    def set_state(self, key: str, value: Any) -> None:
+    def __init__(self, camera: Optional[str] = None):
         with BlackboardStateful._lock:
-            if key in self._state:
-                self._state[key] = value
+            board = BlackboardStateful._boards.get(camera)
+            if board is None:
+                board = {state.value: StateSlot() for state in FrameState}
+                BlackboardStateful._boards[camera] = board
 
-    def get_state(self, key: str) -> Optional[Any]:
+        self._state: Dict[str, StateSlot] = board
+        self.camera = camera
+        # Frame of the value this stage last took from each key
+        self._frames: Dict[str, Any] = {}
+
+    # {camera: {key: {"published", "overwritten", "skipped"}}} for the metrics endpoint
+    @staticmethod
+    def board_stats() -> Dict[Optional[str], Dict[str, Dict[str, int]]]:
         with BlackboardStateful._lock:
-            return self._state.get(key)
+            boards = dict(BlackboardStateful._boards)
+
+        return {
+            camera: {key: {"published": slot.seq, "overwritten": slot.overwritten, "skipped": slot.skipped}
+                     for key, slot in board.items()}
+            for camera, board in boards.items()
+        }
+
+    def set_state(self, key: str, value: Any, frame: Any = None) -> None:
+        slot = self._state.get(key)
+        if slot is None:
+            return
+
+        with slot.cond:
+            # Nobody waiting on this key took the previous value
+            if 0 < slot.taken < slot.seq:
+                slot.overwritten += 1
+            slot.value = value
+            slot.frame = frame
+            slot.seq += 1
+            slot.cond.notify_all()
+
+    def get_state(self, key: str) -> Optional[Any]:
+        slot = self._state.get(key)
+        if slot is None:
+            return None
+
+        with slot.cond:
+            return slot.value
+
+    # Return (seq, value) of the latest published item
+    def get_state_seq(self, key: str) -> Tuple[int, Optional[Any]]:
+        slot = self._state.get(key)
+        if slot is None:
+            return 0, None
+
+        with slot.cond:
+            return slot.seq, slot.value
+
+    # Return (seq, value, frame) of the latest published item, frame being its FrameTrace
+    def get_state_frame(self, key: str) -> Tuple[int, Optional[Any], Optional[Any]]:
+        slot = self._state.get(key)
+        if slot is None:
+            return 0, None, None
+
+        with slot.cond:
+            return slot.seq, slot.value, slot.frame
+
+    # Block until an item newer than last_seq is published.
+    # Returns (seq, value), or None if the timeout expires first.
+    def wait_state(self, key: str, last_seq: int = 0,
+                   timeout: Optional[float] = None) -> Optional[Tuple[int, Optional[Any]]]:
+        slot = self._state.get(key)
+        if slot is None:
+            return None
+
+        with slot.cond:
+            if not slot.cond.wait_for(lambda: slot.seq > last_seq, timeout=timeout):
+                return None
+            if last_seq:
+                slot.skipped += slot.seq - last_seq - 1
+            slot.taken = max(slot.taken, slot.seq)
+            self._frames[key] = slot.frame
+            return slot.seq, slot.value
+
+    # FrameTrace of the value last returned by wait_state for key, or None
+    def frame_of(self, key: str) -> Optional[Any]:
+        return self._frames.get(key)
 
     def has_state(self, key: str) -> bool:
-        with BlackboardStateful._lock:
-            return self._state.get(key) is not None
+        return self.get_state(key) is not None
 
     def reset_state(self, key: str) -> None:
-        with BlackboardStateful._lock:
-            if key in self._state:
-                self._state[key] = None
+        self.set_state(key, None)
 
     def reset_all(self) -> None:
-        with BlackboardStateful._lock:
-            for k in list(self._state.keys()):
-                BlackboardStateful._shared_state[k] = None
+        for k in list(self._state.keys()):
+            self.reset_state(k)
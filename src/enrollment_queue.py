@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from src.metrics import registry
+
+
+# Durable queue of enrollments waiting to be sent to the access-system server. Rows live in a
+# SQLite database in WAL mode, so queued faces survive a crash or a server outage and the
+# camera pipeline only pays for a local insert.
+class EnrollmentQueue:
+    def __init__(self, path="data/enrollments.db", batch_size=32, max_attempts=5):
+        self.path = path
+        # Largest number of enrollments sent in one flush
+        self.batch_size = batch_size
+        # Server rejections after which an enrollment is dropped; network errors do not count
+        self.max_attempts = max_attempts
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, vector BLOB NOT NULL, "
+            "face_id INTEGER, queued_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.db.commit()
+
+        self.lock = threading.Lock()
+        # Set whenever an enrollment is queued, so the flusher wakes up at once
+        self.queued = threading.Event()
+        self.flusher_owner = None
+
+        self.flushed = 0
+        self.dropped = 0
+        self.flush_errors = 0
+        self.flush_count = 0
+        self.flush_time = 0.0
+        self.last_flush_latency = 0.0
+
+        # Queue depth and oldest entry time as gauges, flush latency as the "flush" phase, and
+        # flushed, rejected (retried), dropped and flush_errors counters
+        self.metrics = registry.stage(type(self).__name__)
+        with self.lock:
+            self.update_gauges()
+
+    # Reopen the same database when passed to a process stage
+    def __getstate__(self):
+        return {"path": self.path, "batch_size": self.batch_size, "max_attempts": self.max_attempts}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    # True for the first stage to ask, and for it again on restart; that stage owns the flusher
+    def claim_flusher(self, owner):
+        with self.lock:
+            if self.flusher_owner is None:
+                self.flusher_owner = owner
+            return self.flusher_owner is owner
+
+    def put(self, embedding, name, face_id=None):
+        vector = np.ascontiguousarray(embedding, dtype=np.float32).tobytes()
+        with self.lock:
+            self.db.execute("INSERT OR IGNORE INTO pending (name, vector, face_id, queued_at) VALUES (?, ?, ?, ?)",
+                            (name, vector, face_id, time.time()))
+            self.db.commit()
+            self.update_gauges()
+        self.queued.set()
+
+    # Oldest batch_size enrollments as (id, name, embedding, face_id) tuples. Clears the queued
+    # event first, so a put() landing after this call still wakes the next wait().
+    def peek(self):
+        self.queued.clear()
+        with self.lock:
+            rows = self.db.execute("SELECT id, name, vector, face_id FROM pending ORDER BY id LIMIT ?",
+                                   (self.batch_size,)).fetchall()
+        return [(row_id, name, np.frombuffer(vector, dtype=np.float32), face_id)
+                for row_id, name, vector, face_id in rows]
+
+    # Block until something is queued since the last peek() or the timeout expires
+    def wait(self, timeout):
+        self.queued.wait(timeout)
+
+    # Delivered enrollments leave the queue
+    def done(self, ids):
+        with self.lock:
+            self.db.executemany("DELETE FROM pending WHERE id = ?", [(row_id,) for row_id in ids])
+            self.db.commit()
+            self.flushed += len(ids)
+            self.metrics.count("flushed", len(ids))
+            self.update_gauges()
+
+    # Count a server rejection; returns the names dropped after max_attempts
+    def reject(self, ids):
+        with self.lock:
+            self.db.executemany("UPDATE pending SET attempts = attempts + 1 WHERE id = ?",
+                                [(row_id,) for row_id in ids])
+            dropped = self.db.execute("SELECT id, name FROM pending WHERE attempts >= ?",
+                                      (self.max_attempts,)).fetchall()
+            self.db.executemany("DELETE FROM pending WHERE id = ?", [(row_id,) for row_id, _ in dropped])
+            self.db.commit()
+            self.dropped += len(dropped)
+            self.metrics.count("rejected", len(ids))
+            self.metrics.count("dropped", len(dropped))
+            self.update_gauges()
+        return [name for _, name in dropped]
+
+    def record_flush(self, latency):
+        with self.lock:
+            self.flush_count += 1
+            self.flush_time += latency
+            self.last_flush_latency = latency
+        self.metrics.observe("flush", latency)
+
+    def record_error(self):
+        with self.lock:
+            self.flush_errors += 1
+        self.metrics.count("flush_errors")
+
+    # Called with the lock held
+    def update_gauges(self):
+        depth, oldest = self.db.execute("SELECT COUNT(*), MIN(queued_at) FROM pending").fetchone()
+        self.metrics.set("queue_depth", depth)
+        # A timestamp rather than an age, so it stays correct between updates; 0 when empty
+        self.metrics.set("oldest_queued_timestamp_seconds", oldest or 0.0)
+
+    def depth(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            depth, oldest = self.db.execute("SELECT COUNT(*), MIN(queued_at) FROM pending").fetchone()
+            mean_latency = self.flush_time / self.flush_count if self.flush_count else 0.0
+            return {
+                "depth": depth, "oldest_age": time.time() - oldest if oldest is not None else 0.0,
+                "flushed": self.flushed, "dropped": self.dropped, "flush_errors": self.flush_errors,
+                "last_flush_latency": self.last_flush_latency, "mean_flush_latency": mean_latency
+            }
@@ -0,0 +1,125 @@
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class FrameRing:
+    # Header layout (int64): [latest slot, last seq, slot seqs..., slot readers...]
+    _LATEST = 0
+    _SEQ = 1
+    _SLOT_SEQ = 2
+
+    def __init__(self, shape=(480, 640, 3), slots=4, dtype=np.uint8, name=None, lock=None, create=True):
+        if slots < 2:
+            raise ValueError("Frame ring needs at least 2 slots.")
+
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+
+        self._readers = self._SLOT_SEQ + slots
+        header_len = self._SLOT_SEQ + 2 * slots
+        self.header_nbytes = header_len * np.dtype(np.int64).itemsize
+        self.frame_nbytes = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        if create:
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=self.header_nbytes + slots * self.frame_nbytes
+            )
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.name = self.shm.name
+        self.lock = lock if lock is not None else multiprocessing.get_context("spawn").Lock()
+        self.owner = create
+
+        self._header = np.ndarray((header_len,), dtype=np.int64, buffer=self.shm.buf)
+        self._frames = np.ndarray((slots,) + self.shape, dtype=self.dtype,
+                                  buffer=self.shm.buf, offset=self.header_nbytes)
+
+        if create:
+            self._header[:] = 0
+            self._header[self._LATEST] = -1
+
+    # Attach to the same shared block when passed to another process
+    def __getstate__(self):
+        return {"shape": self.shape, "slots": self.slots, "dtype": self.dtype.str,
+                "name": self.name, "lock": self.lock}
+
+    def __setstate__(self, state):
+        self.__init__(state["shape"], state["slots"], state["dtype"], state["name"], state["lock"], create=False)
+
+    # Reserve a free slot for the writer and return (slot, writable view)
+    def begin_write(self) -> Optional[Tuple[int, np.ndarray]]:
+        with self.lock:
+            latest = self._header[self._LATEST]
+            free = [
+                s for s in range(self.slots)
+                if s != latest and self._header[self._readers + s] == 0
+            ]
+            if not free:
+                return None
+
+            # Reuse the oldest slot; seq 0 marks it as being written
+            slot = min(free, key=lambda s: self._header[self._SLOT_SEQ + s])
+            self._header[self._SLOT_SEQ + slot] = 0
+
+        return slot, self._frames[slot]
+
+    # Publish a slot filled by begin_write and return its sequence number
+    def commit(self, slot: int) -> int:
+        with self.lock:
+            seq = int(self._header[self._SEQ]) + 1
+            self._header[self._SEQ] = seq
+            self._header[self._SLOT_SEQ + slot] = seq
+            self._header[self._LATEST] = slot
+
+        return seq
+
+    # Pin the slot still holding frame seq; returns (slot, view), or None once the slot was reused
+    def acquire_seq(self, seq: int) -> Optional[Tuple[int, np.ndarray]]:
+        with self.lock:
+            for slot in range(self.slots):
+                if seq > 0 and self._header[self._SLOT_SEQ + slot] == seq:
+                    self._header[self._readers + slot] += 1
+                    return slot, self._frames[slot]
+        return None
+
+    def release(self, slot: int) -> None:
+        with self.lock:
+            if self._header[self._readers + slot] > 0:
+                self._header[self._readers + slot] -= 1
+
+    # Zero-copy view of a slot, without pinning it
+    def view(self, slot: int) -> np.ndarray:
+        return self._frames[slot]
+
+    # Sequence number of the frame in a slot; 0 while it is being written
+    def seq_of(self, slot: int) -> int:
+        with self.lock:
+            return int(self._header[self._SLOT_SEQ + slot])
+
+    # Slot index if the array is a view of one of the ring slots, else None
+    def slot_of(self, frame: np.ndarray) -> Optional[int]:
+        offset = frame.ctypes.data - self._frames.ctypes.data
+        if offset < 0 or offset % self.frame_nbytes != 0:
+            return None
+
+        slot = offset // self.frame_nbytes
+        return slot if slot < self.slots else None
+
+    def close(self) -> None:
+        # Drop numpy views before closing the mapping
+        self._header = None
+        self._frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Views are still referenced elsewhere (e.g. the blackboard); released on process exit
+            pass
+
+    def unlink(self) -> None:
+        if self.owner:
+            self.shm.unlink()
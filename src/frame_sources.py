@@ -0,0 +1,170 @@
+import glob
+import os
+
+import cv2
+
+from src.utils.datasets import IMAGE_EXTENSIONS
+
+
+# Where VideoCapture reads frames from. read() returns a BGR frame, written into out when the
+# backend can, or None when no frame is available right now. A file source sets finished at its end.
+class FrameSource:
+    # Seconds between frames at the original timing; None for live sources
+    frame_interval = None
+    # True when read failures mean the source is exhausted rather than temporarily unavailable
+    replayable = False
+
+    def __init__(self):
+        self.finished = False
+        # (width, height) requested at open, reused by reopen
+        self.size = (None, None)
+
+    def open(self, width=None, height=None):
+        pass
+
+    def read(self, out=None):
+        raise NotImplementedError
+
+    # Drop the current frame without decoding it
+    def skip(self):
+        self.read()
+
+    def close(self):
+        pass
+
+    def reopen(self):
+        self.close()
+        self.open(*self.size)
+
+
+# Anything cv2.VideoCapture opens: webcams, video files and network streams
+class OpenCVSource(FrameSource):
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+        self.cap = None
+
+    def open(self, width=None, height=None):
+        self.size = (width, height)
+        self.cap = cv2.VideoCapture(self.target)
+        if not self.cap.isOpened():
+            raise IOError(f"Cannot open frame source {self.target!r}.")
+
+        if width and height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+    def read(self, out=None):
+        ret, frame = self.cap.read(out) if out is not None else self.cap.read()
+        if not ret:
+            self.finished = self.replayable
+            return None
+        return frame
+
+    def skip(self):
+        if not self.cap.grab():
+            self.finished = self.replayable
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def __str__(self):
+        return str(self.target)
+
+
+class CameraSource(OpenCVSource):
+    def __init__(self, index=0):
+        super().__init__(index)
+
+
+# RTSP/HTTP stream; read failures are treated as network hiccups and trigger a reconnect
+class StreamSource(OpenCVSource):
+    def open(self, width=None, height=None):
+        super().open(width, height)
+        # Keep only the newest frame buffered so a slow pipeline does not fall behind the stream
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+
+class VideoFileSource(OpenCVSource):
+    replayable = True
+
+    def __init__(self, path, loop=False):
+        super().__init__(path)
+        # Start over at the end instead of finishing
+        self.loop = loop
+
+    def open(self, width=None, height=None):
+        # Files keep their own resolution; VideoCapture resizes into the ring if needed
+        super().open()
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else None
+
+    def read(self, out=None):
+        frame = super().read(out)
+        if frame is None and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self.finished = False
+            frame = super().read(out)
+        return frame
+
+
+# Sorted image files from a folder or a glob pattern, played back at a fixed rate
+class ImageSequenceSource(FrameSource):
+    replayable = True
+
+    def __init__(self, pattern, fps=30, loop=False):
+        super().__init__()
+        self.pattern = pattern
+        self.frame_interval = 1.0 / fps
+        self.loop = loop
+
+        self.paths = []
+        self.index = 0
+
+    def open(self, width=None, height=None):
+        self.size = (width, height)
+        if os.path.isdir(self.pattern):
+            paths = [os.path.join(self.pattern, name) for name in os.listdir(self.pattern)]
+        else:
+            paths = glob.glob(self.pattern)
+
+        self.paths = sorted(p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.paths:
+            raise IOError(f"No images found for {self.pattern!r}.")
+        self.index = 0
+
+    def read(self, out=None):
+        if self.index >= len(self.paths):
+            if not self.loop:
+                self.finished = True
+                return None
+            self.index = 0
+
+        frame = cv2.imread(self.paths[self.index])
+        self.index += 1
+        return frame
+
+    def skip(self):
+        self.index += 1
+
+    def __str__(self):
+        return self.pattern
+
+
+# Frame source for a config value: a camera index, an rtsp/http URL, an image folder or glob, or a video file
+def make_source(spec, fps=30, loop=False):
+    if isinstance(spec, FrameSource):
+        return spec
+
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return CameraSource(int(spec))
+
+    if spec.lower().startswith(("rtsp://", "rtmp://", "http://", "https://")):
+        return StreamSource(spec)
+
+    if os.path.isdir(spec) or any(c in spec for c in "*?["):
+        return ImageSequenceSource(spec, fps=fps, loop=loop)
+
+    return VideoFileSource(spec, loop=loop)
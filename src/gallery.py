@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+
+# Local copy of enrolled embeddings for duplicate checks without a server round-trip.
+# Rows are L2-normalized float32 vectors in a raw file that is memory-mapped read-only.
+# Names are appended to a JSON-lines file next to it, one per row, and the server sync cursor
+# lives in a small JSON file that is replaced atomically. Vectors are written before their names
+# and names before the cursor, so a crash at any point leaves at most trailing rows without a
+# name, which load() and the next add() cut off.
+class EmbeddingGallery:
+    def __init__(self, path="data/gallery", dim=512, approximate=False, approximate_min_size=50000, nprobe=8):
+        self.path = path
+        self.dim = dim
+
+        self.vectors_path = os.path.join(path, "embeddings.f32")
+        self.names_path = os.path.join(path, "names.jsonl")
+        self.meta_path = os.path.join(path, "meta.json")
+
+        # Inverted-file index over k-means cells, used once the gallery is large enough
+        self.approximate = approximate
+        self.approximate_min_size = approximate_min_size
+        self.nprobe = nprobe
+        self.centroids = None
+        self.cells = None
+        self.indexed_count = 0
+
+        self.lock = threading.Lock()
+        self.sync_owner = None
+
+        os.makedirs(path, exist_ok=True)
+        self.load()
+
+    # Reopen the same files when passed to a process stage
+    def __getstate__(self):
+        return {"path": self.path, "dim": self.dim, "approximate": self.approximate,
+                "approximate_min_size": self.approximate_min_size, "nprobe": self.nprobe}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self.names)
+
+    def load(self):
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        else:
+            meta = {"cursor": None}
+
+        self.cursor = meta["cursor"]
+        if "names" in meta and not os.path.exists(self.names_path):
+            # Galleries written before names moved out of meta.json
+            self.write_names(meta["names"])
+            self.save_meta()
+        self.names = self.read_names()
+
+        # Names whose vector row never made it to disk are dropped with it
+        rows = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+        if rows < len(self.names):
+            self.names = self.names[:rows]
+            self.write_names(self.names)
+
+        self.known_names = set(self.names)
+        self.map_vectors()
+
+    # Names of the rows, without a last line cut short by a crash mid-append
+    def read_names(self):
+        if not os.path.exists(self.names_path):
+            return []
+
+        with open(self.names_path, "rb") as f:
+            data = f.read()
+
+        complete = data[:data.rfind(b"\n") + 1]
+        if len(complete) < len(data):
+            with open(self.names_path, "r+b") as f:
+                f.truncate(len(complete))
+
+        return [json.loads(line) for line in complete.decode("utf-8").splitlines()]
+
+    def append_names(self, names, path=None, mode="ab"):
+        with open(path or self.names_path, mode) as f:
+            f.write("".join(json.dumps(name) + "\n" for name in names).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Replace the whole names file; only needed when repairing or converting a gallery
+    def write_names(self, names):
+        tmp_path = self.names_path + ".tmp"
+        self.append_names(names, tmp_path, "wb")
+        os.replace(tmp_path, self.names_path)
+
+    def map_vectors(self):
+        if self.names:
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.names), self.dim))
+        else:
+            self.matrix = np.empty((0, self.dim), dtype=np.float32)
+
+    # Append embeddings not in the gallery yet; cursor is the server position they were synced up to
+    def add(self, vectors, names, cursor=None):
+        with self.lock:
+            rows = [(np.asarray(v, dtype=np.float32), n) for v, n in zip(vectors, names) if n not in self.known_names]
+
+            if rows:
+                block = np.stack([v / np.linalg.norm(v) for v, _ in rows]).astype(np.float32)
+
+                # Drop the mapping before growing the file under it. Writing at the row
+                # count from meta discards rows left over by an interrupted add.
+                self.matrix = None
+                with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                    f.seek(len(self.names) * self.dim * 4)
+                    f.write(block.tobytes())
+                    f.truncate()
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                # Only the new names are written, so adding stays cheap however large the gallery is
+                self.append_names([n for _, n in rows])
+                self.names.extend(n for _, n in rows)
+                self.known_names.update(n for _, n in rows)
+                self.map_vectors()
+
+            if cursor is not None and cursor != self.cursor:
+                self.cursor = cursor
+                self.save_meta()
+
+        return len(rows)
+
+    def save_meta(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"cursor": self.cursor}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    # Top-k (name, cosine similarity) for a normalized embedding, best first
+    def search(self, embedding, k=5):
+        with self.lock:
+            if len(self.names) == 0:
+                return []
+
+            query = np.asarray(embedding, dtype=np.float32)
+            query = query / np.linalg.norm(query)
+
+            if self.approximate and len(self.names) >= self.approximate_min_size:
+                candidates = self.probe(query)
+                scores = self.matrix[candidates] @ query
+            else:
+                candidates = None
+                scores = self.matrix @ query
+
+            k = min(k, len(scores))
+            if k == 0:
+                return []
+
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            rows = candidates[top] if candidates is not None else top
+            return [(self.names[i], float(scores[j])) for i, j in zip(rows, top)]
+
+    # True/False when the best match is clearly above/below the threshold, None when it is too close to call
+    def is_enrolled(self, embedding, threshold=0.5, margin=0.05):
+        # An empty gallery has probably not been synced yet
+        matches = self.search(embedding, k=1)
+        if not matches:
+            return None
+
+        score = matches[0][1]
+        if score >= threshold + margin:
+            return True
+        if score <= threshold - margin:
+            return False
+        return None
+
+    # Row indices in the nprobe cells closest to the query; (re)builds the index as the gallery grows
+    def probe(self, query):
+        if self.centroids is None or len(self.names) > self.indexed_count * 1.1:
+            self.build_index()
+
+        nearest = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        candidates = np.concatenate([self.cells[c] for c in nearest])
+
+        # Rows appended since the last build are always searched exactly
+        fresh = np.arange(self.indexed_count, len(self.names))
+        return np.concatenate([candidates, fresh])
+
+    def build_index(self, iterations=10, seed=0):
+        n = len(self.names)
+        n_cells = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+
+        # Spherical k-means on a sample of the gallery
+        sample = np.asarray(self.matrix[np.sort(rng.choice(n, min(n, n_cells * 40), replace=False))])
+        centroids = sample[rng.choice(len(sample), n_cells, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_cells):
+                members = sample[assign == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / np.linalg.norm(centroid)
+
+        # Assign every row in chunks to keep memory flat
+        assign = np.concatenate([
+            np.argmax(self.matrix[i:i + 65536] @ centroids.T, axis=1) for i in range(0, n, 65536)
+        ])
+
+        self.centroids = centroids
+        self.cells = [np.flatnonzero(assign == c) for c in range(n_cells)]
+        self.indexed_count = n
+
+    # True for the first stage to ask, and for it again on restart; that stage owns the sync loop
+    def claim_sync(self, owner):
+        with self.lock:
+            if self.sync_owner is None:
+                self.sync_owner = owner
+            return self.sync_owner is owner
+
+    # Pull embeddings enrolled on the server since the last sync; fetch(cursor) -> (items, next_cursor)
+    def sync(self, fetch):
+        added = 0
+        while True:
+            previous = self.cursor
+            items, cursor = fetch(previous)
+            added += self.add([item["vector"] for item in items], [item["name"] for item in items], cursor)
+
+            # Stop on an empty page or when the server does not advance the cursor
+            if not items or cursor is None or cursor == previous:
+                return added
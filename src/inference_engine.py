@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from src.metrics import registry
+
+
+# One model instance shared by the stages of several cameras. Each submit() queues a request
+# for a stream; a worker thread packs requests into batches of up to max_batch items, taking one
+# request per stream in turn so a busy camera cannot starve the others.
+class SharedInferenceEngine:
+    def __init__(self, name, infer_batch, max_batch, log):
+        self.name = name
+        # infer_batch(items) -> one output per item, for at most max_batch items
+        self.infer_batch = infer_batch
+        self.max_batch = max_batch
+        self.log = log
+
+        self.requests = {}
+        # Streams with pending requests, next to be served first
+        self.order = deque()
+        self.cond = threading.Condition()
+
+        self.batches = 0
+        self.items = 0
+        self.served = {}
+        self.metrics = registry.stage(f"{name}-engine")
+
+        threading.Thread(target=self.run, name=f"{name}-engine", daemon=True).start()
+
+    # Future resolving to the outputs for items, in order
+    def submit(self, stream, items) -> Future:
+        future = Future()
+        with self.cond:
+            queue = self.requests.setdefault(stream, deque())
+            if not queue:
+                self.order.append(stream)
+            queue.append((list(items), future))
+            self.cond.notify()
+        return future
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.order)
+                batch = self.take_batch()
+
+            items = [item for request_items, _ in batch for item in request_items]
+            t1 = time.perf_counter()
+            try:
+                outputs = []
+                # A single request may be larger than the model batch
+                for start in range(0, len(items), self.max_batch):
+                    with self.metrics.time("inference"):
+                        outputs.extend(self.infer_batch(items[start:start + self.max_batch]))
+            except Exception as e:
+                self.log.error(f"{self.name} inference failed: {e}")
+                self.metrics.count("failed")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+            self.metrics.count("items", len(items))
+            self.metrics.frame(t1)
+
+            start = 0
+            for request_items, future in batch:
+                future.set_result(outputs[start:start + len(request_items)])
+                start += len(request_items)
+
+    # Round-robin over streams, one request each, until the batch is full
+    def take_batch(self):
+        batch, size = [], 0
+        while self.order and size < self.max_batch:
+            stream = self.order.popleft()
+            queue = self.requests[stream]
+
+            items, future = queue[0]
+            if batch and size + len(items) > self.max_batch:
+                # Does not fit; this stream goes first next time
+                self.order.appendleft(stream)
+                break
+
+            queue.popleft()
+            batch.append((items, future))
+            size += len(items)
+            self.served[stream] = self.served.get(stream, 0) + len(items)
+
+            if queue:
+                self.order.append(stream)
+
+        return batch
+
+    def stats(self):
+        with self.cond:
+            mean_batch = self.items / self.batches if self.batches else 0.0
+            pending = sum(len(items) for queue in self.requests.values() for items, _ in queue)
+            return {"batches": self.batches, "items": self.items, "mean_batch": mean_batch, "pending": pending,
+                    "served": dict(self.served)}
@@ -0,0 +1,136 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+from src.blackboard import BlackboardStateful
+from src.metrics import MetricsHandler, registry
+from src.preview import PreviewRenderer, select_preview_frame
+
+BOUNDARY = "frame"
+
+
+# Local HTTP front end of a headless kiosk:
+#   GET  /preview.mjpg        MJPEG preview stream
+#   GET  /status              enrollment state, achieved and target fps per stage, queue depth as JSON
+#   POST /enrollment/start    arm enrollment (sets run_state_event)
+#   POST /enrollment/stop     disarm enrollment
+#   GET  /metrics, /trace     as served by MetricsServer
+# Preview frames are encoded only while at least one client is streaming.
+class KioskServer(BlackboardStateful):
+    def __init__(self, stop_event, run_state_event, host="127.0.0.1", port=8080, renderer=None,
+                 enrollment_queue=None, gallery=None, camera=None, scheduler=None, frame_ring=None):
+        super().__init__(camera)
+
+        self.stop_event = stop_event
+        self.run_state_event = run_state_event
+
+        # Shared by all preview clients, so a frame is encoded once however many are watching
+        self.renderer = renderer or PreviewRenderer(camera=camera, scheduler=scheduler)
+        self.enrollment_queue = enrollment_queue
+        self.gallery = gallery
+        self.scheduler = scheduler
+        # Ring capture writes into, so previews of captured frames can pin their slot
+        self.frame_ring = frame_ring
+
+        self.lock = threading.Lock()
+        self.clients = 0
+
+        handler = type("Handler", (KioskHandler,), {"kiosk": self, "metrics": registry})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def status(self):
+        frames, _ = self.get_state_seq("default_frame")
+        stages = {item["stage"]: {"fps": round(item["fps"], 1), "target_fps": item["target"],
+                                  "frames": item["counters"].get("frames", 0)}
+                  for item in registry.snapshot() if item["camera"] == self.camera}
+
+        status = {
+            "enrolling": self.run_state_event.is_set(), "frames": frames,
+            "last_embedding_frame_id": self.get_state("embedding_frame_id"),
+            "preview_clients": self.clients, "preview": self.renderer.stats(), "stages": stages
+        }
+        if self.enrollment_queue is not None:
+            status["enrollment_queue"] = self.enrollment_queue.stats()
+        if self.gallery is not None:
+            status["gallery_size"] = len(self.gallery)
+        if self.scheduler is not None:
+            status["cpu_pressure"] = round(self.scheduler.pressure, 2)
+            status["idle"] = self.scheduler.is_idle(self.camera)
+        return status
+
+    # Write JPEGs to one client until it disconnects or the kiosk stops
+    def stream_preview(self, write):
+        with self.lock:
+            self.clients += 1
+
+        key = None
+        try:
+            while not self.stop_event.is_set():
+                frame_key, frame = select_preview_frame(self, self.frame_ring)
+                if frame is not None and frame_key != key:
+                    # Another client may have rendered this frame already
+                    jpeg = self.renderer.render(frame, frame_key) or self.renderer.latest()
+                    key = frame_key
+                    write(jpeg)
+
+                self.stop_event.wait(timeout=self.renderer.interval)
+        finally:
+            with self.lock:
+                self.clients -= 1
+
+
+class KioskHandler(MetricsHandler):
+    kiosk = None
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/preview.mjpg":
+            self.stream_preview()
+        elif path == "/status":
+            self.reply_json(200, self.kiosk.status())
+        else:
+            super().do_GET()
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        if path == "/enrollment/start":
+            self.kiosk.run_state_event.set()
+        elif path == "/enrollment/stop":
+            self.kiosk.run_state_event.clear()
+        else:
+            self.send_error(404)
+            return
+
+        self.reply_json(200, {"enrolling": self.kiosk.run_state_event.is_set()})
+
+    def stream_preview(self):
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def write(jpeg):
+            self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n"
+                             .encode())
+            self.wfile.write(jpeg)
+            self.wfile.write(b"\r\n")
+            self.wfile.flush()
+
+        try:
+            self.kiosk.stream_preview(write)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away
+            pass
@@ -0,0 +1,305 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.blackboard import BlackboardStateful
+from src.tracing import tracer
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Seconds over which a stage's achieved fps is averaged
+FPS_WINDOW = 1.0
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf overflow, not cumulative
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Upper bound of the bucket holding the q-quantile; the largest bound when it overflows
+    def quantile(self, q):
+        if self.count == 0:
+            return 0.0
+
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+# Latency histograms per phase ("total", "inference", ...), event counters and achieved fps of one
+# pipeline stage. Stages time their work with time(phase) and call frame() once per processed item.
+class StageMetrics:
+    def __init__(self, stage, camera=None):
+        self.stage = stage
+        self.camera = camera
+
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        # Current values such as a queue depth, overwritten on every set()
+        self.gauges = {}
+
+        self.fps = 0.0
+        # Rate the scheduler currently assigns the stage, None when unscheduled
+        self.target = None
+        self.window_start = time.perf_counter()
+        self.window_frames = 0
+
+    def observe(self, phase, seconds):
+        with self.lock:
+            histogram = self.histograms.get(phase)
+            if histogram is None:
+                histogram = self.histograms[phase] = Histogram()
+            histogram.observe(seconds)
+
+    # Also traced, so phases show up nested in the span of the stage that ran them
+    @contextmanager
+    def time(self, phase):
+        t1 = time.perf_counter()
+        try:
+            yield
+        finally:
+            t2 = time.perf_counter()
+            self.observe(phase, t2 - t1)
+            tracer.add(phase, t1, t2, camera=self.camera, cat="phase", stage=self.stage)
+
+    def count(self, event, n=1):
+        with self.lock:
+            self.counters[event] = self.counters.get(event, 0) + n
+
+    def set(self, gauge, value):
+        with self.lock:
+            self.gauges[gauge] = value
+
+    # One item fully processed; t1 is the perf_counter() at which work on it started
+    def frame(self, t1=None):
+        now = time.perf_counter()
+        if t1 is not None:
+            self.observe("total", now - t1)
+
+        with self.lock:
+            self.counters["frames"] = self.counters.get("frames", 0) + 1
+            self.window_frames += 1
+            self.roll(now)
+
+    def roll(self, now):
+        elapsed = now - self.window_start
+        if elapsed >= FPS_WINDOW:
+            self.fps = self.window_frames / elapsed
+            self.window_start, self.window_frames = now, 0
+
+    # Plain-data copy, also sent from process stages to the parent
+    def snapshot(self):
+        with self.lock:
+            self.roll(time.perf_counter())
+            return {
+                "stage": self.stage, "camera": self.camera, "fps": self.fps, "target": self.target,
+                "counters": dict(self.counters), "gauges": dict(self.gauges),
+                "histograms": {phase: (h.buckets, list(h.counts), h.sum, h.count)
+                               for phase, h in self.histograms.items()}
+            }
+
+    # The target stays as set by the scheduler of this process
+    def load(self, snapshot):
+        with self.lock:
+            self.fps = snapshot["fps"]
+            self.counters = dict(snapshot["counters"])
+            self.gauges = dict(snapshot.get("gauges", {}))
+            self.histograms = {}
+            for phase, (buckets, counts, total, count) in snapshot["histograms"].items():
+                histogram = self.histograms[phase] = Histogram(buckets)
+                histogram.counts, histogram.sum, histogram.count = list(counts), total, count
+
+
+# All stage metrics of the process, rendered in the Prometheus text format
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def stage(self, stage, camera=None) -> StageMetrics:
+        with self.lock:
+            metrics = self.stages.get((stage, camera))
+            if metrics is None:
+                metrics = self.stages[(stage, camera)] = StageMetrics(stage, camera)
+            return metrics
+
+    def snapshot(self):
+        with self.lock:
+            stages = list(self.stages.values())
+        return [metrics.snapshot() for metrics in stages]
+
+    # Take over the metrics of stages running in a child process
+    def merge(self, snapshot):
+        for item in snapshot:
+            self.stage(item["stage"], item["camera"]).load(item)
+
+    # Short per-stage lines for the GUI overlay
+    def summary(self, camera=None):
+        lines = []
+        for item in self.snapshot():
+            if item["camera"] != camera or "total" not in item["histograms"]:
+                continue
+
+            total = rebuild(item["histograms"]["total"])
+            inference = item["histograms"].get("inference")
+            share = rebuild(inference).sum / total.sum if inference and total.sum else 0.0
+            fps = f"{item['fps']:.1f}" if item["target"] is None else f"{item['fps']:.1f}/{item['target']:.0f}"
+            lines.append(f"{item['stage']}: {fps} fps, p95 {total.quantile(0.95) * 1000:.0f} ms, "
+                         f"inference {share * 100:.0f}%")
+        return lines
+
+    def render(self):
+        snapshot = self.snapshot()
+        out = []
+
+        out.append("# HELP enrollment_stage_latency_seconds Time spent per pipeline stage and phase.")
+        out.append("# TYPE enrollment_stage_latency_seconds histogram")
+        for item in snapshot:
+            for phase, state in sorted(item["histograms"].items()):
+                labels = stage_labels(item, phase=phase)
+                buckets, counts, total, count = state
+                cumulative = 0
+                for bound, n in zip(buckets, counts):
+                    cumulative += n
+                    out.append(f'enrollment_stage_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                out.append(f'enrollment_stage_latency_seconds_bucket{{{labels},le="+Inf"}} {count}')
+                out.append(f"enrollment_stage_latency_seconds_sum{{{labels}}} {total:.6f}")
+                out.append(f"enrollment_stage_latency_seconds_count{{{labels}}} {count}")
+
+        out.append("# HELP enrollment_stage_fps Items a stage processed per second over the last window.")
+        out.append("# TYPE enrollment_stage_fps gauge")
+        for item in snapshot:
+            out.append(f"enrollment_stage_fps{{{stage_labels(item)}}} {item['fps']:.2f}")
+
+        out.append("# HELP enrollment_stage_target_fps Rate the scheduler currently assigns a stage.")
+        out.append("# TYPE enrollment_stage_target_fps gauge")
+        for item in snapshot:
+            if item["target"] is not None:
+                out.append(f"enrollment_stage_target_fps{{{stage_labels(item)}}} {item['target']:.2f}")
+
+        out.append("# HELP enrollment_stage_events_total Frames processed, dropped or failed per stage.")
+        out.append("# TYPE enrollment_stage_events_total counter")
+        for item in snapshot:
+            for event, n in sorted(item["counters"].items()):
+                out.append(f"enrollment_stage_events_total{{{stage_labels(item, event=event)}}} {n}")
+
+        out.append("# HELP enrollment_stage_gauge Current value of a stage quantity, such as a queue depth.")
+        out.append("# TYPE enrollment_stage_gauge gauge")
+        for item in snapshot:
+            for gauge, value in sorted(item["gauges"].items()):
+                out.append(f"enrollment_stage_gauge{{{stage_labels(item, gauge=gauge)}}} {gauge_value(value)}")
+
+        boards = BlackboardStateful.board_stats()
+        for name, help_text in (("published", "Values published per blackboard key."),
+                                ("overwritten", "Values replaced before any waiting stage took them."),
+                                ("skipped", "Values a waiting stage jumped over to reach the latest one.")):
+            out.append(f"# HELP enrollment_blackboard_{name}_total {help_text}")
+            out.append(f"# TYPE enrollment_blackboard_{name}_total counter")
+            for camera, keys in boards.items():
+                for key, stats in sorted(keys.items()):
+                    if stats["published"]:
+                        out.append(f'enrollment_blackboard_{name}_total{{camera="{camera or ""}",key="{key}"}} '
+                                   f'{stats[name]}')
+
+        return "\n".join(out) + "\n"
+
+
+def rebuild(state):
+    buckets, counts, total, count = state
+    histogram = Histogram(buckets)
+    histogram.counts, histogram.sum, histogram.count = counts, total, count
+    return histogram
+
+
+def stage_labels(item, **extra):
+    labels = {"stage": item["stage"], "camera": item["camera"] or "", **extra}
+    return ",".join(f'{k}="{v}"' for k, v in labels.items())
+
+
+# Full precision, so large gauges such as Unix timestamps keep their sub-second digits
+def gauge_value(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+# Process-wide registry the stages and API clients record into
+registry = MetricsRegistry()
+
+
+# Serves GET /metrics in the Prometheus text format for scraping, and GET /trace with the recent
+# stage spans as Chrome trace JSON, on localhost by default
+class MetricsServer:
+    def __init__(self, host="127.0.0.1", port=9100, metrics=registry):
+        handler = type("Handler", (MetricsHandler,), {"metrics": metrics})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# Started MetricsServer on port, or None when port is 0 or already taken; a busy port only costs
+# the metrics endpoint, not the pipeline
+def start_metrics_server(port, log, host="127.0.0.1"):
+    if not port:
+        return None
+
+    try:
+        server = MetricsServer(host, port).start()
+    except OSError as e:
+        log.warning(f"Metrics endpoint disabled, cannot listen on {host}:{port}: {e}")
+        return None
+
+    log.info(f"Serving metrics on {server.url}")
+    return server
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    metrics = None
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            self.reply(200, self.metrics.render().encode(), "text/plain; version=0.0.4")
+        elif path == "/trace":
+            self.reply_json(200, tracer.chrome_trace())
+        else:
+            self.send_error(404)
+
+    def reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply_json(self, status, payload):
+        self.reply(status, json.dumps(payload).encode(), "application/json")
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+import openvino as ov
+from openvino.preprocess import ColorFormat, PrePostProcessor, ResizeAlgorithm
+
+# OpenVINO writes compiled blobs here and reuses them on later launches
+CACHE_DIR = "models/cache"
+
+# Inference precision modes and the compile hint each one uses
+PRECISIONS = {
+    "FP32": {"INFERENCE_PRECISION_HINT": "f32"},
+    "FP16": {"INFERENCE_PRECISION_HINT": "f16"},
+    "INT8": {},
+}
+
+# Read/compile timings of every model loaded in this process, by model name
+startup_times = {}
+
+_core = None
+_core_lock = threading.Lock()
+
+
+# One OpenVINO Core per process, shared by every stage, with the compiled-blob cache enabled
+def get_core(cache_dir=CACHE_DIR) -> ov.Core:
+    global _core
+
+    with _core_lock:
+        if _core is None:
+            _core = ov.Core()
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+                _core.set_property({"CACHE_DIR": cache_dir})
+
+    return _core
+
+
+# Convert an ONNX model to OpenVINO IR next to it, once; IR is returned unchanged
+def prepare_ir(model_path: str) -> str:
+    root, ext = os.path.splitext(model_path)
+    if ext.lower() != ".onnx":
+        return model_path
+
+    ir_path = root + ".xml"
+    if not os.path.exists(ir_path) or os.path.getmtime(ir_path) < os.path.getmtime(model_path):
+        model = ov.convert_model(model_path)
+        ov.save_model(model, ir_path, compress_to_fp16=False)
+
+    return ir_path
+
+
+# IR file holding a precision mode of the model, e.g. models/arcfaceresnet100-8-int8.xml
+def variant_path(model_path: str, precision: str = "FP32") -> str:
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {list(PRECISIONS)}.")
+
+    ir_path = prepare_ir(model_path)
+    if precision == "FP32":
+        return ir_path
+
+    return os.path.splitext(ir_path)[0] + f"-{precision.lower()}.xml"
+
+
+# FP16 weights are compressed on first use, INT8 must have been produced by cmd/quantize_models.py
+def precision_model_path(model_path: str, precision: str = "FP32") -> str:
+    path = variant_path(model_path, precision)
+
+    if precision == "FP16" and not os.path.exists(path):
+        ov.save_model(ov.Core().read_model(model=prepare_ir(model_path)), path, compress_to_fp16=True)
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found. Run cmd/quantize_models.py to create the INT8 model.")
+
+    return path
+
+
+def read_model(core: ov.Core, model_path: str, name: str, precision: str = "FP32") -> ov.Model:
+    t1 = time.time()
+    model = core.read_model(model=precision_model_path(model_path, precision))
+    startup_times.setdefault(name, {})["read"] = time.time() - t1
+
+    return model
+
+
+# Precision hints are only understood by the CPU and GPU plugins
+def compile_config(device: str, precision: str) -> dict:
+    return PRECISIONS[precision] if device in ("CPU", "GPU") else {}
+
+
+def compile_model(core: ov.Core, model: ov.Model, device: str, name: str, log=None,
+                  precision: str = "FP32") -> ov.CompiledModel:
+    cache_dir = core.get_property("CACHE_DIR")
+    blobs_before = count_blobs(cache_dir)
+
+    t1 = time.time()
+    compiled = core.compile_model(model=model, device_name=device, config=compile_config(device, precision))
+    elapsed = time.time() - t1
+
+    # A new blob means the cache had nothing for this model/device yet
+    cache = "miss" if count_blobs(cache_dir) > blobs_before else "hit"
+
+    times = startup_times.setdefault(name, {})
+    times.update({"compile": elapsed, "cache": cache if cache_dir else "off"})
+
+    if log is not None:
+        log.info(f"{name}: read {times.get('read', 0.0):.2f}s, compiled {precision} on {device} in {elapsed:.2f}s "
+                 f"(cache {times['cache']})")
+
+    return compiled
+
+
+# Build resize, color conversion and layout change into the graph so the compiled
+# model takes raw BGR uint8 NHWC crops of any size
+def add_bgr_preprocessing(model: ov.Model, to_rgb: bool = False) -> ov.Model:
+    ppp = PrePostProcessor(model)
+
+    ppp.input().tensor() \
+        .set_element_type(ov.Type.u8) \
+        .set_layout(ov.Layout("NHWC")) \
+        .set_color_format(ColorFormat.BGR) \
+        .set_spatial_dynamic_shape()
+
+    steps = ppp.input().preprocess().convert_element_type(ov.Type.f32)
+    if to_rgb:
+        steps.convert_color(ColorFormat.RGB)
+    steps.resize(ResizeAlgorithm.RESIZE_LINEAR)
+
+    ppp.input().model().set_layout(ov.Layout("NCHW"))
+
+    return ppp.build()
+
+
+def count_blobs(cache_dir) -> int:
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return 0
+    return sum(1 for f in os.listdir(cache_dir) if f.endswith(".blob"))
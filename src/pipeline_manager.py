@@ -1,22 +1,61 @@
 import inspect
-from typing import Any, Dict
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from src.process_stage import ProcessStage
+from src.scheduler import Scheduler
+
+
+class ExecutionMode(Enum):
+    THREAD = 'thread'
+    PROCESS = 'process'
 
 
 class PipelineManager:
-    def __init__(self, deps: Dict[str, Any], classes: list[type]):
+    # classes entries are either a stage class (thread mode) or a (class, mode) tuple.
+    # cameras, when given, holds per-camera dep overrides with a unique "camera" name; every
+    # stage is then built once per camera on that camera's blackboard.
+    def __init__(self, deps: Dict[str, Any], classes: list, cameras: Optional[List[Dict[str, Any]]] = None):
         self.deps = deps
         self.classes = classes
+        self.cameras = cameras
 
         self.pipelines = {}
 
+        # Rate targets of all stages, adjusted to CPU load while running
+        self.scheduler = Scheduler(deps["stop_event"], fps=deps.get("fps", 30), log=deps.get("log"))
+
     def build(self):
-        for cls in self.classes:
-            sig = inspect.signature(cls.__init__)
-            kwargs = {k: self.deps[k] for k in sig.parameters if k in self.deps}
-            self.pipelines[cls.__name__] = cls(**kwargs)
+        for overrides in self.cameras or [{}]:
+            deps = {**self.deps, **overrides, "scheduler": self.scheduler}
+            camera = overrides.get("camera")
+
+            for entry in self.classes:
+                cls, mode = entry if isinstance(entry, tuple) else (entry, ExecutionMode.THREAD)
+                mode = ExecutionMode(mode)
+                name = cls.__name__ if camera is None else f"{camera}/{cls.__name__}"
+                self.scheduler.register(cls.__name__, camera, fps=deps.get("fps"),
+                                        run_state_event=deps.get("run_state_event"))
+
+                if mode is ExecutionMode.PROCESS:
+                    # Models are loaded inside the child process when the stage starts
+                    self.pipelines[name] = ProcessStage(cls, deps)
+                    continue
+
+                sig = inspect.signature(cls.__init__)
+                kwargs = {k: deps[k] for k in sig.parameters if k in deps}
+                self.pipelines[name] = cls(**kwargs)
 
         return self.pipelines
 
+    # A dependency as the stages of camera see it, with that camera's overrides applied
+    def dep(self, name, camera=None):
+        for overrides in self.cameras or []:
+            if overrides.get("camera") == camera and name in overrides:
+                return overrides[name]
+        return self.deps.get(name)
+
     def run(self):
+        self.scheduler.start()
         for pipeline in self.pipelines.values():
             pipeline.start()
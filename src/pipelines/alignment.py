@@ -4,22 +4,31 @@ import time
 import cv2
 import mediapipe as mp
 
-from src.blackboard import BlackboardStateful
+from src.metrics import registry
+from src.scheduler import ScheduledStage
+from src.tracing import tracer
 
 BaseOptions = mp.tasks.BaseOptions
 FaceAlignerOptions = mp.tasks.vision.FaceAlignerOptions
 FaceAligner = mp.tasks.vision.FaceAligner
 
 
-class FaceAlignment(BlackboardStateful):
-    def __init__(self, stop_event, run_state_event, log, fps = 30):
-        super().__init__()
+class FaceAlignment(ScheduledStage):
+    # Blackboard keys bridged when the stage runs in its own process
+    inputs = ('validated_faces',)
+    outputs = ('aligned_faces', 'aligned_face')
+
+    def __init__(self, stop_event, run_state_event, log, fps = 30, camera = None, scheduler = None):
+        super().__init__(camera)
 
         self.run_state_event = run_state_event
         self.stop_event = stop_event
         self.log = log
 
         self.fps = fps
+        self.scheduler = scheduler
+
+        self.metrics = registry.stage(type(self).__name__, camera)
 
         # Initialize MediaPipe Face Aligner
         self.landmarker_model_path = "models/face_landmarker.task"
@@ -29,7 +38,9 @@ class FaceAlignment(BlackboardStateful):
         threading.Thread(target=self.alignment_loop, daemon=True).start()
 
     def alignment_loop(self):
-        frame_time = 1.0 / self.fps
+        frame_time = self.input_timeout()
+        face_seq = 0
+        t1 = 0.0
 
         while True:
             if self.stop_event.is_set():
@@ -37,32 +48,48 @@ class FaceAlignment(BlackboardStateful):
                 break
 
             if not self.run_state_event.is_set():
-                self.set_state("aligned_face", None)
+                if self.has_state("aligned_faces"):
+                    self.publish_faces([])
 
-                time.sleep(min(frame_time, 0.01))
+                self.run_state_event.wait(timeout=frame_time)
                 continue
 
-            t1 = time.time()
-
-            face_roi = self.get_state("detected_face")
-
-            if face_roi is None:
-                self.set_state("aligned_face", None)
+            self.yield_slot(t1)
 
-                time.sleep(min(frame_time, 0.01))
+            # Block until validation publishes newer faces; rejected faces never reach ArcFace
+            item = self.wait_state("validated_faces", face_seq, timeout=frame_time)
+            if item is None:
                 continue
 
-            # Align face
-            aligned_face = self.align_face(face_roi)
+            face_seq, validated_faces = item
+            t1 = time.perf_counter()
+            trace = self.frame_of("validated_faces")
 
-            if aligned_face is not None:
-                self.set_state("aligned_face", aligned_face)
-            else:
-                self.set_state("aligned_face", None)
+            if not validated_faces:
+                if self.has_state("aligned_faces"):
+                    self.publish_faces([], trace)
+                continue
 
-            elapsed_time = time.time() - t1
-            sleep_time = max(0.0, frame_time - elapsed_time)
-            time.sleep(sleep_time)
+            # Align faces
+            aligned_faces = []
+            for face_id, face_roi, quality in validated_faces:
+                with self.metrics.time("inference"):
+                    aligned_face = self.align_face(face_roi)
+                if aligned_face is not None:
+                    aligned_faces.append((face_id, aligned_face, quality))
+
+            self.publish_faces(aligned_faces, trace)
+            self.metrics.frame(t1)
+            tracer.add(type(self).__name__, t1, time.perf_counter(), trace, self.camera, faces=len(aligned_faces))
+
+    # Publish all (face_id, aligned_face, quality) triples, plus the first face for single-face consumers
+    def publish_faces(self, faces, trace=None):
+        if faces:
+            self.set_state("aligned_faces", faces, frame=trace)
+            self.set_state("aligned_face", faces[0][1], frame=trace)
+        else:
+            self.set_state("aligned_faces", None, frame=trace)
+            self.set_state("aligned_face", None, frame=trace)
 
     def init_face_aligner(self):
         with open(self.landmarker_model_path, 'rb') as f:
@@ -5,17 +5,42 @@ import cv2
 
 import mediapipe as mp
 
-from src.blackboard import BlackboardStateful
+from src.metrics import registry
+from src.scheduler import ScheduledStage
+from src.tracing import tracer
+from src.utils.tracking import FaceIdTracker, OpticalFlowTracker
 
 
-class FaceDetection(BlackboardStateful):
-    def __init__(self, stop_event, log, fps = 30):
-        super().__init__()
+class FaceDetection(ScheduledStage):
+    # Blackboard keys bridged when the stage runs in its own process
+    inputs = ('default_frame',)
+    outputs = ('detected_faces', 'detected_face', 'processed_frame')
+
+    def __init__(self, stop_event, log, fps = 30, frame_ring = None, max_faces = 4, detect_every = 1,
+                 detection_width = None, camera = None, scheduler = None):
+        super().__init__(camera)
 
         self.stop_event = stop_event
         self.log = log
 
         self.fps = fps
+        self.scheduler = scheduler
+
+        self.frame_ring = frame_ring
+
+        # Faces published per frame, each with an id that stays stable while the face is tracked
+        self.max_faces = max_faces
+        self.face_ids = FaceIdTracker()
+
+        # Run the detector every N frames and track boxes in between; 1 detects every frame
+        self.detect_every = detect_every
+        self.face_tracker = OpticalFlowTracker()
+        self.frames_since_detection = 0
+
+        # Width the detector runs at (height keeps the aspect ratio); None uses the native resolution
+        self.detection_width = detection_width
+
+        self.metrics = registry.stage(type(self).__name__, camera)
 
         # Initialize MediaPipe Face Detection
         self.init_face_detection()
@@ -27,45 +52,114 @@ class FaceDetection(BlackboardStateful):
         threading.Thread(target=self.detection_loop, daemon=True).start()
 
     def detection_loop(self):
-        frame_time = 1.0 / self.fps
+        frame_time = self.input_timeout()
+        frame_seq = 0
+        t1 = 0.0
 
         while True:
             if self.stop_event.is_set():
                 self.log.info("Stop event set. Stopping detection.")
                 break
 
-            t1 = time.time()
+            self.yield_slot(t1)
+
+            # Block until capture publishes a newer frame
+            item = self.wait_state("default_frame", frame_seq, timeout=frame_time)
+            if item is None:
+                continue
 
-            default_frame = self.get_state("default_frame")
+            frame_seq, default_frame = item
 
             if default_frame is None:
-                time.sleep(min(frame_time, 0.01))
                 continue
 
-            # Detect faces
-            results = self.detect_face(default_frame)
-            if results[0] is not None:
-                # Make bounding boxes
-                bboxes = make_bboxes(default_frame, results[0])
-                if bboxes is not None and len(bboxes) > 0:
-                    face_roi = self.get_face_roi(default_frame, bboxes[0])
+            t1 = time.perf_counter()
+            trace = self.frame_of("default_frame")
 
-                    if face_roi is not None:
-                        self.set_state("detected_face", face_roi)
-                    else:
-                        self.set_state("detected_face", None)
-                else:
-                    self.set_state("detected_face", None)
-
-                processed_frame = self.draw_detections(default_frame, results[0])
-                self.set_state("processed_frame", processed_frame)
+            if self.frame_ring is None:
+                self.process_frame(default_frame, trace)
+                self.metrics.frame(t1)
+                tracer.add(type(self).__name__, t1, time.perf_counter(), trace, self.camera)
+                continue
 
-            else:
-                self.set_state("detected_face", None)
+            # Pin the slot of the frame we were woken for so capture cannot overwrite it mid-detection.
+            # Capture numbers ring frames by their ring sequence.
+            ref = self.frame_ring.acquire_seq(trace.frame_id) if trace is not None else None
+            if ref is None:
+                # Capture already reused the slot; the next frame is on its way
+                self.metrics.count("frame_reused")
+                continue
 
-            elapsed_time = time.time() - t1
-            sleep_time = max(0.0, frame_time - elapsed_time)
-            time.sleep(sleep_time)
+            slot, default_frame = ref
+            try:
+                self.process_frame(default_frame, trace)
+            finally:
+                self.frame_ring.release(slot)
+            self.metrics.frame(t1)
+            tracer.add(type(self).__name__, t1, time.perf_counter(), trace, self.camera)
+
+    # trace is the FrameTrace of default_frame, passed on to everything published from it
+    def process_frame(self, default_frame, trace=None):
+        gray = None
+        if self.detect_every > 1:
+            gray = cv2.cvtColor(default_frame, cv2.COLOR_BGR2GRAY)
+
+            # Propagate the last boxes unless a detector run is due or tracking was lost
+            if self.frames_since_detection < self.detect_every - 1 and self.face_tracker.active:
+                with self.metrics.time("tracking"):
+                    bboxes = self.face_tracker.update(gray)
+                if bboxes is not None:
+                    self.frames_since_detection += 1
+                    self.publish_bboxes(default_frame, bboxes, trace)
+                    self.set_state("processed_frame", draw_bboxes(self.drawable(default_frame), bboxes), frame=trace)
+                    return
+
+        # Detect faces
+        results = self.detect_face(default_frame)
+        self.frames_since_detection = 0
+
+        if not results.detections:
+            self.face_ids.reset()
+            self.face_tracker.reset()
+            self.publish_faces([], trace)
+            # Nothing to draw; the preview shows the captured frame instead
+            self.set_state("processed_frame", None, frame=trace)
+            return
+
+        # Make bounding boxes
+        bboxes = make_bboxes(default_frame, results)[:self.max_faces]
+        if gray is not None:
+            self.face_tracker.start(gray, bboxes)
+
+        self.publish_bboxes(default_frame, bboxes, trace)
+
+        processed_frame = self.draw_detections(self.drawable(default_frame), results)
+        self.set_state("processed_frame", processed_frame, frame=trace)
+
+    # Frame to draw the boxes on. A ring slot is reused by capture and read by other stages, so the
+    # published frame has to be a copy; a frame captured without the ring is ours to draw on.
+    def drawable(self, frame):
+        return frame.copy() if self.frame_ring is not None else frame
+
+    def publish_bboxes(self, frame, bboxes, trace=None):
+        face_ids = self.face_ids.assign(bboxes)
+
+        faces = []
+        for face_id, bbox in zip(face_ids, bboxes):
+            face_roi = self.get_face_roi(frame, bbox)
+            if face_roi is not None:
+                faces.append((face_id, face_roi))
+
+        self.publish_faces(faces, trace)
+
+    # Publish all (face_id, face_roi) pairs, plus the first face for single-face consumers
+    def publish_faces(self, faces, trace=None):
+        if faces:
+            self.set_state("detected_faces", faces, frame=trace)
+            self.set_state("detected_face", faces[0][1], frame=trace)
+        else:
+            self.set_state("detected_faces", None, frame=trace)
+            self.set_state("detected_face", None, frame=trace)
 
     def init_face_detection(self):
         mp_face_detection = mp.solutions.face_detection.FaceDetection
@@ -73,8 +167,18 @@ class FaceDetection(BlackboardStateful):
 
     # Detect face using MediaPipe Face Detection
     def detect_face(self, frame):
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        detections = self.face_detection.process(frame)
+        # Downscale once. MediaPipe boxes are relative, so make_bboxes projects them
+        # back onto the full-resolution frame and ROIs are cropped from the sharp original.
+        with self.metrics.time("preprocess"):
+            frame_h, frame_w = frame.shape[:2]
+            if self.detection_width and frame_w > self.detection_width:
+                size = (self.detection_width, round(frame_h * self.detection_width / frame_w))
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        with self.metrics.time("inference"):
+            detections = self.face_detection.process(frame)
 
         return detections
 
@@ -97,8 +201,8 @@ class FaceDetection(BlackboardStateful):
             self.log.error("Invalid ROI size.")
             return None
 
-        # Extract the region of interest
-        face_roi = frame[y:y + h, x:x + w]
+        # Extract the region of interest; copy so it outlives a reused ring slot
+        face_roi = frame[y:y + h, x:x + w].copy()
 
         # Check if the ROI is valid
         if face_roi.size == 0:
@@ -116,6 +220,13 @@ class FaceDetection(BlackboardStateful):
         return frame
 
 
+# Draw tracked boxes, used on frames where the detector did not run
+def draw_bboxes(frame, bboxes):
+    for x, y, w, h in bboxes:
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    return frame
+
+
 # Create bounding boxes from MediaPipe detection results
 def make_bboxes(frame, results):
     h, w, _ = frame.shape
@@ -131,7 +242,7 @@ def make_bboxes(frame, results):
             box_width = max(0.0, min(1.0, bbox_c.width))
             box_height = max(0.0, min(1.0, bbox_c.height))
 
-            # Scale to image size
+            # Scale to the size of the frame passed in, whatever resolution detection ran at
             x_min = int(x_min * w)
             y_min = int(y_min * h)
             box_width = int(box_width * w)
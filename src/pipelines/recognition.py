@@ -5,70 +5,228 @@ import openvino as ov
 import numpy as np
 import cv2
 
-from src.blackboard import BlackboardStateful
+from src.inference_engine import SharedInferenceEngine
+from src.metrics import registry
+from src.scheduler import ScheduledStage
+from src.tracing import tracer
+from src.model_cache import get_core, read_model, compile_model, add_bgr_preprocessing
+from src.utils.embedding_cache import EmbeddingCache
 
+ARCFACE_MODEL_PATH = "models/arcfaceresnet100-8.onnx"
 
-class RecognitionArcFace(BlackboardStateful):
-    def __init__(self, stop_event, run_state_event, log, device = 'CPU', fps = 30):
-        super().__init__()
+
+class RecognitionArcFace(ScheduledStage):
+    # Blackboard keys bridged when the stage runs in its own process
+    inputs = ('selected_faces',)
+    outputs = ('embedding_frame_id', 'embeddings', 'embedding')
+
+    def __init__(self, stop_event, run_state_event, log, device = 'CPU', fps = 30, infer_requests = 2, max_faces = 4,
+                 arcface_precision = 'FP32', top_k = 3, embedding_cache_size = 64, camera = None, scheduler = None,
+                 arcface_engine = None):
+        super().__init__(camera)
 
         self.run_state_event = run_state_event
         self.stop_event = stop_event
         self.log = log
 
         self.fps = fps
+        self.scheduler = scheduler
+
+        # Number of in-flight OpenVINO requests; 0 runs inference synchronously
+        self.infer_requests = infer_requests
+        self.publish_lock = threading.Lock()
+        self.published_frame_id = 0
+
+        # Upper bound of the dynamic batch dimension: top_k candidates for each face
+        self.max_batch = max_faces * top_k
 
-        self.core = ov.Core()
+        # Embeddings of recently seen aligned faces; 0 disables memoization
+        self.embedding_cache = EmbeddingCache(embedding_cache_size) if embedding_cache_size > 0 else None
+        # Counts enrollment sessions, so cached embeddings never carry over from one to the next
+        self.session = 0
+        self.armed = False
+
+        self.core = get_core()
         self.device = device
-        self.init_arcface()
+        # FP32, FP16 or INT8 (see src/model_cache.py)
+        self.precision = arcface_precision
+
+        self.metrics = registry.stage(type(self).__name__, camera)
+
+        # ArcFace shared with the other cameras of the process; None loads a model for this stage
+        self.camera = camera
+        self.arcface_engine = arcface_engine
+        self.infer_queue = None
+        if arcface_engine is None:
+            self.init_arcface()
 
     def init_arcface(self):
-        self.arcface_resnet100_model_path = "models/arcfaceresnet100-8.onnx"
-        self.arcface_resnet100_model = self.core.read_model(model=self.arcface_resnet100_model_path)
-        self.arcface_resnet100_compiled = self.core.compile_model(model=self.arcface_resnet100_model,
-                                                                  device_name=self.device)
+        self.arcface_resnet100_compiled, self.batching = load_arcface(self.core, self.device, self.precision,
+                                                                      self.max_batch, self.log)
+
+        self.output_layer = self.arcface_resnet100_compiled.output(0)
+
+        if self.infer_requests > 0 and self.batching:
+            self.infer_queue = ov.AsyncInferQueue(self.arcface_resnet100_compiled, self.infer_requests)
+            self.infer_queue.set_callback(self.on_embedding)
 
     def start(self):
         threading.Thread(target=self.recognition_loop, daemon=True).start()
 
     def recognition_loop(self):
-        frame_time = 1.0 / self.fps
+        frame_time = self.input_timeout()
+        face_seq = 0
+        t1 = 0.0
 
         while True:
             if self.stop_event.is_set():
                 self.log.info("Stop event set. Stopping recognition.")
+                if self.infer_queue is not None:
+                    self.infer_queue.wait_all()
                 break
 
             if not self.run_state_event.is_set():
-                time.sleep(min(frame_time, 0.01))
+                self.end_session()
+                self.run_state_event.wait(timeout=frame_time)
+                continue
+            self.armed = True
+
+            self.yield_slot(t1)
+
+            # Block until selection publishes the best candidates of each face
+            item = self.wait_state("selected_faces", face_seq, timeout=frame_time)
+            if item is None:
+                continue
+
+            face_seq, selected_faces = item
+
+            if not selected_faces:
                 continue
 
-            t1 = time.time()
+            t1 = time.perf_counter()
+            trace = self.frame_of("selected_faces")
 
-            aligned_face = self.get_state("aligned_face")
+            # One batch row per candidate, remembering which face it belongs to
+            face_ids = [face_id for face_id, candidates in selected_faces for _ in candidates]
+            faces = [face for _, candidates in selected_faces for face in candidates]
 
-            if aligned_face is None:
-                time.sleep(min(frame_time, 0.01))
+            # Reuse embeddings of faces that have not meaningfully changed
+            with self.metrics.time("preprocess"):
+                cache_keys, embeddings = self.lookup_cached(face_ids, faces)
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+            if not missing:
+                self.publish_embeddings(face_seq, face_ids, embeddings, trace)
+                self.frame_done(t1, trace)
                 continue
 
-            embedding = self.recognize(aligned_face)
+            pending = (face_seq, face_ids, embeddings, cache_keys, missing, trace)
+            to_infer = [faces[i] for i in missing]
+
+            if self.arcface_engine is not None:
+                # Batched with the faces of the other cameras; published from the engine thread
+                future = self.arcface_engine.submit(self.camera, to_infer)
+                future.add_done_callback(lambda f, pending=pending, t1=t1: self.on_engine_embeddings(f, pending, t1))
+                continue
+
+            if self.infer_queue is not None:
+                # Blocks only while every request is busy, so preprocessing overlaps inference
+                self.infer_queue.start_async([stack_faces(to_infer)], userdata=(pending, t1))
+                continue
+
+            with self.metrics.time("inference"):
+                inferred = self.recognize_batch(to_infer)
+            self.complete_embeddings(pending, inferred)
+            self.frame_done(t1, trace)
+
+    # AsyncInferQueue completion callback, runs on an OpenVINO worker thread
+    def on_embedding(self, request, userdata):
+        pending, t1 = userdata
+        # Request latency is reported in milliseconds
+        self.metrics.observe("inference", request.latency / 1000)
+        # Output tensors are reused by the next request, so copy before publishing
+        self.complete_embeddings(pending, request.get_output_tensor(0).data.copy())
+        self.frame_done(t1, pending[-1])
+
+    # SharedInferenceEngine completion callback, runs on the engine thread
+    def on_engine_embeddings(self, future, pending, t1):
+        # Includes the wait for the batch of the other cameras
+        self.metrics.observe("inference", time.perf_counter() - t1)
+        if future.exception() is None:
+            self.complete_embeddings(pending, future.result())
+            self.frame_done(t1, pending[-1])
+
+    # Enrollment was disarmed: forget the cached embeddings of its faces
+    def end_session(self):
+        if not self.armed:
+            return
+
+        self.armed = False
+        self.session += 1
+        if self.embedding_cache is not None:
+            self.embedding_cache.clear()
+
+    # Metrics and trace span of one frame, from taking its faces to publishing their embeddings
+    def frame_done(self, t1, trace):
+        self.metrics.frame(t1)
+        tracer.add(type(self).__name__, t1, time.perf_counter(), trace, self.camera)
 
-            if embedding is not None:
-                normalized_embedding = l2_norm(embedding)
-                self.set_state("embedding", normalized_embedding)
-            else:
-                self.set_state("embedding", None)
+    # Fill in the freshly inferred embeddings, remember them and publish
+    def complete_embeddings(self, pending, inferred):
+        frame_id, face_ids, embeddings, cache_keys, missing, trace = pending
 
-            elapsed_time = time.time() - t1
-            # self.log.info(f"{elapsed_time:.3f} seconds per frame")
-            sleep_time = max(0.0, frame_time - elapsed_time)
-            time.sleep(sleep_time)
+        for i, embedding in zip(missing, inferred):
+            embeddings[i] = embedding
+            if self.embedding_cache is not None:
+                self.embedding_cache.put(*cache_keys[i], embedding)
+
+        self.publish_embeddings(frame_id, face_ids, embeddings, trace)
+
+    # (scope, fingerprint) cache keys and cached embeddings (None on a miss) of each face. Faces only
+    # match earlier candidates of the same tracked face in the current enrollment session.
+    def lookup_cached(self, face_ids, faces):
+        if self.embedding_cache is None:
+            return [None] * len(faces), [None] * len(faces)
+
+        cache_keys = [((self.session, face_id), self.embedding_cache.fingerprint(face))
+                      for face_id, face in zip(face_ids, faces)]
+        cached = [self.embedding_cache.get(scope, thumb) for scope, thumb in cache_keys]
+
+        # Counted per face instead of logged, since this runs at frame rate
+        hits = sum(embedding is not None for embedding in cached)
+        self.metrics.count("cache_hit", hits)
+        self.metrics.count("cache_miss", len(cached) - hits)
+        return cache_keys, cached
+
+    # frame_id orders the publishes; trace identifies the captured frame for consumers
+    def publish_embeddings(self, frame_id, face_ids, embeddings, trace=None):
+        with self.publish_lock:
+            # Requests may complete out of order; never publish older faces over newer ones
+            if frame_id <= self.published_frame_id or not self.run_state_event.is_set():
+                return
+            self.published_frame_id = frame_id
+
+            with self.metrics.time("postprocess"):
+                templates = fuse_embeddings(face_ids, embeddings)
+
+            self.set_state("embedding_frame_id", trace.frame_id if trace is not None else frame_id, frame=trace)
+            self.set_state("embeddings", templates, frame=trace)
+            self.set_state("embedding", templates[0][1], frame=trace)
+
+    # Embed all faces with one inference call, shape (N, 512)
+    def recognize_batch(self, faces):
+        if self.arcface_engine is not None:
+            return np.stack(self.arcface_engine.submit(self.camera, faces).result())
+
+        if not self.batching:
+            return np.stack([self.recognize(face) for face in faces])
+
+        return self.arcface_resnet100_compiled([stack_faces(faces)])[self.output_layer]
 
     def recognize(self, face_img):
-        input_data = preprocess_arcface(face_img)
-        output_layer = self.arcface_resnet100_compiled.output(0)
+        input_data = np.expand_dims(face_img, 0)
 
-        embeddings = self.arcface_resnet100_compiled([input_data])[output_layer]
+        embeddings = self.arcface_resnet100_compiled([input_data])[self.output_layer]
 
         return embeddings[0]
 
@@ -76,7 +234,8 @@ class RecognitionArcFace(BlackboardStateful):
         return f"Available devices: {self.core.available_devices}"
 
 
-# Preprocess frame for ArcFace model
+# Preprocess frame for the plain ArcFace model (calibration and benchmarks; the
+# pipeline uses the in-graph preprocessing)
 def preprocess_arcface(frame):
     # Convert BGR to RGB
     frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -92,6 +251,61 @@ def preprocess_arcface(frame):
     return frame
 
 
+# Compiled ArcFace taking raw BGR crops, and whether it accepts a batch of up to max_batch faces
+def load_arcface(core, device, precision, max_batch, log):
+    # The ONNX model is converted to IR on first start; compiled blobs are cached
+    model = read_model(core, ARCFACE_MODEL_PATH, "arcface", precision)
+
+    # Dynamic batch dimension so every candidate face shares one inference call
+    batching = True
+    try:
+        reshape_arcface_batch(model, max_batch)
+    except RuntimeError as e:
+        log.warning(f"ArcFace model cannot be reshaped to a dynamic batch, recognizing faces one by one: {e}")
+        batching = False
+
+    # Color conversion, resize and HWC->CHW run inside the compiled model
+    model = add_bgr_preprocessing(model, to_rgb=True)
+
+    return compile_model(core, model, device, "arcface", log, precision), batching
+
+
+# One ArcFace for the stages of several cameras, batching their faces together
+def create_arcface_engine(log, device='CPU', arcface_precision='FP32', max_batch=16):
+    compiled, batching = load_arcface(get_core(), device, arcface_precision, max_batch, log)
+    output_layer = compiled.output(0)
+
+    def infer_batch(faces):
+        if not batching:
+            return [compiled([np.expand_dims(face, 0)])[output_layer][0] for face in faces]
+        return list(compiled([stack_faces(faces)])[output_layer])
+
+    return SharedInferenceEngine("arcface", infer_batch, max_batch if batching else 1, log)
+
+
+# Bounded dynamic batch; the compiled-blob cache is keyed on this shape too
+def reshape_arcface_batch(model, max_batch):
+    model.reshape(ov.PartialShape([ov.Dimension(1, max_batch), 3, 112, 112]))
+
+
+# Stack raw BGR faces into one (N, H, W, 3) uint8 batch; the model does the rest
+def stack_faces(faces):
+    h, w = faces[0].shape[:2]
+    return np.stack([
+        face if face.shape[:2] == (h, w) else cv2.resize(face, (w, h), interpolation=cv2.INTER_LINEAR)
+        for face in faces
+    ])
+
+
+# Fuse the candidate embeddings of each face into one normalized template, in face order
+def fuse_embeddings(face_ids, embeddings):
+    grouped = {}
+    for face_id, embedding in zip(face_ids, embeddings):
+        grouped.setdefault(face_id, []).append(l2_norm(embedding))
+
+    return [(face_id, l2_norm(np.mean(group, axis=0))) for face_id, group in grouped.items()]
+
+
 # Postprocess ArcFace embedding with L2 normalization
 def l2_norm(embedding: np.ndarray):
     norm = np.linalg.norm(embedding)
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from src.metrics import registry
+from src.scheduler import ScheduledStage
+from src.tracing import tracer
+from src.pipelines.validation import MAX_HEAD_ANGLE
+
+# Laplacian variance and ROI side (pixels) at which sharpness and size score fully
+SHARPNESS_REF = 150.0
+SIZE_REF = 160.0
+
+# Weights of pose, glare, sharpness and size in the quality score
+QUALITY_WEIGHTS = (0.3, 0.2, 0.3, 0.2)
+
+
+class FaceSelection(ScheduledStage):
+    # Blackboard keys bridged when the stage runs in its own process
+    inputs = ('aligned_faces',)
+    outputs = ('selected_faces',)
+
+    def __init__(self, stop_event, run_state_event, log, fps = 30, selection_window = 10, top_k = 3,
+                 camera = None, scheduler = None):
+        super().__init__(camera)
+
+        self.run_state_event = run_state_event
+        self.stop_event = stop_event
+        self.log = log
+
+        self.fps = fps
+        self.scheduler = scheduler
+
+        # Frames scored per face before its best top_k candidates go to recognition
+        self.selection_window = selection_window
+        self.top_k = top_k
+
+        self.candidates = {}
+
+        self.metrics = registry.stage(type(self).__name__, camera)
+
+    def start(self):
+        threading.Thread(target=self.selection_loop, daemon=True).start()
+
+    def selection_loop(self):
+        frame_time = self.input_timeout()
+        face_seq = 0
+        t1 = 0.0
+
+        while True:
+            if self.stop_event.is_set():
+                self.log.info("Stop event set. Stopping selection.")
+                break
+
+            if not self.run_state_event.is_set():
+                self.candidates.clear()
+
+                self.run_state_event.wait(timeout=frame_time)
+                continue
+
+            self.yield_slot(t1)
+
+            # Block until alignment publishes newer faces
+            item = self.wait_state("aligned_faces", face_seq, timeout=frame_time)
+            if item is None:
+                continue
+
+            face_seq, aligned_faces = item
+
+            if not aligned_faces:
+                continue
+
+            t1 = time.perf_counter()
+            trace = self.frame_of("aligned_faces")
+            frame_id = trace.frame_id if trace is not None else None
+
+            # Faces that left the frame start over when they come back
+            present = {face_id for face_id, _, _ in aligned_faces}
+            for face_id in list(self.candidates):
+                if face_id not in present:
+                    del self.candidates[face_id]
+
+            for face_id, aligned_face, quality in aligned_faces:
+                window = self.candidates.setdefault(face_id, deque(maxlen=self.selection_window))
+                with self.metrics.time("scoring"):
+                    window.append((face_quality_score(aligned_face, quality), aligned_face, frame_id))
+
+            selected, sources = [], {}
+            for face_id, window in list(self.candidates.items()):
+                if len(window) < self.selection_window:
+                    continue
+
+                best = sorted(window, key=lambda candidate: candidate[0], reverse=True)[:self.top_k]
+                selected.append((face_id, [face for _, face, _ in best]))
+                # Captured frames the candidates came from
+                sources[face_id] = [source for _, _, source in best]
+                self.log.info(f"Face {face_id}: selected {len(best)} of {len(window)} frames {sources[face_id]}, "
+                              f"best score {best[0][0]:.2f}")
+
+                del self.candidates[face_id]
+
+            # Tagged with the frame that completed the window, the last one the embedding waited for
+            if selected:
+                self.set_state("selected_faces", selected, frame=trace)
+            self.metrics.frame(t1)
+            tracer.add(type(self).__name__, t1, time.perf_counter(), trace, self.camera, selected=sources)
+
+
+# Quality in [0, 1] from head pose, glare, sharpness and face size
+def face_quality_score(aligned_face, quality):
+    pose = 1.0 - max(abs(quality["yaw"]), abs(quality["pitch"]), abs(quality["roll"])) / MAX_HEAD_ANGLE
+    glare = 1.0 - min(1.0, quality["glare"])
+
+    gray = cv2.cvtColor(aligned_face, cv2.COLOR_BGR2GRAY)
+    sharpness = min(1.0, cv2.Laplacian(gray, cv2.CV_64F).var() / SHARPNESS_REF)
+
+    size = min(1.0, quality["size"] / SIZE_REF)
+
+    w_pose, w_glare, w_sharpness, w_size = QUALITY_WEIGHTS
+    return w_pose * max(0.0, pose) + w_glare * glare + w_sharpness * sharpness + w_size * size
@@ -2,15 +2,33 @@ import threading
 import time
 
 import numpy as np
-import cv2
 import openvino as ov
+import cv2
+
+from src.inference_engine import SharedInferenceEngine
+from src.metrics import registry
+from src.scheduler import ScheduledStage
+from src.tracing import tracer
+from src.model_cache import get_core, read_model, compile_model, add_bgr_preprocessing
+
+HPEA_MODEL_PATH = "models/head-pose-estimation-adas-0001/FP32/head-pose-estimation-adas-0001.xml"
 
-from src.blackboard import BlackboardStateful
+# Largest yaw, pitch or roll (degrees) a face may have to pass validation
+MAX_HEAD_ANGLE = 30.0
 
+# Share of white hotspot / specular pixels at which a face counts as glared
+WHITE_RATIO_LIMIT = 0.05
+SPECULAR_RATIO_LIMIT = 0.03
 
-class FaceValidation(BlackboardStateful):
-    def __init__(self, stop_event, run_state_event, log, fps=30, device='CPU'):
-        super().__init__()
+
+class FaceValidation(ScheduledStage):
+    # Blackboard keys bridged when the stage runs in its own process
+    inputs = ('detected_faces',)
+    outputs = ('validated_faces', 'validated_face')
+
+    def __init__(self, stop_event, run_state_event, log, fps=30, device='CPU', head_pose_precision='FP32', camera=None,
+                 scheduler=None, head_pose_engine=None):
+        super().__init__(camera)
 
         self.stop_event = stop_event
         self.run_state_event = run_state_event
@@ -18,16 +36,28 @@ class FaceValidation(BlackboardStateful):
         self.log = log
 
         self.fps = fps
+        self.scheduler = scheduler
 
-        self.core = ov.Core()
+        self.core = get_core()
         self.device = device
-        self.init_model()
+        # FP32, FP16 or INT8 (see src/model_cache.py)
+        self.precision = head_pose_precision
+
+        self.metrics = registry.stage(type(self).__name__, camera)
+
+        # Head-pose model shared with the other cameras of the process; None loads one for this stage
+        self.camera = camera
+        self.head_pose_engine = head_pose_engine
+        if head_pose_engine is None:
+            self.init_model()
 
     def init_model(self):
-        self.hpea_model_path = "models/head-pose-estimation-adas-0001/FP32/head-pose-estimation-adas-0001.xml"
-        self.hpea_model = self.core.read_model(model=self.hpea_model_path)
-        self.hpea_compiled = self.core.compile_model(model=self.hpea_model,
-                                                     device_name=self.device)
+        self.hpea_model_path = HPEA_MODEL_PATH
+        self.hpea_model = read_model(self.core, self.hpea_model_path, "head-pose", self.precision)
+        # Resize and HWC->CHW run inside the compiled model; it expects BGR like the camera
+        self.hpea_model = add_bgr_preprocessing(self.hpea_model)
+        self.hpea_compiled = compile_model(self.core, self.hpea_model, self.device, "head-pose", self.log,
+                                           self.precision)
 
         self.input_port = self.hpea_compiled.input(0)
         self.output_y = self.hpea_compiled.output('angle_y_fc')
@@ -38,43 +68,76 @@ class FaceValidation(BlackboardStateful):
         threading.Thread(target=self.validation_loop, daemon=True).start()
 
     def validation_loop(self):
-        frame_time = 1.0 / self.fps
+        frame_time = self.input_timeout()
+        face_seq = 0
+        t1 = 0.0
 
         while True:
             if self.stop_event.is_set():
                 self.log.info("Stop event set. Stopping validation.")
                 break
 
-            t1 = time.time()
+            self.yield_slot(t1)
 
-            face_roi = self.get_state("detected_face")
+            # Block until detection publishes newer faces
+            item = self.wait_state("detected_faces", face_seq, timeout=frame_time)
+            if item is None:
+                continue
 
-            if face_roi is None:
-                self.set_state("validated_face", None)
+            face_seq, detected_faces = item
+            t1 = time.perf_counter()
+            trace = self.frame_of("detected_faces")
 
-                time.sleep(min(frame_time, 0.01))
+            if not detected_faces:
+                if self.has_state("validated_faces"):
+                    self.publish_faces([], trace)
                 continue
 
-            glare, glare_msg = glare_detection(face_roi)
+            qualities = self.validate_faces([face_roi for _, face_roi in detected_faces])
+            validated_faces = [(face_id, face_roi, quality)
+                               for (face_id, face_roi), quality in zip(detected_faces, qualities)
+                               if quality is not None]
+
+            self.publish_faces(validated_faces, trace)
+            self.metrics.frame(t1)
+            tracer.add(type(self).__name__, t1, time.perf_counter(), trace, self.camera,
+                       faces=len(detected_faces), passed=len(validated_faces))
+
+    # Quality measurements of a face that passes glare and head-pose checks, else None
+    def validate_face(self, face_roi):
+        return self.validate_faces([face_roi])[0]
+
+    # validate_face for several faces, estimating the head pose of all unglared faces at once
+    def validate_faces(self, face_rois):
+        with self.metrics.time("glare"):
+            glares = [glare_level(face_roi) for face_roi in face_rois]
+        unglared = [i for i, glare in enumerate(glares) if glare <= 1.0]
+
+        with self.metrics.time("inference"):
+            if self.head_pose_engine is not None and unglared:
+                poses = self.head_pose_engine.submit(self.camera, [face_rois[i] for i in unglared]).result()
+            else:
+                poses = [self.estimate_head_pose(face_rois[i]) for i in unglared]
 
-            if not glare:
-                yaw, pitch, roll = self.estimate_head_pose(face_roi)
+        qualities = [None] * len(face_rois)
+        for i, (yaw, pitch, roll) in zip(unglared, poses):
+            if max(abs(yaw), abs(pitch), abs(roll)) < MAX_HEAD_ANGLE:
+                qualities[i] = {"yaw": yaw, "pitch": pitch, "roll": roll, "glare": glares[i],
+                                "size": min(face_rois[i].shape[:2])}
 
-                if abs(yaw) < 30.0 and abs(pitch) < 30.0 and abs(roll) < 30.0:
-                    self.set_state("validated_face", face_roi)
-                else:
-                    self.set_state("validated_face", None)
-                    self.run_state_event.clear()
-            else:
-                self.set_state("validated_face", None)
-                self.run_state_event.clear()
+        return qualities
 
-            elapsed_time = time.time() - t1
-            sleep_time = max(0.0, frame_time - elapsed_time)
-            time.sleep(sleep_time)
+    # Publish all (face_id, face_roi, quality) triples, plus the first face for single-face consumers
+    def publish_faces(self, faces, trace=None):
+        if faces:
+            self.set_state("validated_faces", faces, frame=trace)
+            self.set_state("validated_face", faces[0][1], frame=trace)
+        else:
+            self.set_state("validated_faces", None, frame=trace)
+            self.set_state("validated_face", None, frame=trace)
 
     def estimate_head_pose(self, face_image):
-        preprocessed_image = self.preprocess_hpea(face_image)
+        preprocessed_image = np.expand_dims(face_image, 0)
 
         # Perform inference
         result = self.hpea_compiled({self.input_port: preprocessed_image})
@@ -86,36 +149,77 @@ class FaceValidation(BlackboardStateful):
 
         return yaw, pitch, roll
 
-    def preprocess_hpea(self, frame):
-        n, c, h, w = self.input_port.shape
 
-        # Resize
-        frame = cv2.resize(frame, (h, w), interpolation=cv2.INTER_LINEAR)
-        # Scale to [0, 1]
-        frame = frame.astype(np.float32)
-        # Change data layout from HWC to CHW
-        frame = frame.transpose(2, 0, 1)
-        # Add batch dimension
-        frame = frame.reshape((n, c, h, w))
+# One head-pose model for the stages of several cameras, estimating their faces in batches
+def create_head_pose_engine(log, device='CPU', head_pose_precision='FP32', max_batch=16):
+    core = get_core()
+    model = read_model(core, HPEA_MODEL_PATH, "head-pose", head_pose_precision)
 
-        return frame
+    _, c, h, w = model.input(0).shape
+    model.reshape(ov.PartialShape([ov.Dimension(1, max_batch), c, h, w]))
+    model = add_bgr_preprocessing(model)
+    compiled = compile_model(core, model, device, "head-pose", log, head_pose_precision)
 
+    outputs = [compiled.output(name) for name in ('angle_y_fc', 'angle_p_fc', 'angle_r_fc')]
 
-def glare_detection(face_roi):
+    def infer_batch(face_rois):
+        # Crops of different sizes cannot share a batch; the model would resize them to (h, w) anyway
+        batch = np.stack([cv2.resize(face_roi, (w, h), interpolation=cv2.INTER_LINEAR) for face_roi in face_rois])
+        result = compiled({0: batch})
+        yaws, pitches, rolls = (result[output][:, 0] for output in outputs)
+        return [(float(y), float(p), float(r)) for y, p, r in zip(yaws, pitches, rolls)]
+
+    return SharedInferenceEngine("head-pose", infer_batch, max_batch, log)
+
+
+# Preprocess face crop for the plain head-pose model, shape is the (n, c, h, w) model
+# input (calibration and benchmarks; the pipeline uses the in-graph preprocessing)
+def preprocess_hpea(frame, shape):
+    n, c, h, w = shape
+
+    # Resize
+    frame = cv2.resize(frame, (h, w), interpolation=cv2.INTER_LINEAR)
+    # Scale to [0, 1]
+    frame = frame.astype(np.float32)
+    # Change data layout from HWC to CHW
+    frame = frame.transpose(2, 0, 1)
+    # Add batch dimension
+    frame = frame.reshape((n, c, h, w))
+
+    return frame
+
+
+# Share of white hotspot pixels and of specular highlight pixels
+def glare_ratios(face_roi):
     gray = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
     hsv = cv2.cvtColor(face_roi, cv2.COLOR_BGR2HSV)
 
     # Hotspots
     white_mask = gray > 230
-    glare_ratio = np.sum(white_mask) / gray.size
-    if glare_ratio > 0.05:
-        return True, f"Glare: {glare_ratio*100:.1f}% white pixels"
+    white_ratio = np.sum(white_mask) / gray.size
 
     # Specular
     v_channel = hsv[:, :, 2]
     s_channel = hsv[:, :, 1]
     specular_mask = (v_channel > 220) & (s_channel < 50)
-    if np.sum(specular_mask) / gray.size > 0.03:
+    specular_ratio = np.sum(specular_mask) / gray.size
+
+    return white_ratio, specular_ratio
+
+
+# Glare relative to the rejection limits; above 1.0 means the face is glared
+def glare_level(face_roi):
+    white_ratio, specular_ratio = glare_ratios(face_roi)
+    return max(white_ratio / WHITE_RATIO_LIMIT, specular_ratio / SPECULAR_RATIO_LIMIT)
+
+
+def glare_detection(face_roi):
+    white_ratio, specular_ratio = glare_ratios(face_roi)
+
+    if white_ratio > WHITE_RATIO_LIMIT:
+        return True, f"Glare: {white_ratio*100:.1f}% white pixels"
+
+    if specular_ratio > SPECULAR_RATIO_LIMIT:
         return True, "High specular highlights"
 
     return False, "No glare"
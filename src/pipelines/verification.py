@@ -1,60 +1,237 @@
+import asyncio
+import random
 import secrets
 import threading
 import time
 
-from api.access_system import validate_embedding, add_embedding
-from src.blackboard import BlackboardStateful
+import aiohttp
+import requests
 
+from api.access_system import list_embeddings
+from api.async_access_system import AsyncAccessSystemClient
+from src.metrics import registry
+from src.scheduler import ScheduledStage
+from src.tracing import tracer
 
-class FaceVerification(BlackboardStateful):
-    def __init__(self, stop_event, run_state_event, log, fps = 30):
-        super().__init__()
+
+class FaceVerification(ScheduledStage):
+    # Blackboard keys bridged when the stage runs in its own process
+    inputs = ('embeddings',)
+    outputs = ()
+
+    def __init__(self, stop_event, run_state_event, log, fps = 30, gallery = None, match_threshold = 0.5,
+                 match_margin = 0.05, gallery_sync_interval = 60, api_concurrency = 4, enrollment_queue = None,
+                 flush_backoff = (0.5, 30.0), camera = None, scheduler = None):
+        super().__init__(camera)
 
         self.run_state_event = run_state_event
         self.stop_event = stop_event
         self.log = log
 
         self.fps = fps
+        self.scheduler = scheduler
+
+        # Local EmbeddingGallery answering duplicate checks; None asks the API every time
+        self.gallery = gallery
+        self.match_threshold = match_threshold
+        self.match_margin = match_margin
+        self.gallery_sync_interval = gallery_sync_interval
+
+        # Requests for all faces of a frame are in flight together, up to api_concurrency at once
+        self.api = AsyncAccessSystemClient(max_concurrency=api_concurrency)
+
+        # Durable EnrollmentQueue flushed in the background; None enrolls inline
+        self.enrollment_queue = enrollment_queue
+        # (first, largest) seconds to wait after a failed flush, doubling in between
+        self.flush_backoff = flush_backoff
+
+        self.metrics = registry.stage(type(self).__name__, camera)
 
     def start(self):
         threading.Thread(target=self.verification_loop, daemon=True).start()
+        # With several cameras the gallery and queue are shared; one stage runs their background loops
+        if self.gallery is not None and self.gallery.claim_sync(self):
+            threading.Thread(target=self.gallery_sync_loop, daemon=True).start()
+        if self.enrollment_queue is not None and self.enrollment_queue.claim_flusher(self):
+            threading.Thread(target=self.flush_loop, daemon=True).start()
+
+    def gallery_sync_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                added = self.gallery.sync(list_embeddings)
+                if added:
+                    self.log.info(f"Gallery synced: {added} new embeddings, {len(self.gallery)} total.")
+            except (requests.RequestException, KeyError, ValueError) as e:
+                self.log.warning(f"Gallery sync failed: {e}")
+
+            self.stop_event.wait(timeout=self.gallery_sync_interval)
 
     def verification_loop(self):
-        frame_time = 1.0 / self.fps
+        frame_time = self.input_timeout()
+        embedding_seq = 0
+        t1 = 0.0
+
+        # Inline API calls run on a private event loop owned by this thread
+        loop = asyncio.new_event_loop() if self.enrollment_queue is None else None
 
         while True:
             if self.stop_event.is_set():
                 self.log.info("Stop event set. Stopping validation.")
+                if loop is not None:
+                    loop.run_until_complete(self.api.close())
+                    loop.close()
                 break
 
             if not self.run_state_event.is_set():
-                time.sleep(min(frame_time, 0.01))
+                self.run_state_event.wait(timeout=frame_time)
                 continue
 
-            t1 = time.time()
-
-            shared_embedding = self.get_state("embedding")
+            self.yield_slot(t1)
 
-            if shared_embedding is None:
-                time.sleep(min(frame_time, 0.01))
+            # Block until recognition publishes newer embeddings
+            item = self.wait_state("embeddings", embedding_seq, timeout=frame_time)
+            if item is None:
                 continue
 
-            exists, msg = validate_embedding(shared_embedding)
+            embedding_seq, shared_embeddings = item
+
+            if not shared_embeddings:
+                continue
 
-            if not exists:
-                status_code = add_embedding(shared_embedding, secrets.token_hex(8))
+            t1 = time.perf_counter()
+            trace = self.frame_of("embeddings")
 
-                if status_code == 201:
-                    self.log.info("Embedding added successfully.")
-                else:
-                    self.log.info(f"Failed to add embedding. Status code: {status_code}")
+            # Enroll every face of the frame in one pass
+            if self.enrollment_queue is not None:
+                self.queue_embeddings(shared_embeddings)
+                self.record_capture_latency("capture_to_queue", trace)
+            else:
+                try:
+                    with self.metrics.time("api"):
+                        loop.run_until_complete(self.verify_embeddings(shared_embeddings, trace))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    self.metrics.count("failed")
+                    self.log.error(f"Verification request failed: {e}")
+
+            self.metrics.frame(t1)
+            tracer.add(type(self).__name__, t1, time.perf_counter(), trace, self.camera,
+                       faces=len(shared_embeddings))
+
+            self.run_state_event.clear()
+
+    # Answer from the local gallery when the match is clear; None leaves the decision to the server
+    def is_enrolled(self, embedding):
+        if self.gallery is None:
+            return None
+
+        with self.metrics.time("gallery"):
+            return self.gallery.is_enrolled(embedding, self.match_threshold, self.match_margin)
+
+    # Only a local insert; the flusher validates and adds the faces when the server is reachable
+    def queue_embeddings(self, shared_embeddings):
+        for face_id, shared_embedding in shared_embeddings:
+            if self.is_enrolled(shared_embedding):
+                self.log.info(f"Face {face_id}: embedding already exists.")
+                continue
 
-                self.run_state_event.clear()
+            self.enrollment_queue.put(shared_embedding, secrets.token_hex(8), face_id)
+            self.log.info(f"Face {face_id}: enrollment queued.")
+
+    async def verify_embeddings(self, shared_embeddings, trace=None):
+        known, new, undecided = [], [], []
+        for face_id, shared_embedding in shared_embeddings:
+            enrolled = self.is_enrolled(shared_embedding)
+            if enrolled is None:
+                undecided.append((face_id, shared_embedding, secrets.token_hex(8)))
+            elif enrolled:
+                known.append(face_id)
+            else:
+                new.append((face_id, shared_embedding, secrets.token_hex(8)))
+
+        for face_id in known:
+            self.log.info(f"Face {face_id}: embedding already exists.")
+
+        # Faces the gallery does not know are added directly; the rest are checked and added in one call
+        added, statuses = await asyncio.gather(
+            asyncio.gather(*(self.api.add_embedding(embedding, name) for _, embedding, name in new)),
+            self.api.enroll_embeddings([embedding for _, embedding, _ in undecided],
+                                       [name for _, _, name in undecided])
+        )
+
+        results = [(face, "added" if status_code == 201 else f"failed ({status_code})")
+                   for face, status_code in zip(new, added)]
+        results += list(zip(undecided, statuses))
+
+        for (face_id, embedding, name), status in results:
+            self.report_enrollment(face_id, embedding, name, status, trace)
+
+    # trace is the FrameTrace of the captured frame, when the enrollment is decided in the pipeline
+    def report_enrollment(self, face_id, embedding, name, status, trace=None):
+        if status == "added":
+            if trace is not None:
+                latency = self.record_capture_latency("capture_to_enroll", trace)
+                self.log.info(f"Face {face_id}: embedding added successfully (frame {trace.frame_id}, "
+                              f"{latency * 1000:.0f} ms after capture).")
             else:
-                self.log.info("Embedding already exists.")
-                self.run_state_event.clear()
+                self.log.info(f"Face {face_id}: embedding added successfully.")
+            if self.gallery is not None:
+                self.gallery.add([embedding], [name])
+        elif status == "exists":
+            self.log.info(f"Face {face_id}: embedding already exists.")
+        else:
+            self.log.info(f"Face {face_id}: failed to add embedding. Status: {status}")
+
+    # Time from capture of the frame to now, as a histogram phase and as a span covering the whole pipeline
+    def record_capture_latency(self, phase, trace):
+        if trace is None:
+            return None
+
+        now = time.perf_counter()
+        self.metrics.observe(phase, now - trace.captured_at)
+        tracer.add(phase, trace.captured_at, now, trace, self.camera, cat="end_to_end", track="end-to-end")
+        return now - trace.captured_at
+
+    # Send queued enrollments in batches, backing off while the server is slow or down
+    def flush_loop(self):
+        loop = asyncio.new_event_loop()
+        backoff = 0.0
+
+        while not self.stop_event.is_set():
+            batch = self.enrollment_queue.peek()
+            if not batch:
+                self.enrollment_queue.wait(timeout=1.0)
+                continue
+
+            t1 = time.perf_counter()
+            try:
+                statuses = loop.run_until_complete(
+                    self.api.enroll_embeddings([embedding for _, _, embedding, _ in batch],
+                                               [name for _, name, _, _ in batch])
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.enrollment_queue.record_error()
+                backoff = min(max(backoff * 2, self.flush_backoff[0]), self.flush_backoff[1])
+                self.log.warning(f"Enrollment flush failed, {self.enrollment_queue.depth()} queued, "
+                                 f"retrying in {backoff:.1f}s: {e}")
+                # Jitter keeps kiosks that lost the server together from retrying in lockstep
+                self.stop_event.wait(timeout=backoff * random.uniform(0.5, 1.0))
+                continue
+
+            backoff = 0.0
+            self.enrollment_queue.record_flush(time.perf_counter() - t1)
+
+            delivered, rejected = [], []
+            for (row_id, name, embedding, face_id), status in zip(batch, statuses):
+                self.report_enrollment(face_id, embedding, name, status)
+                (delivered if status in ("added", "exists") else rejected).append(row_id)
+
+            self.enrollment_queue.done(delivered)
+            for name in self.enrollment_queue.reject(rejected):
+                self.log.error(f"Enrollment {name} dropped after repeated server rejections.")
+
+            stats = self.enrollment_queue.stats()
+            self.log.info(f"Enrollment queue: {stats['depth']} queued, flushed {len(batch)} in "
+                          f"{stats['last_flush_latency'] * 1000:.0f} ms")
 
-            elapsed_time = time.time() - t1
-            # self.log.info(f"{elapsed_time:.3f} seconds per frame")
-            sleep_time = max(0.0, frame_time - elapsed_time)
-            time.sleep(sleep_time)
+        loop.run_until_complete(self.api.close())
+        loop.close()
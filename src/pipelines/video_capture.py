@@ -4,16 +4,52 @@ import time
 import cv2
 
 from src.blackboard import BlackboardStateful
+from src.frame_sources import make_source
+from src.metrics import registry
+from src.presence import PresenceGate
+from src.tracing import FrameTrace, tracer
+
+# Replay modes for file sources: at the original frame timing, or as fast as detection keeps up
+REPLAY_MODES = ("realtime", "fast")
+
+# Consecutive read failures of a live source before it is reopened
+REOPEN_AFTER_FAILURES = 30
+# Longest wait between read attempts of a failing live source, seconds
+MAX_READ_BACKOFF = 2.0
 
 
 class VideoCapture(BlackboardStateful):
-    def __init__(self, stop_event, log, fps = 30):
-        super().__init__()
+    # Blackboard keys bridged when the stage runs in its own process
+    inputs = ('detected_faces',)
+    outputs = ('default_frame',)
+
+    def __init__(self, stop_event, log, fps = 30, frame_ring = None, source = 0, replay = "realtime",
+                 replay_loop = False, camera = None, scheduler = None, idle_after = None, idle_fps = 5):
+        super().__init__(camera)
 
         self.stop_event = stop_event
         self.log = log
 
         self.fps = fps
+        # Sets the capture rate of live sources; None captures at fps
+        self.scheduler = scheduler
+
+        # Optional shared-memory ring; frames are written in place instead of allocated per tick
+        self.frame_ring = frame_ring
+
+        # Camera index, rtsp/http URL, video file, image folder or glob (see src/frame_sources.py)
+        self.source = make_source(source, fps=fps, loop=replay_loop)
+        if replay not in REPLAY_MODES:
+            raise ValueError(f"Unknown replay mode {replay!r}, expected one of {REPLAY_MODES}.")
+        self.replay = replay
+
+        # Live sources drop to idle_fps after idle_after seconds without motion or faces; None keeps full rate
+        self.presence = PresenceGate(idle_after) if idle_after and not self.source.replayable else None
+        self.idle_fps = idle_fps
+
+        self.metrics = registry.stage(type(self).__name__, camera)
+        # Id of the last captured frame, carried on the blackboard by everything derived from it
+        self.frame_id = 0
 
     def start(self):
         threading.Thread(target=self.capture_loop, daemon=True).start()
@@ -22,23 +58,154 @@ class VideoCapture(BlackboardStateful):
         self.stop_event.set()
 
     def capture_loop(self):
-        cap = cv2.VideoCapture(0)
+        if not self.open_source():
+            return
+
         frame_time = 1.0 / self.fps
+        # Replayed files keep their recorded timing, or none at all in fast mode
+        if self.source.replayable:
+            frame_time = 0.0 if self.replay == "fast" else (self.source.frame_interval or frame_time)
+        self.log.info(f"Capturing from {self.source} ({'replay ' + self.replay if self.source.replayable else 'live'}).")
 
-        while cap.isOpened():
+        failures = 0
+        faces_seq, _ = self.get_state_seq("detected_faces")
+
+        while True:
             if self.stop_event.is_set():
                 self.log.info("Stop event set. Stopping video capture.")
                 break
 
-            t1 = time.time()
+            t1 = time.perf_counter()
+
+            if self.frame_ring is not None:
+                reserved = self.frame_ring.begin_write()
+                if reserved is None:
+                    # Every slot is pinned by a reader; drop this frame and keep the pace
+                    self.source.skip()
+                    self.metrics.count("ring_full")
+                    self.pace(t1, frame_time)
+                    continue
+
+                with self.metrics.time("read"):
+                    frame, ring_seq = self.read_into_ring(*reserved)
+            else:
+                with self.metrics.time("read"):
+                    frame, ring_seq = self.source.read(), None
+
+            if frame is None:
+                if self.source.finished:
+                    self.log.info(f"End of {self.source}. Stopping video capture.")
+                    break
 
-            ret, frame = cap.read()
-            if not ret:
+                failures += 1
+                self.metrics.count("read_failed")
+                self.wait_after_failure(failures)
                 continue
 
+            failures = 0
+            if self.presence is not None:
+                self.update_presence(frame)
+
+            # Ring frames are numbered by their ring sequence, so readers can pin exactly this frame
+            self.frame_id = ring_seq if ring_seq is not None else self.frame_id + 1
+            trace = FrameTrace(self.frame_id, time.perf_counter())
+
             # Put frame into output
-            self.set_state("default_frame", frame)
+            self.set_state("default_frame", frame, frame=trace)
+            self.metrics.frame(t1)
+            tracer.add(type(self).__name__, t1, trace.captured_at, trace, self.camera)
+
+            # Fast replay hands frames over in lockstep with detection, so none is skipped
+            if self.source.replayable and self.replay == "fast":
+                while not self.stop_event.is_set():
+                    item = self.wait_state("detected_faces", faces_seq, timeout=0.5)
+                    if item is not None:
+                        faces_seq = item[0]
+                        break
+                continue
+
+            self.pace(t1, frame_time)
+
+        self.source.close()
+
+    # Live sources run at the scheduler's rate, or idle_fps while idle; replayed files keep their
+    # recorded timing
+    def pace(self, t1, frame_time):
+        if self.scheduler is not None and not self.source.replayable:
+            frame_time = 1.0 / self.scheduler.rate(type(self).__name__, self.camera)
+        elif self.presence is not None and self.presence.idle:
+            frame_time = 1.0 / self.idle_fps
+
+        elapsed_time = time.perf_counter() - t1
+        sleep_time = max(0.0, frame_time - elapsed_time)
+        self.stop_event.wait(timeout=sleep_time)
+
+    # Switch the whole camera between idle and full rate as presence comes and goes
+    def update_presence(self, frame):
+        faces = bool(self.get_state("detected_faces"))
+        with self.metrics.time("presence"):
+            changed = self.presence.update(frame, faces)
+        if not changed:
+            return
+
+        if self.presence.idle:
+            self.log.info(f"No motion or faces for {self.presence.idle_after:.0f} s, idling at {self.idle_fps} fps.")
+            self.metrics.count("idle")
+        else:
+            self.log.info("Motion detected, back to full rate.")
+            self.metrics.count("wake")
+
+        if self.scheduler is not None:
+            self.scheduler.set_idle(self.camera, self.idle_fps if self.presence.idle else None)
+
+    # Open the source, retrying a live one that is not there yet (camera unplugged, stream down)
+    # until it opens or the pipeline stops. A file that cannot be opened stops the pipeline, so no
+    # stage waits for frames that will never come. Returns False when capture should not start.
+    def open_source(self):
+        size = self.frame_ring.shape[1::-1] if self.frame_ring is not None else ()
+        attempts = 0
+
+        while not self.stop_event.is_set():
+            try:
+                self.source.open(*size)
+                return True
+            except IOError as e:
+                self.source.close()
+                attempts += 1
+                self.metrics.count("open_failed")
+                if self.source.replayable:
+                    self.log.error(f"{e} Stopping the pipeline.")
+                    self.stop_event.set()
+                    return False
+
+                delay = min(MAX_READ_BACKOFF, 0.1 * 2 ** min(attempts, 5))
+                self.log.error(f"{e} Retrying in {delay:.1f}s.")
+                self.stop_event.wait(timeout=delay)
+
+        return False
+
+    # Back off instead of spinning on a failing source; reopen live sources that stay down
+    def wait_after_failure(self, failures):
+        if failures % REOPEN_AFTER_FAILURES == 0 and not self.source.replayable:
+            self.log.warning(f"No frames from {self.source} after {failures} attempts, reopening.")
+            try:
+                self.source.reopen()
+            except IOError as e:
+                self.log.error(str(e))
+
+        self.stop_event.wait(timeout=min(MAX_READ_BACKOFF, 0.01 * 2 ** min(failures, 8)))
+
+    # Read the next frame straight into the reserved ring slot; returns (view, ring seq)
+    def read_into_ring(self, slot, view):
+        frame = self.source.read(view)
+        if frame is None:
+            return None, None
+
+        # Source ignored the requested resolution or reallocated the buffer
+        if frame.ctypes.data != view.ctypes.data:
+            if frame.shape != view.shape:
+                cv2.resize(frame, (view.shape[1], view.shape[0]), dst=view, interpolation=cv2.INTER_AREA)
+            else:
+                view[...] = frame
 
-            elapsed_time = time.time() - t1
-            sleep_time = max(0.0, frame_time - elapsed_time)
-            time.sleep(sleep_time)
+        return view, self.frame_ring.commit(slot)
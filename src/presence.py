@@ -0,0 +1,49 @@
+import time
+
+import cv2
+import numpy as np
+
+# Size frames are shrunk to before differencing; small enough to cost microseconds per frame
+GATE_SIZE = (32, 24)
+
+
+# Cheap presence check run by capture on every frame. Each frame is shrunk to a tiny grayscale
+# image and compared with the previous one; motion is a change of more than pixel_threshold
+# levels in at least motion_ratio of the pixels. Once the scene has been static and no face was
+# seen for idle_after seconds the gate reports idle, and the next frame with motion or a face
+# makes it active again.
+class PresenceGate:
+    def __init__(self, idle_after=30.0, pixel_threshold=12, motion_ratio=0.01, size=GATE_SIZE):
+        self.idle_after = idle_after
+        self.pixel_threshold = pixel_threshold
+        self.motion_ratio = motion_ratio
+        self.size = size
+
+        self.previous = None
+        self.last_presence = time.monotonic()
+        self.idle = False
+
+    # Share of pixels that changed since the previous frame
+    def motion(self, frame):
+        # Averaging down to the tiny size first also smooths out sensor noise
+        tiny = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if tiny.ndim == 3:
+            tiny = cv2.cvtColor(tiny, cv2.COLOR_BGR2GRAY)
+
+        previous, self.previous = self.previous, tiny
+        if previous is None:
+            return 1.0
+        return np.count_nonzero(cv2.absdiff(tiny, previous) > self.pixel_threshold) / tiny.size
+
+    # Feed a captured frame and whether the last detection had faces; returns True when the idle
+    # state changed
+    def update(self, frame, faces=False):
+        now = time.monotonic()
+        if faces or self.motion(frame) >= self.motion_ratio:
+            self.last_presence = now
+            idle = False
+        else:
+            idle = now - self.last_presence >= self.idle_after
+
+        changed, self.idle = idle != self.idle, idle
+        return changed
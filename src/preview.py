@@ -0,0 +1,136 @@
+import threading
+import time
+
+import cv2
+
+from src.metrics import registry
+from src.utils.converters import fit_frame, frame_to_jpeg
+
+# How far quality and fps move per adjustment, and seconds between adjustments
+QUALITY_STEP = 10
+FPS_STEP = 5
+ADAPT_INTERVAL = 1.0
+
+
+# Turns the latest pipeline frame into preview JPEGs for a display box. Frames are shrunk to the
+# box before encoding, and a frame whose key (blackboard seq) was already rendered is not encoded
+# again. While encoding costs more than cpu_budget (share of one core), JPEG quality and then fps
+# are lowered; they come back up, fps first, once there is room again. A scheduler, when given, can
+# slow the preview further while the machine as a whole is busy.
+class PreviewRenderer:
+    def __init__(self, size=(640, 480), fps=30, quality=80, min_quality=40, min_fps=5, cpu_budget=0.1,
+                 mirror=True, camera=None, scheduler=None):
+        self.size = size
+        self.mirror = mirror
+
+        self.max_fps = fps
+        self.min_fps = min_fps
+        self.fps = fps
+
+        self.max_quality = quality
+        self.min_quality = min_quality
+        self.quality = quality
+
+        self.cpu_budget = cpu_budget
+        # Seconds spent rendering since the last adjustment, and the share of one core that was
+        self.busy = 0.0
+        self.usage = 0.0
+        self.last_adapt = time.perf_counter()
+
+        self.lock = threading.Lock()
+        self.key = None
+        self.jpeg = None
+
+        self.metrics = registry.stage(type(self).__name__, camera)
+
+        self.camera = camera
+        self.scheduler = scheduler
+        if scheduler is not None:
+            scheduler.register(type(self).__name__, camera, fps=fps, min_fps=min_fps)
+
+    # JPEG bytes of the frame, or None when key is the frame rendered last time
+    def render(self, frame, key):
+        with self.lock:
+            if key == self.key:
+                self.metrics.count("unchanged")
+                return None
+
+            t1 = time.perf_counter()
+            with self.metrics.time("resize"):
+                preview = fit_frame(frame, self.size)
+                if self.mirror:
+                    preview = cv2.flip(preview, 1)
+            with self.metrics.time("encode"):
+                jpeg = frame_to_jpeg(preview, self.quality)
+
+            self.key, self.jpeg = key, jpeg
+            self.metrics.frame(t1)
+            self.adapt(time.perf_counter() - t1)
+            return jpeg
+
+    # Last rendered JPEG, for consumers that poll at their own pace
+    def latest(self):
+        with self.lock:
+            return self.jpeg
+
+    # Frames per second to render at: the own budget's fps, capped by the scheduler
+    @property
+    def rate(self):
+        if self.scheduler is None:
+            return self.fps
+        return min(self.fps, self.scheduler.rate(type(self).__name__, self.camera))
+
+    @property
+    def interval(self):
+        return 1.0 / self.rate
+
+    def adapt(self, elapsed):
+        self.busy += elapsed
+
+        now = time.perf_counter()
+        if now - self.last_adapt < ADAPT_INTERVAL:
+            return
+
+        self.usage = self.busy / (now - self.last_adapt)
+        self.busy, self.last_adapt = 0.0, now
+
+        if self.usage > self.cpu_budget:
+            if self.quality > self.min_quality:
+                self.quality = max(self.min_quality, self.quality - QUALITY_STEP)
+            elif self.fps > self.min_fps:
+                self.fps = max(self.min_fps, self.fps - FPS_STEP)
+        elif self.usage < self.cpu_budget / 2:
+            if self.fps < self.max_fps:
+                self.fps = min(self.max_fps, self.fps + FPS_STEP)
+            elif self.quality < self.max_quality:
+                self.quality = min(self.max_quality, self.quality + QUALITY_STEP)
+
+    def stats(self):
+        with self.lock:
+            return {"fps": self.rate, "quality": self.quality, "usage": self.usage}
+
+
+# (key, frame) of the frame to preview: detection's annotated copy of the frame while it finds
+# faces, else the captured frame. The key changes whenever a new frame is published. A captured
+# frame that lives in frame_ring is copied out while pinned, so capture cannot overwrite it while
+# it is being encoded.
+def select_preview_frame(board, frame_ring=None):
+    processed_seq, processed_frame = board.get_state_seq("processed_frame")
+    if processed_frame is not None:
+        return ("processed_frame", processed_seq), processed_frame
+
+    # Capture can move on between reading the key and pinning the slot; then try its newer frame
+    for _ in range(frame_ring.slots if frame_ring is not None else 1):
+        default_seq, default_frame, trace = board.get_state_frame("default_frame")
+        if default_frame is None or frame_ring is None or frame_ring.slot_of(default_frame) is None:
+            return ("default_frame", default_seq), default_frame
+
+        ref = frame_ring.acquire_seq(trace.frame_id) if trace is not None else None
+        if ref is not None:
+            slot, view = ref
+            try:
+                return ("default_frame", default_seq), view.copy()
+            finally:
+                frame_ring.release(slot)
+
+    return ("default_frame", default_seq), None
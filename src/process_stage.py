@@ -0,0 +1,210 @@
+import inspect
+import multiprocessing
+import pickle
+import threading
+from typing import Any, Dict
+
+import numpy as np
+
+from src.blackboard import BlackboardStateful
+from src.frame_ring import FrameRing
+from src.metrics import registry
+from src.tracing import tracer
+
+# Frames published from a FrameRing cross the pipe as a slot index, not as pixels
+_RING_REF = "ring_ref"
+# Pseudo keys carrying the child's stage metrics and trace spans to the parent
+_METRICS = "__metrics__"
+_SPANS = "__spans__"
+# Seconds between metrics snapshots and span batches sent by a child process
+METRICS_INTERVAL = 1.0
+
+
+class ProcessStage(BlackboardStateful):
+    def __init__(self, cls: type, deps: Dict[str, Any]):
+        super().__init__(deps.get("camera"))
+
+        self.cls = cls
+        self.name = cls.__name__
+
+        self.stop_event = deps["stop_event"]
+        self.frame_ring = deps.get("frame_ring")
+
+        self.inputs = tuple(getattr(cls, "inputs", ()))
+        self.outputs = tuple(getattr(cls, "outputs", ()))
+
+        sig = inspect.signature(cls.__init__)
+        # The child process uses its own logger; the scheduler stays in the parent, so the child
+        # falls back to its fixed fps
+        self.kwargs = {k: deps[k] for k in sig.parameters if k in deps and k not in ("log", "scheduler")}
+
+        for k, v in self.kwargs.items():
+            if isinstance(v, threading.Event):
+                raise ValueError(f"{self.name}: '{k}' must be a multiprocessing Event to run as a process.")
+
+        self.ctx = multiprocessing.get_context("spawn")
+        self.process = None
+
+    def start(self):
+        conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(
+            target=run_stage,
+            args=(self.cls, self.kwargs, child_conn, self.inputs, self.outputs),
+            name=self.name,
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        send_lock = threading.Lock()
+        for key in self.inputs:
+            threading.Thread(target=forward_state, args=(self, key, conn, send_lock), daemon=True).start()
+        threading.Thread(target=receive_state, args=(self, conn), daemon=True).start()
+
+    def join(self, timeout=None):
+        if self.process is not None:
+            self.process.join(timeout)
+
+
+# Child process entry point: build the stage with its own models and bridge its keys
+def run_stage(cls, kwargs, conn, inputs, outputs):
+    sig = inspect.signature(cls.__init__)
+    if "log" in sig.parameters:
+        import loguru
+        kwargs = dict(kwargs, log=loguru.logger)
+
+    stage = cls(**kwargs)
+
+    send_lock = threading.Lock()
+    for key in outputs:
+        threading.Thread(target=forward_state, args=(stage, key, conn, send_lock), daemon=True).start()
+
+    threading.Thread(target=forward_metrics, args=(stage, conn, send_lock), daemon=True).start()
+
+    stage.start()
+    receive_state(stage, conn)
+
+
+# Send every new value of a blackboard key to the other side of the pipe
+def forward_state(board, key, conn, send_lock):
+    frame_ring = getattr(board, "frame_ring", None)
+    stop_event = board.stop_event
+    seq = 0
+
+    while not stop_event.is_set():
+        item = board.wait_state(key, seq, timeout=0.1)
+        if item is None:
+            continue
+
+        seq, value = item
+        try:
+            with send_lock:
+                send_value(conn, key, value, frame_ring, board.frame_of(key))
+        except (BrokenPipeError, EOFError, OSError):
+            break
+
+
+# Send the child's metrics and spans to the parent, which serves them with its own
+def forward_metrics(stage, conn, send_lock):
+    while not stage.stop_event.wait(timeout=METRICS_INTERVAL):
+        # Only what the child recorded, so idle copies do not overwrite the parent's own metrics
+        snapshot = [item for item in registry.snapshot() if item["counters"] or item["histograms"] or item["gauges"]]
+        try:
+            with send_lock:
+                send_value(conn, _METRICS, snapshot)
+                send_value(conn, _SPANS, tracer.drain())
+        except (BrokenPipeError, EOFError, OSError):
+            break
+
+
+# Publish values arriving from the pipe into the local blackboard
+def receive_state(board, conn):
+    frame_ring = getattr(board, "frame_ring", None)
+    stop_event = board.stop_event
+    # {key: ring slot} pinned for the frames currently published on the board
+    pins = {}
+
+    while not stop_event.is_set():
+        try:
+            if not conn.poll(0.1):
+                continue
+            item = recv_value(conn, frame_ring)
+        except (EOFError, OSError):
+            break
+
+        if item is None:
+            # Ring frame reused before it arrived
+            continue
+        key, value, frame = item
+
+        if key == _METRICS:
+            registry.merge(value)
+            continue
+        if key == _SPANS:
+            tracer.extend(value)
+            continue
+
+        board.set_state(key, value, frame=frame)
+
+        # A ring frame stays pinned while it is the key's current value, then its slot is freed
+        previous = pins.pop(key, None)
+        slot = ring_slot(frame_ring, value) if frame_ring is not None and isinstance(value, np.ndarray) else None
+        if slot is not None:
+            pins[key] = slot
+        if previous is not None:
+            frame_ring.release(previous)
+
+
+# Pickle protocol 5 keeps numpy buffers out of band, so they are written to the pipe without an extra copy.
+# frame is the FrameTrace the value was published with.
+def send_value(conn, key, value, frame_ring=None, frame=None):
+    if frame_ring is not None and isinstance(value, np.ndarray):
+        slot = ring_slot(frame_ring, value)
+        if slot is not None:
+            # The receiver pins the slot by sequence, so a slot reused in between is not mistaken for
+            # it. Capture numbers ring frames by their ring sequence.
+            seq = frame.frame_id if frame is not None else frame_ring.seq_of(slot)
+            conn.send_bytes(pickle.dumps((key, _RING_REF, (slot, seq), [], frame)))
+            return
+
+    buffers = []
+    payload = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+
+    raw_buffers = [buffer.raw() for buffer in buffers]
+
+    conn.send_bytes(pickle.dumps((key, None, payload, [b.nbytes for b in raw_buffers], frame)))
+    for raw in raw_buffers:
+        conn.send_bytes(raw)
+
+
+# (key, value, frame), or None for a ring frame whose slot was reused before it arrived. A ring
+# frame comes back pinned; the caller releases it with frame_ring.release().
+def recv_value(conn, frame_ring=None):
+    key, kind, payload, sizes, frame = pickle.loads(conn.recv_bytes())
+
+    if kind == _RING_REF:
+        if frame_ring is None:
+            return key, None, frame
+
+        slot, seq = payload
+        ref = frame_ring.acquire_seq(seq)
+        if ref is None or ref[0] != slot:
+            if ref is not None:
+                frame_ring.release(ref[0])
+            return None
+        return key, ref[1], frame
+
+    # Receive straight into writable buffers so arrays are not read-only
+    buffers = []
+    for size in sizes:
+        buffer = bytearray(size)
+        conn.recv_bytes_into(buffer)
+        buffers.append(buffer)
+
+    return key, pickle.loads(payload, buffers=buffers), frame
+
+
+def ring_slot(frame_ring: FrameRing, value: np.ndarray):
+    if value.shape != frame_ring.shape or value.dtype != frame_ring.dtype:
+        return None
+    return frame_ring.slot_of(value)
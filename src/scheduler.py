@@ -0,0 +1,231 @@
+import os
+import threading
+import time
+
+from src.blackboard import BlackboardStateful
+from src.metrics import registry
+
+# How each stage is treated. Critical stages keep their rate under CPU pressure; the others are
+# slowed down in degrade_order, first to last. Enrollment stages only matter while enrollment is
+# active and idle at idle_fps otherwise. Validation feeds alignment, selection and ArcFace, so it
+# is as critical as they are while enrolling.
+STAGE_POLICIES = {
+    "VideoCapture": {"critical": True},
+    "FaceDetection": {"critical": True},
+    "FaceValidation": {"critical": True, "enrollment": True},
+    "FaceAlignment": {"critical": True, "enrollment": True},
+    "FaceSelection": {"critical": True, "enrollment": True},
+    "RecognitionArcFace": {"critical": True, "enrollment": True},
+    "FaceVerification": {"critical": True, "enrollment": True},
+    "PreviewRenderer": {"critical": False},
+}
+DEGRADE_ORDER = ("PreviewRenderer",)
+
+# Factor applied to a degraded stage's target per adjustment, and back on recovery
+DEGRADE_STEP = 0.75
+
+# Longest a stage blocks on its input before rechecking stop and run state, seconds
+WAIT_TIMEOUT = 0.5
+
+
+class StageRate:
+    def __init__(self, stage, camera, fps, min_fps, critical, enrollment, run_state_event):
+        self.stage = stage
+        self.camera = camera
+        self.base_fps = fps
+        self.min_fps = min_fps
+        self.critical = critical
+        self.enrollment = enrollment
+        self.run_state_event = run_state_event
+
+        # Rate after degradation, before the idle cap
+        self.fps = fps
+
+    def enrolling(self):
+        return self.run_state_event is None or self.run_state_event.is_set()
+
+
+# Base of the pipeline stages the scheduler paces. scheduler assigns the stage its rate; None runs
+# it at its own fps.
+class ScheduledStage(BlackboardStateful):
+    scheduler = None
+    fps = 30
+
+    # How long to block on input. New input wakes the stage at once, so the scheduler's longer
+    # timeout only saves idle wakeups.
+    def input_timeout(self):
+        return self.scheduler.wait_timeout if self.scheduler is not None else 1.0 / self.fps
+
+    # Give up the rest of the slot when the scheduler slowed this stage down
+    def yield_slot(self, t1):
+        if self.scheduler is not None:
+            self.scheduler.pace(type(self).__name__, self.camera, t1)
+
+
+# Share of all CPU cores in use since the previous call: system-wide from /proc/stat on Linux,
+# else this process only
+class CpuSampler:
+    def __init__(self):
+        self.system = os.path.exists("/proc/stat")
+        self.last = self.read()
+
+    # (total, idle) CPU time; (wall time across all cores, process CPU time) without /proc/stat
+    def read(self):
+        if self.system:
+            with open("/proc/stat") as f:
+                fields = [float(v) for v in f.readline().split()[1:]]
+            # idle + iowait count as free time
+            return sum(fields), fields[3] + fields[4]
+        return time.perf_counter() * (os.cpu_count() or 1), time.process_time()
+
+    def sample(self):
+        total, idle = self.read()
+        last_total, last_idle = self.last
+        self.last = total, idle
+
+        elapsed = total - last_total
+        if elapsed <= 0:
+            return 0.0
+        if not self.system:
+            return min(1.0, (idle - last_idle) / elapsed)
+        return min(1.0, max(0.0, 1.0 - (idle - last_idle) / elapsed))
+
+
+# Central rate control for the pipeline, owned by PipelineManager. Stages ask it for their target
+# rate and call pace() after each item instead of sleeping on a fixed 1/fps. A monitor thread
+# samples CPU use and slows the non-critical stages while it is above pressure_high (pressure_enroll
+# while enrollment is active, so the recognition path keeps its CPU), restoring them below
+# pressure_low.
+class Scheduler:
+    def __init__(self, stop_event, fps=30, idle_fps=5, pressure_high=0.9, pressure_enroll=0.75, pressure_low=0.5,
+                 interval=1.0, report_interval=60.0, wait_timeout=WAIT_TIMEOUT, log=None):
+        self.stop_event = stop_event
+        # How long stages block on their input; new input wakes them at once, so this only bounds
+        # how quickly they notice stop and run state changes
+        self.wait_timeout = wait_timeout
+        self.fps = fps
+        self.idle_fps = idle_fps
+
+        self.pressure_high = pressure_high
+        self.pressure_enroll = pressure_enroll
+        self.pressure_low = pressure_low
+        self.interval = interval
+        self.report_interval = report_interval
+        self.log = log
+
+        self.lock = threading.Lock()
+        self.stages = {}
+        # {camera: fps} of cameras in presence-gated idle mode, every stage capped at that fps
+        self.idle_cameras = {}
+        self.pressure = 0.0
+        self.thread = None
+
+    def register(self, stage, camera=None, fps=None, min_fps=2, run_state_event=None):
+        policy = STAGE_POLICIES.get(stage, {})
+        with self.lock:
+            self.stages[(stage, camera)] = StageRate(stage, camera, fps or self.fps, min_fps,
+                                                     policy.get("critical", True), policy.get("enrollment", False),
+                                                     run_state_event)
+
+    # Current target rate of a stage; unregistered stages run at the pipeline fps
+    def rate(self, stage, camera=None):
+        entry = self.stages.get((stage, camera))
+        if entry is None:
+            return self.fps
+
+        fps = entry.fps
+        if entry.enrollment and not entry.enrolling():
+            fps = min(fps, self.idle_fps)
+        with self.lock:
+            idle_fps = self.idle_cameras.get(camera)
+        return fps if idle_fps is None else min(fps, idle_fps)
+
+    # Put all stages of a camera in idle mode at fps, or back to their normal rate with None
+    def set_idle(self, camera, fps):
+        with self.lock:
+            if fps is None:
+                self.idle_cameras.pop(camera, None)
+            else:
+                self.idle_cameras[camera] = fps
+
+    def is_idle(self, camera=None):
+        with self.lock:
+            return camera in self.idle_cameras
+
+    # Sleep out the rest of the stage's slot when it runs below its own fps. At full rate the stage
+    # is paced by its input, so waiting here would only add latency.
+    def pace(self, stage, camera, t1):
+        entry = self.stages.get((stage, camera))
+        target = self.rate(stage, camera)
+        if entry is None or target >= entry.base_fps:
+            return
+
+        remaining = 1.0 / target - (time.perf_counter() - t1)
+        if remaining > 0:
+            self.stop_event.wait(timeout=remaining)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.monitor_loop, name="scheduler", daemon=True)
+            self.thread.start()
+
+    def monitor_loop(self):
+        sampler = CpuSampler()
+        last_report = time.perf_counter()
+
+        while not self.stop_event.wait(timeout=self.interval):
+            self.adjust(sampler.sample())
+
+            if self.log is not None and time.perf_counter() - last_report >= self.report_interval:
+                last_report = time.perf_counter()
+                self.log.info("Stage rates (achieved/target fps): " + ", ".join(
+                    f"{name} {item['achieved']:.1f}/{item['target']:.1f}" for name, item in self.report().items()))
+
+    def adjust(self, pressure):
+        self.pressure = pressure
+        with self.lock:
+            entries = list(self.stages.values())
+
+        enrolling = any(entry.enrollment and entry.enrolling() for entry in entries)
+        high = self.pressure_enroll if enrolling else self.pressure_high
+
+        if pressure > high:
+            # Slow the first non-critical stage in line that still has room
+            for entry in self.in_degrade_order(entries):
+                if entry.fps > entry.min_fps:
+                    entry.fps = max(entry.min_fps, entry.fps * DEGRADE_STEP)
+                    self.log_change(entry, f"CPU at {pressure * 100:.0f}%")
+                    break
+        elif pressure < self.pressure_low:
+            # Restore in reverse order
+            for entry in reversed(self.in_degrade_order(entries)):
+                if entry.fps < entry.base_fps:
+                    entry.fps = min(entry.base_fps, entry.fps / DEGRADE_STEP)
+                    self.log_change(entry, f"CPU at {pressure * 100:.0f}%")
+                    break
+
+        for entry in entries:
+            registry.stage(entry.stage, entry.camera).target = self.rate(entry.stage, entry.camera)
+
+    def in_degrade_order(self, entries):
+        degradable = [entry for entry in entries if not entry.critical]
+        order = {stage: i for i, stage in enumerate(DEGRADE_ORDER)}
+        return sorted(degradable, key=lambda entry: order.get(entry.stage, len(order)))
+
+    def log_change(self, entry, reason):
+        if self.log is not None:
+            name = entry.stage if entry.camera is None else f"{entry.camera}/{entry.stage}"
+            self.log.info(f"Scheduler: {name} target {entry.fps:.1f} fps ({reason}).")
+
+    # {stage: {"target", "achieved", "critical"}} with achieved fps from the stage metrics
+    def report(self):
+        with self.lock:
+            entries = list(self.stages.values())
+
+        report = {}
+        for entry in entries:
+            name = entry.stage if entry.camera is None else f"{entry.camera}/{entry.stage}"
+            report[name] = {"target": self.rate(entry.stage, entry.camera),
+                            "achieved": registry.stage(entry.stage, entry.camera).snapshot()["fps"],
+                            "critical": entry.critical}
+        return report
@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+from collections import deque
+from typing import NamedTuple
+
+
+# Identity of a captured frame, handed along the blackboard with everything derived from it.
+# captured_at is time.perf_counter(), a monotonic clock shared by all processes of the machine.
+class FrameTrace(NamedTuple):
+    frame_id: int
+    captured_at: float
+
+
+# Named rows for spans that are not tied to one thread
+TRACKS = ("end-to-end",)
+
+
+# Bounded in-memory record of stage spans, exported as Chrome trace JSON (chrome://tracing, Perfetto)
+class Tracer:
+    def __init__(self, capacity=50000, enabled=True):
+        self.enabled = enabled
+        # Oldest spans are dropped first, so memory stays flat on a kiosk running for days
+        self.events = deque(maxlen=capacity)
+        self.threads = {}
+        self.lock = threading.Lock()
+
+    # Span from start to end (perf_counter seconds), tagged with the frame it worked on. Spans that
+    # do not nest in the current thread's work (e.g. capture-to-enroll) go on a named track instead.
+    def add(self, name, start, end, frame=None, camera=None, cat="stage", track=None, **args):
+        if not self.enabled:
+            return
+
+        if frame is not None:
+            args["frame_id"] = frame.frame_id
+        if camera is not None:
+            args["camera"] = camera
+
+        if track is None:
+            thread = threading.current_thread()
+            tid, thread_name = thread.ident, thread.name
+        else:
+            # Small fixed ids keep a track on one row, apart from the real thread ids
+            tid, thread_name = TRACKS.index(track) + 1, track
+
+        event = {"name": name, "cat": cat, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6,
+                 "pid": os.getpid(), "tid": tid, "args": args}
+        with self.lock:
+            self.events.append(event)
+            self.threads[(event["pid"], tid)] = thread_name
+
+    # Hand recorded spans over, e.g. from a process stage to the parent
+    def drain(self):
+        with self.lock:
+            events, threads = list(self.events), dict(self.threads)
+            self.events.clear()
+        return events, threads
+
+    def extend(self, drained):
+        events, threads = drained
+        with self.lock:
+            self.events.extend(events)
+            self.threads.update(threads)
+
+    def chrome_trace(self):
+        with self.lock:
+            events, threads = list(self.events), dict(self.threads)
+
+        names = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                 for (pid, tid), name in threads.items()]
+        return {"traceEvents": names + events, "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+# Process-wide tracer the stages record into
+tracer = Tracer()
@@ -1,14 +1,18 @@
-import cv2
+import base64
+
 import flet as ft
 
 from src.blackboard import BlackboardStateful
-from src.utils.converters import frame_to_base64
+from src.metrics import registry
+from src.preview import PreviewRenderer, select_preview_frame
 from src.utils.timer import timer
 
 
 class EnrollmentView(ft.Row, BlackboardStateful):
-    def __init__(self, stop_event, run_state_event, pipeline_manager, fps=30):
+    def __init__(self, stop_event, run_state_event, pipeline_manager, fps=30, camera=None, show_metrics=False):
         super().__init__()
+        # Show the blackboard of one camera when the pipeline runs several
+        BlackboardStateful.__init__(self, camera)
 
         self.stop_event = stop_event
         self.run_state_event = run_state_event
@@ -17,6 +21,16 @@ class EnrollmentView(ft.Row, BlackboardStateful):
 
         self.fps = fps
 
+        self.camera = camera
+        # Per-stage fps, p95 latency and inference share under the controls
+        self.show_metrics = show_metrics
+        self.metrics_text = ft.Text(size=11, font_family="monospace", visible=show_metrics)
+
+        # Mirrored JPEGs sized for the 640x480 box, encoded only for new frames
+        self.renderer = PreviewRenderer(size=(640, 480), fps=fps, camera=camera,
+                                        scheduler=pipeline_manager.scheduler)
+        self.frame_ring = pipeline_manager.dep("frame_ring", camera)
+
         self.placeholder = ft.Container(
             width=640,
             height=480,
@@ -50,7 +64,7 @@ class EnrollmentView(ft.Row, BlackboardStateful):
             self.frame,
             ft.Column(
                 height=480,
-                controls=[self.run_state_btn],
+                controls=[self.run_state_btn, self.metrics_text],
                 alignment=ft.MainAxisAlignment.CENTER,
                 horizontal_alignment=ft.CrossAxisAlignment.START,
             ),
@@ -64,31 +78,46 @@ class EnrollmentView(ft.Row, BlackboardStateful):
 
         self.pipeline_manager.run()
         self._start_frame_update()
+        if self.show_metrics:
+            self._start_metrics_update()
 
     def will_unmount(self):
         self.stop_event.set()
         self.reset_all()
 
     def _start_frame_update(self):
-        @timer(self.fps, self.stop_event)
+        # The renderer lowers its fps when the preview exceeds its CPU budget or the CPU is busy
+        @timer(lambda: self.renderer.rate, self.stop_event)
         def update_frame():
-            frame = self.select_frame()
+            key, frame = select_preview_frame(self, self.frame_ring)
 
             has_frame = frame is not None
+            jpeg = self.renderer.render(frame, key) if has_frame else None
+
+            # Nothing to send to the page when the frame and visibility are unchanged
+            if jpeg is None and self.image.visible == has_frame:
+                return
 
             # Toggle visibility
             self.image.visible = has_frame
             self.placeholder.visible = not has_frame
 
-            if has_frame:
-                frame = cv2.flip(frame, 1)
-                self.image.src_base64 = frame_to_base64(frame)
+            if jpeg is not None:
+                self.image.src_base64 = base64.b64encode(jpeg).decode()
 
             self.image.update()
             self.placeholder.update()
 
         update_frame()
 
+    def _start_metrics_update(self):
+        @timer(1, self.stop_event)
+        def update_metrics():
+            self.metrics_text.value = "\n".join(registry.summary(self.camera))
+            self.metrics_text.update()
+
+        update_metrics()
+
     def toggle_enrollment(self, e):
         if not self.run_state_event.is_set():
             self.run_state_event.set()
@@ -96,12 +125,3 @@ class EnrollmentView(ft.Row, BlackboardStateful):
             self.run_state_event.clear()
 
         self.run_state_btn.update()
-
-    def select_frame(self):
-        default_frame = self.get_state("default_frame")
-        processed_frame = self.get_state("processed_frame")
-
-        if processed_frame is not None:
-            return processed_frame
-        else:
-            return default_frame
@@ -1,12 +1,20 @@
 import cv2
-import base64
-from io import BytesIO
-from PIL import Image
 
 
-def frame_to_base64(frame):
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    pil_img = Image.fromarray(rgb_frame)
-    buff = BytesIO()
-    pil_img.save(buff, format="JPEG", quality=85)
-    return base64.b64encode(buff.getvalue()).decode()
+# JPEG bytes straight from a BGR frame with OpenCV's native encoder
+def frame_to_jpeg(frame, quality=85):
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("JPEG encoding failed.")
+    return buffer.tobytes()
+
+
+# Downscale to fit inside (width, height), keeping the aspect ratio; smaller frames are left alone
+def fit_frame(frame, size):
+    width, height = size
+    frame_h, frame_w = frame.shape[:2]
+    scale = min(width / frame_w, height / frame_h)
+    if scale >= 1.0:
+        return frame
+
+    return cv2.resize(frame, (round(frame_w * scale), round(frame_h * scale)), interpolation=cv2.INTER_AREA)
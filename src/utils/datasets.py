@@ -0,0 +1,46 @@
+import os
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+
+# Load BGR face crops from a folder, sorted by file name
+def load_face_crops(folder, limit=None):
+    names = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if limit is not None:
+        names = names[:limit]
+
+    faces = []
+    for name in names:
+        face = cv2.imread(os.path.join(folder, name))
+        if face is not None:
+            faces.append(face)
+
+    if not faces:
+        raise ValueError(f"No face images found in {folder}.")
+
+    return faces
+
+
+# (key, path, is_video) for every image and video under the given files or folders, in a stable
+# order. The key is the path relative to its root without extension, e.g. "site-a/1234".
+def list_media(paths):
+    media = []
+    for root in paths:
+        if os.path.isfile(root):
+            files = [(os.path.dirname(root), os.path.basename(root))]
+        else:
+            files = sorted((dirpath, name) for dirpath, _, names in os.walk(root) for name in names)
+
+        for dirpath, name in files:
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in IMAGE_EXTENSIONS + VIDEO_EXTENSIONS:
+                continue
+
+            path = os.path.join(dirpath, name)
+            key = os.path.splitext(os.path.relpath(path, root if os.path.isdir(root) else dirpath))[0]
+            media.append((key.replace(os.sep, "/"), path, ext in VIDEO_EXTENSIONS))
+
+    return media
@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+# LRU cache of embeddings keyed by a perceptual fingerprint of the aligned face, so a face that has
+# not meaningfully changed skips ArcFace inference. Entries are scoped (the recognition stage scopes
+# them to an enrollment session and tracked face id): a face only ever matches entries of its own
+# scope, so someone who merely looks alike at thumbnail size never gets another person's embedding.
+class EmbeddingCache:
+    def __init__(self, capacity=64, threshold=4.0, thumb_size=16):
+        self.capacity = capacity
+        # Mean absolute grey-level difference of the thumbnails below which two faces match
+        self.threshold = threshold
+        self.thumb_size = thumb_size
+
+        self.entries = OrderedDict()
+        self.next_key = 0
+        self.lock = threading.Lock()
+
+    # Downsampled grayscale thumbnail used as fingerprint
+    def fingerprint(self, face):
+        gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (self.thumb_size, self.thumb_size), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    # Embedding of the closest matching thumbnail within scope, or None
+    def get(self, scope, thumb):
+        with self.lock:
+            best_key, best_diff = None, self.threshold
+            for key, (cached_scope, cached_thumb, _) in self.entries.items():
+                if cached_scope != scope:
+                    continue
+                diff = np.abs(cached_thumb - thumb).mean()
+                if diff < best_diff:
+                    best_key, best_diff = key, diff
+
+            if best_key is None:
+                return None
+
+            self.entries.move_to_end(best_key)
+            return self.entries[best_key][2]
+
+    def put(self, scope, thumb, embedding):
+        with self.lock:
+            self.entries[self.next_key] = (scope, thumb, embedding)
+            self.next_key += 1
+
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -2,23 +2,24 @@ import threading
 import time
 
 
+# fps is a number, or a callable returning the current rate so the pace can change while running
 def timer(fps, stop_event):
     def decorator(func):
         def wrapper(*args, **kwargs):
             def run():
-                frame_time = 1.0 / fps
-
                 while True:
-                    t1 = time.time()
+                    frame_time = 1.0 / (fps() if callable(fps) else fps)
+                    t1 = time.perf_counter()
 
                     if stop_event.is_set():
                         break
 
                     func(*args, **kwargs)
 
-                    elapsed_time = time.time() - t1
+                    elapsed_time = time.perf_counter() - t1
                     sleep_time = max(0.0, frame_time - elapsed_time)
-                    time.sleep(sleep_time)
+                    # Returns early on stop instead of sleeping out the frame
+                    stop_event.wait(timeout=sleep_time)
 
             threading.Thread(target=run, daemon=True).start()
         return wrapper
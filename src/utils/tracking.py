@@ -0,0 +1,125 @@
+import cv2
+import numpy as np
+
+
+# Intersection over union of two (x, y, w, h) boxes
+def iou(box_a, box_b):
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+# Keeps face ids stable across frames by matching boxes to the previous frame by IoU
+class FaceIdTracker:
+    def __init__(self, iou_threshold=0.3):
+        self.iou_threshold = iou_threshold
+        self.next_id = 1
+        self.tracks = {}
+
+    def assign(self, bboxes):
+        unmatched = dict(self.tracks)
+        face_ids = []
+
+        for bbox in bboxes:
+            best_id, best_iou = None, self.iou_threshold
+            for face_id, prev_bbox in unmatched.items():
+                overlap = iou(bbox, prev_bbox)
+                if overlap >= best_iou:
+                    best_id, best_iou = face_id, overlap
+
+            if best_id is None:
+                best_id = self.next_id
+                self.next_id += 1
+            else:
+                del unmatched[best_id]
+
+            face_ids.append(best_id)
+
+        self.tracks = dict(zip(face_ids, bboxes))
+        return face_ids
+
+    def reset(self):
+        self.tracks = {}
+
+
+# Propagates face boxes between detector runs with sparse Lucas-Kanade optical flow
+class OpticalFlowTracker:
+    def __init__(self, min_confidence=0.6, min_points=8, max_points=40):
+        self.min_confidence = min_confidence
+        self.min_points = min_points
+        self.max_points = max_points
+
+        self.prev_gray = None
+        self.tracks = []
+
+    @property
+    def active(self):
+        return bool(self.tracks)
+
+    # Seed feature points inside every detected box
+    def start(self, gray, bboxes):
+        self.prev_gray = gray
+        self.tracks = []
+
+        for bbox in bboxes:
+            x, y, w, h = bbox
+            points = cv2.goodFeaturesToTrack(gray[y:y + h, x:x + w], maxCorners=self.max_points,
+                                             qualityLevel=0.01, minDistance=3)
+            if points is None or len(points) < self.min_points:
+                self.tracks = []
+                return
+
+            self.tracks.append((bbox, points.reshape(-1, 2) + np.float32([x, y])))
+
+    # Move every box with its points; returns the new boxes, or None when tracking is lost
+    def update(self, gray):
+        if not self.tracks:
+            return None
+
+        frame_h, frame_w = gray.shape[:2]
+        tracks = []
+
+        for (x, y, w, h), points in self.tracks:
+            new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, points.reshape(-1, 1, 2), None)
+            good = status.ravel() == 1
+
+            # Share of points that survived is the tracking confidence
+            if good.sum() < self.min_points or good.mean() < self.min_confidence:
+                self.reset()
+                return None
+
+            old, new = points[good], new_points.reshape(-1, 2)[good]
+            dx, dy = np.median(new - old, axis=0)
+
+            # Spread of the points around their center approximates the change of scale
+            old_spread = np.median(np.linalg.norm(old - old.mean(axis=0), axis=1))
+            new_spread = np.median(np.linalg.norm(new - new.mean(axis=0), axis=1))
+            scale = new_spread / old_spread if old_spread > 0 else 1.0
+
+            # Boxes stay fractional between frames so sub-pixel motion accumulates
+            cx, cy = x + w / 2 + dx, y + h / 2 + dy
+            w, h = w * scale, h * scale
+            x, y = max(0.0, cx - w / 2), max(0.0, cy - h / 2)
+            w, h = min(w, frame_w - x), min(h, frame_h - y)
+
+            if w < 1 or h < 1:
+                self.reset()
+                return None
+
+            tracks.append(((x, y, w, h), new))
+
+        self.prev_gray = gray
+        self.tracks = tracks
+
+        return [(int(x), int(y), int(w), int(h)) for (x, y, w, h), _ in tracks]
+
+    def reset(self):
+        self.prev_gray = None
+        self.tracks = []
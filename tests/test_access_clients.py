@@ -0,0 +1,133 @@
+import asyncio
+
+import aiohttp
+import numpy as np
+import pytest
+
+from api.access_system import AccessSystemClient
+from api.async_access_system import AsyncAccessSystemClient
+from api.stub_server import StubAccessServer
+
+
+def random_embeddings(n, seed=0):
+    embeddings = np.random.default_rng(seed).normal(size=(n, 512)).astype(np.float32)
+    return list(embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True))
+
+
+# bulk=False behaves like a server without the batch endpoints, binary=False like a JSON-only one
+@pytest.fixture(params=[{"bulk": True}, {"bulk": False}, {"bulk": False, "binary": False}],
+                ids=["bulk", "legacy", "legacy-json"])
+def server(request):
+    server = StubAccessServer(**request.param).start()
+    yield server
+    server.stop()
+
+
+def test_sync_client_validates_adds_and_lists(server):
+    client = AccessSystemClient(server.url)
+    embedding = random_embeddings(1)[0]
+
+    assert client.validate_embedding(embedding)[0] is False
+    assert client.add_embedding(embedding, "alice") == 201
+    assert client.validate_embedding(embedding)[0] is True
+
+    items, cursor = client.list_embeddings()
+    assert [item["name"] for item in items] == ["alice"]
+    assert np.dot(np.asarray(items[0]["vector"], dtype=np.float32), embedding) > 0.99
+    assert client.list_embeddings(cursor)[0] == []
+
+    assert client.wire_format == ("float32" if server.binary else "json")
+    client.close()
+
+
+def test_sync_client_rejects_bad_embeddings(server):
+    client = AccessSystemClient(server.url)
+    with pytest.raises(ValueError):
+        client.add_embedding(np.zeros(128, dtype=np.float32), "short")
+    with pytest.raises(ValueError):
+        client.validate_embedding(None)
+    client.close()
+
+
+def test_async_client_enrolls_each_embedding_once(server):
+    embeddings = random_embeddings(5)
+    names = [f"person{i}" for i in range(5)]
+
+    async def run():
+        async with AsyncAccessSystemClient(server.url, batch_size=2) as client:
+            first = await client.enroll_embeddings(embeddings, names)
+            second = await client.enroll_embeddings(embeddings, names)
+            validated = await client.validate_embeddings(embeddings + random_embeddings(1, seed=1))
+            return client.bulk, first, second, validated
+
+    bulk, first, second, validated = asyncio.run(run())
+
+    assert bulk is (True if server.bulk else False)
+    assert first == ["added"] * 5
+    assert second == ["exists"] * 5
+    assert [exists for exists, _ in validated] == [True] * 5 + [False]
+    assert sorted(server.names) == names
+
+
+# The bulk endpoint validates and adds atomically; concurrent single calls cannot promise that
+def test_async_client_bulk_dedupes_within_a_call():
+    server = StubAccessServer(bulk=True).start()
+    embedding = random_embeddings(1)[0]
+
+    async def run():
+        async with AsyncAccessSystemClient(server.url) as client:
+            return await client.enroll_embeddings([embedding, embedding], ["a", "b"])
+
+    try:
+        assert asyncio.run(run()) == ["added", "exists"]
+        assert len(server.names) == 1
+    finally:
+        server.stop()
+
+
+# Only the items of the refused chunk go through single calls; the other chunks are not resent
+def test_async_client_falls_back_only_for_failed_chunks():
+    server = StubAccessServer(bulk=True).start()
+    server.refuse_batches = 1
+    embeddings = random_embeddings(5)
+    names = [f"person{i}" for i in range(5)]
+
+    async def run():
+        async with AsyncAccessSystemClient(server.url, batch_size=2, max_concurrency=1) as client:
+            before = single_calls(client)
+            statuses = await client.enroll_embeddings(embeddings, names)
+            return statuses, [after - n for after, n in zip(single_calls(client), before)]
+
+    try:
+        statuses, calls = asyncio.run(run())
+    finally:
+        server.stop()
+
+    assert statuses == ["added"] * 5
+    assert sorted(server.names) == names
+    # Two items of the refused chunk, each validated and then added on its own
+    assert calls == [2, 2]
+
+
+# (validate, add) single calls recorded by the client so far; the metrics registry is process-wide
+def single_calls(client):
+    histograms = client.metrics.snapshot()["histograms"]
+    return [histograms[path][3] if path in histograms else 0 for path in ("embedding/validate", "embedding")]
+
+
+# A 200 reply that is not the expected JSON fails like a network error, and the next call goes through
+def test_async_client_raises_client_error_on_malformed_bulk_reply():
+    server = StubAccessServer(bulk=True).start()
+    server.garble_batches = 1
+    embeddings = random_embeddings(2)
+
+    async def run():
+        async with AsyncAccessSystemClient(server.url) as client:
+            with pytest.raises(aiohttp.ClientError):
+                await client.enroll_embeddings(embeddings, ["a", "b"])
+            return await client.enroll_embeddings(embeddings, ["a", "b"])
+
+    try:
+        assert asyncio.run(run()) == ["added", "added"]
+    finally:
+        server.stop()
@@ -0,0 +1,33 @@
+import numpy as np
+
+from src.utils.embedding_cache import EmbeddingCache
+
+
+def thumb(level):
+    return np.full((16, 16), level, dtype=np.int16)
+
+
+def test_faces_only_match_entries_of_their_own_scope():
+    cache = EmbeddingCache()
+    cache.put((0, 1), thumb(100), "alice")
+
+    assert cache.get((0, 1), thumb(101)) == "alice"
+    assert cache.get((0, 2), thumb(100)) is None
+    assert cache.get((1, 1), thumb(100)) is None
+
+
+def test_closest_entry_wins():
+    cache = EmbeddingCache()
+    cache.put((0, 1), thumb(100), "far")
+    cache.put((0, 1), thumb(103), "near")
+    cache.put((0, 1), thumb(106), "newest")
+
+    assert cache.get((0, 1), thumb(102)) == "near"
+
+
+def test_clear_forgets_everything():
+    cache = EmbeddingCache()
+    cache.put((0, 1), thumb(100), "alice")
+    cache.clear()
+
+    assert cache.get((0, 1), thumb(100)) is None
@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+
+from src.enrollment_queue import EnrollmentQueue
+from src.metrics import registry
+
+
+def test_put_after_peek_wakes_the_next_wait(tmp_path):
+    queue = EnrollmentQueue(str(tmp_path / "queue.db"))
+    assert queue.peek() == []
+
+    queue.put(np.ones(512), "alice")
+    t1 = time.perf_counter()
+    queue.wait(timeout=2.0)
+
+    assert time.perf_counter() - t1 < 1.0
+    assert [name for _, name, _, _ in queue.peek()] == ["alice"]
+    queue.close()
+
+
+def test_queue_metrics_are_exported(tmp_path):
+    queue = EnrollmentQueue(str(tmp_path / "queue.db"), max_attempts=1)
+    metrics = registry.stage("EnrollmentQueue")
+    before = dict(metrics.snapshot()["counters"])
+
+    queue.put(np.ones(512), "alice")
+    queue.put(np.ones(512), "bob")
+    assert metrics.snapshot()["gauges"]["queue_depth"] == 2
+
+    (alice_id, *_), (bob_id, *_) = queue.peek()
+    queue.done([alice_id])
+    queue.reject([bob_id])
+    queue.record_flush(0.05)
+
+    snapshot = metrics.snapshot()
+    counters = {event: n - before.get(event, 0) for event, n in snapshot["counters"].items()}
+    assert snapshot["gauges"]["queue_depth"] == 0
+    assert counters["flushed"] == 1 and counters["rejected"] == 1 and counters["dropped"] == 1
+    assert 'enrollment_stage_gauge{stage="EnrollmentQueue",camera="",gauge="queue_depth"} 0\n' in registry.render()
+    queue.close()
+
+
+def test_oldest_queued_timestamp_renders_at_full_precision(tmp_path):
+    queue = EnrollmentQueue(str(tmp_path / "queue.db"))
+    queue.put(np.ones(512), "alice")
+
+    oldest = registry.stage("EnrollmentQueue").snapshot()["gauges"]["oldest_queued_timestamp_seconds"]
+    line = 'enrollment_stage_gauge{stage="EnrollmentQueue",camera="",gauge="oldest_queued_timestamp_seconds"} '
+    rendered = next(row for row in registry.render().splitlines() if row.startswith(line))
+
+    assert float(rendered[len(line):]) == oldest
+    queue.close()
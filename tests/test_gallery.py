@@ -0,0 +1,76 @@
+import json
+import os
+
+import numpy as np
+
+from src.gallery import EmbeddingGallery
+
+
+def random_vectors(n, seed=0):
+    return list(np.random.default_rng(seed).normal(size=(n, 512)).astype(np.float32))
+
+
+def test_reopen_keeps_names_vectors_and_cursor(tmp_path):
+    vectors = random_vectors(3)
+    gallery = EmbeddingGallery(str(tmp_path))
+    gallery.add(vectors[:2], ["alice", "bob"], cursor="2")
+    gallery.add(vectors[2:], ["carol"])
+
+    reopened = EmbeddingGallery(str(tmp_path))
+    assert reopened.names == ["alice", "bob", "carol"]
+    assert reopened.cursor == "2"
+    assert reopened.search(vectors[1], k=1)[0][0] == "bob"
+
+
+def test_add_appends_only_new_names(tmp_path):
+    vectors = random_vectors(3)
+    gallery = EmbeddingGallery(str(tmp_path))
+    gallery.add(vectors[:2], ["alice", "bob"])
+    size = os.path.getsize(gallery.names_path)
+
+    assert gallery.add(vectors, ["alice", "bob", "carol"]) == 1
+    with open(gallery.names_path, "rb") as f:
+        assert f.read()[size:] == b'"carol"\n'
+
+
+def test_sync_pulls_pages_incrementally(tmp_path):
+    vectors = random_vectors(3)
+    pages = {None: ([{"name": "alice", "vector": vectors[0]}], "1"),
+             "1": ([{"name": "bob", "vector": vectors[1]}, {"name": "carol", "vector": vectors[2]}], "3"),
+             "3": ([], "3")}
+
+    gallery = EmbeddingGallery(str(tmp_path))
+    assert gallery.sync(lambda cursor: pages[cursor]) == 3
+    assert gallery.sync(lambda cursor: pages[cursor]) == 0
+
+    reopened = EmbeddingGallery(str(tmp_path))
+    assert reopened.names == ["alice", "bob", "carol"] and reopened.cursor == "3"
+
+
+# A crash can leave vector rows without a name or a name line cut short; both are dropped
+def test_reopen_after_interrupted_add(tmp_path):
+    vectors = random_vectors(3)
+    gallery = EmbeddingGallery(str(tmp_path))
+    gallery.add(vectors[:2], ["alice", "bob"])
+
+    with open(gallery.vectors_path, "ab") as f:
+        f.write(vectors[2].tobytes())
+    with open(gallery.names_path, "ab") as f:
+        f.write(b'"car')
+
+    reopened = EmbeddingGallery(str(tmp_path))
+    assert reopened.names == ["alice", "bob"]
+    assert reopened.add(vectors[2:], ["carol"]) == 1
+    assert len(EmbeddingGallery(str(tmp_path)).matrix) == 3
+
+
+def test_opens_galleries_with_names_in_meta(tmp_path):
+    vectors = random_vectors(2)
+    with open(tmp_path / "embeddings.f32", "wb") as f:
+        f.write(np.stack([v / np.linalg.norm(v) for v in vectors]).tobytes())
+    with open(tmp_path / "meta.json", "w") as f:
+        json.dump({"names": ["alice", "bob"], "cursor": "2"}, f)
+
+    gallery = EmbeddingGallery(str(tmp_path))
+    assert gallery.names == ["alice", "bob"] and gallery.cursor == "2"
+    assert gallery.search(vectors[0], k=1)[0][0] == "alice"